@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Batch kNN predictor: knn_memorizer's answers for a whole query matrix at once.
+
+knn_memorizer.predict_reimbursement builds and fully sorts a list of (distance, output)
+tuples over every case for each query, then weights the neighbours in a Python loop. This
+engine takes the queries as an array and works through them in blocks sized from a memory
+budget: the block's distances to every case come from knn_graph.distances (the memorizer's
+own expression), the k nearest are picked with argpartition and ordered by (distance, file
+order) like the memorizer's stable sort, and the inverse-distance weights are summed over
+the k neighbours in the memorizer's order. Queries whose nearest case is at distance 0 take
+that case's output. Answers are bit-identical to knn_memorizer; memory does not grow with
+the number of queries beyond the answers themselves.
+
+Usage: python3 knn_batch.py [QUERIES.json] [--cases FILE] [--k 7] [--weights 10,1,1]
+                            [--memory MB] [--output FILE] [--verify N]
+       python3 knn_batch.py --random N [--memory MB]    # throughput and peak memory on N random trips
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from knn_graph import distances, nearest
+from knn_search import CURRENT, FEATURES, load_cases
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MEMORY = 16  # MB of working arrays per block
+# (query x case) float64/int64 arrays alive at once per block: distances, a squared-difference
+# temporary, the argpartition result and the comparison masks of the tie check
+BLOCK_ARRAYS = 5
+
+
+class KnnBatch:
+    """knn_memorizer's predictor over a fixed set of reference cases."""
+
+    def __init__(self, x, outputs, weights=CURRENT['knn_memorizer'].weights, k=CURRENT['knn_memorizer'].k,
+                 epsilon=CURRENT['knn_memorizer'].epsilon, short_circuit=True, memory=DEFAULT_MEMORY):
+        self.x = x
+        self.outputs = outputs
+        self.weights = weights
+        self.k = min(k, len(outputs))
+        self.epsilon = epsilon
+        self.short_circuit = short_circuit
+        self.block = max(1, memory * 2**20 // (BLOCK_ARRAYS * 8 * len(outputs)))
+        self.ids = np.arange(len(outputs))
+
+    def predict_block(self, queries):
+        distance, ids = nearest(distances(queries, self.x, self.weights),
+                                np.broadcast_to(self.ids, (len(queries), len(self.ids))), self.k)
+        outputs = self.outputs[ids]
+        weighted_sum = np.zeros(len(queries))
+        total_weight = np.zeros(len(queries))
+        for j in range(self.k):  # accumulate in neighbour order, as the memorizer does
+            weight = 1.0 / (distance[:, j] + self.epsilon)
+            weighted_sum += weight * outputs[:, j]
+            total_weight += weight
+        result = weighted_sum / total_weight
+        if self.short_circuit:
+            exact = distance[:, 0] == 0.0
+            result[exact] = outputs[exact, 0]
+        return result
+
+    def predict(self, queries):
+        """Answer per row of a (queries x FEATURES) array."""
+        result = np.empty(len(queries))
+        for start in range(0, len(queries), self.block):
+            result[start:start + self.block] = self.predict_block(queries[start:start + self.block])
+        return result
+
+
+def load_queries(path):
+    """(queries x FEATURES) array from a list of inputs or of cases with an 'input' field."""
+    with open(path) as f:
+        cases = json.load(f)
+    return np.array([[c.get('input', c)[name] for name in FEATURES] for c in cases], dtype=np.float64)
+
+
+def random_queries(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.integers(1, 15, n), rng.integers(5, 1300, n),
+                            np.round(rng.uniform(1, 2500, n), 2)]).astype(np.float64)
+
+
+def verify(engine, queries, n, cases_path):
+    """Mismatches of the first n answers against knn_memorizer.predict_reimbursement."""
+    import knn_memorizer
+    cases = knn_memorizer.load_cases(cases_path)
+    answers = engine.predict(queries[:n])
+    mismatches = 0
+    for (days, miles, receipts), answer in zip(queries[:n], answers):
+        target = dict(zip(FEATURES, (int(days) if days.is_integer() else days,
+                                     int(miles) if miles.is_integer() else miles, receipts)))
+        expected = knn_memorizer.predict_reimbursement(target, cases, k=engine.k)
+        if answer != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  {days:g}, {miles:g}, {receipts:g}: memorizer {expected!r}, batch {answer!r}", file=sys.stderr)
+    return mismatches
+
+
+def main():
+    memorizer = CURRENT['knn_memorizer']
+    parser = argparse.ArgumentParser(description="Score a batch of trips with knn_memorizer's kNN.")
+    parser.add_argument('queries', nargs='?', default=os.path.join(HERE, '..', '..', 'private_cases.json'),
+                        help='JSON list of trips or cases (default: private_cases.json)')
+    parser.add_argument('--cases', default=os.path.join(HERE, 'public_cases.json'), help='reference cases')
+    parser.add_argument('--k', type=int, default=memorizer.k, help=f'neighbours (default {memorizer.k})')
+    parser.add_argument('--weights', default=','.join(f"{w:g}" for w in memorizer.weights),
+                        help="days,miles,receipts distance weights (default: knn_memorizer's)")
+    parser.add_argument('--memory', type=int, default=DEFAULT_MEMORY,
+                        help=f'MB of working arrays per block (default {DEFAULT_MEMORY})')
+    parser.add_argument('--output', help='write the answers here instead of stdout')
+    parser.add_argument('--verify', type=int, default=0, metavar='N',
+                        help='check the first N answers against knn_memorizer.predict_reimbursement')
+    parser.add_argument('--random', type=int, default=0, metavar='N',
+                        help='time N random trips instead of scoring a file')
+    options = parser.parse_args()
+
+    weights = tuple(float(w) for w in options.weights.split(','))
+    if len(weights) != len(FEATURES):
+        parser.error(f"--weights needs {len(FEATURES)} values")
+    x, outputs = load_cases(options.cases)
+    engine = KnnBatch(x, outputs, weights, options.k, memory=options.memory)
+    queries = random_queries(options.random) if options.random else load_queries(options.queries)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    answers = engine.predict(queries)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - answers.nbytes
+    tracemalloc.stop()
+    print(f"{len(queries):,} queries against {len(outputs)} cases in {elapsed * 1000:.1f} ms "
+          f"({elapsed / len(queries) * 1e6:.2f} us/query), blocks of {engine.block} queries, "
+          f"peak working memory {peak / 2**20:.1f} MB", file=sys.stderr)
+
+    if options.verify:
+        n = min(options.verify, len(queries))
+        bad = verify(engine, queries, n, options.cases)
+        print(f"verify: {n - bad}/{n} answers identical to knn_memorizer", file=sys.stderr)
+        if bad:
+            sys.exit(1)
+    if not options.random:
+        text = ''.join(f"{answer:.2f}\n" for answer in answers)
+        if options.output:
+            with open(options.output, 'w') as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Precomputed kNN graph over the case file.
+
+Every analysis of this approach (leave-one-out error, residual smoothing, outlier hunting)
+needs the nearest other cases of every case, and used to recompute all n^2 distances to get
+them. The graph computes them once: for every case, the ids (int32) and distances (float32)
+of its K nearest other cases under a weighted Euclidean metric, nearest first and ties in
+file order like knn_memorizer's stable sort. Queries are then gathers over those arrays:
+
+    predict(k, ...)        leave-one-out kNN answer of every case
+    smooth(values, k, ...) inverse-distance mean of a per-case value over each case's neighbours
+    outlier_scores(k)      leave-one-out residual relative to the spread of the neighbours
+
+Distances are computed blockwise (bounded memory) with the same expression as
+knn_memorizer.euclidean_distance. The graph is saved as an .npz next to the case file,
+together with the cases and the metric it was built for. When cases are appended to the
+file, only the new rows are computed in full; the existing rows merge the new cases into
+their lists, which gives exactly the graph a full rebuild would.
+
+Usage: python3 knn_graph.py [--cases FILE] [--weights 10,1,1] [--size 32] [--rebuild]
+                            [--k 7] [--top 10] [--base PREDICTIONS]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from knn_search import CURRENT, FEATURES, load_cases
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZE = 32  # neighbours stored per case
+BLOCK = 512        # query rows per distance block
+
+
+def graph_path(cases_path):
+    return os.path.splitext(cases_path)[0] + '.knngraph.npz'
+
+
+def distances(query, reference, weights):
+    """(query x reference) weighted Euclidean distances, summed per feature like knn_memorizer."""
+    total = np.empty((len(query), len(reference)))
+    diff = np.empty_like(total)
+    for f, weight in enumerate(weights):
+        out = diff if f else total  # the first feature's square is the running sum itself
+        np.subtract(query[:, f, None], reference[None, :, f], out=out)
+        if weight != 1.0:
+            out *= weight
+        np.square(out, out=out)
+        if f:
+            total += diff
+    return np.sqrt(total, out=total)
+
+
+def nearest(distance, ids, width):
+    """(distances, ids) of the `width` nearest columns of every row, nearest first, ties by id."""
+    if width < distance.shape[1]:
+        chosen = np.argpartition(distance, width - 1, axis=1)[:, :width]
+        picked = np.take_along_axis(distance, chosen, axis=1)
+        # argpartition breaks ties at the boundary arbitrarily: redo those rows with a full sort
+        kth = picked.max(axis=1, keepdims=True)
+        for row in np.flatnonzero((distance == kth).sum(axis=1) != (picked == kth).sum(axis=1)):
+            chosen[row] = np.lexsort((ids[row], distance[row]))[:width]
+        distance, ids = np.take_along_axis(distance, chosen, axis=1), np.take_along_axis(ids, chosen, axis=1)
+    order = np.lexsort((ids, distance), axis=1)
+    return np.take_along_axis(distance, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class KnnGraph:
+    """The `size` nearest other cases of every case, under one weighted Euclidean metric."""
+
+    def __init__(self, x, expected, weights, size, ids, distance):
+        self.x = x
+        self.expected = expected
+        self.weights = tuple(float(w) for w in weights)
+        self.size = size
+        self.ids = ids            # (cases x width) int32, width = min(size, cases - 1)
+        self.distance = distance  # (cases x width) float32
+
+    def __len__(self):
+        return len(self.expected)
+
+    @classmethod
+    def build(cls, x, expected, weights, size=DEFAULT_SIZE):
+        graph = cls(x[:0], expected[:0], weights, size, np.zeros((0, 0), np.int32), np.zeros((0, 0), np.float32))
+        return graph.append(x, expected)
+
+    def append(self, x, expected):
+        """The graph over these cases followed by `x`: new rows in full, old rows merged with the new cases."""
+        old = len(self)
+        points = np.concatenate([self.x, x])
+        width = min(self.size, len(points) - 1)
+        ids = np.empty((len(points), width), np.int32)
+        distance = np.empty((len(points), width), np.float32)
+        new_ids = np.arange(old, len(points))
+        for start in range(0, old, BLOCK):
+            rows = slice(start, min(start + BLOCK, old))
+            # distances to the kept neighbours are recomputed in float64 so that ties rank exactly as in a rebuild
+            kept = self.ids[rows]
+            kept_distance = np.sqrt(sum(((self.x[rows, f, None] - self.x[kept, f]) * w) ** 2
+                                        for f, w in enumerate(self.weights)))
+            candidates = np.concatenate([kept, np.broadcast_to(new_ids, (len(kept), len(new_ids)))], axis=1)
+            d, i = nearest(np.concatenate([kept_distance, distances(self.x[rows], x, self.weights)], axis=1),
+                           candidates, width)
+            distance[rows], ids[rows] = d, i
+        everyone = np.arange(len(points))
+        for start in range(old, len(points), BLOCK):
+            rows = slice(start, min(start + BLOCK, len(points)))
+            d = distances(points[rows], points, self.weights)
+            d[np.arange(len(d)), everyone[rows]] = np.inf  # leave the case itself out
+            distance[rows], ids[rows] = nearest(d, np.broadcast_to(everyone, d.shape), width)
+        return KnnGraph(points, np.concatenate([self.expected, expected]), self.weights, self.size, ids, distance)
+
+    def save(self, path):
+        np.savez(path, x=self.x, expected=self.expected, weights=np.array(self.weights), size=self.size,
+                 ids=self.ids, distance=self.distance)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['x'], data['expected'], data['weights'], int(data['size']), data['ids'], data['distance'])
+
+    def _neighbours(self, k):
+        if not 1 <= k <= self.ids.shape[1]:
+            raise ValueError(f"k must be between 1 and {self.ids.shape[1]} for this graph, got {k}")
+        return self.ids[:, :k], self.distance[:, :k].astype(np.float64)
+
+    def smooth(self, values, k, epsilon=0.001):
+        """Inverse-distance weighted mean of `values` over each case's k nearest other cases."""
+        ids, distance = self._neighbours(k)
+        weight = 1.0 / (distance + epsilon)
+        return (weight * np.asarray(values)[ids]).sum(axis=1) / weight.sum(axis=1)
+
+    def predict(self, k, epsilon=0.001, short_circuit=True):
+        """Leave-one-out kNN answer of every case, as knn_memorizer would give it without that case."""
+        result = self.smooth(self.expected, k, epsilon)
+        if short_circuit:
+            exact = self.distance[:, 0] == 0.0
+            result[exact] = self.expected[self.ids[exact, 0]]
+        return result
+
+    def outlier_scores(self, k, epsilon=0.001):
+        """|expected - leave-one-out answer| over the median deviation of the neighbours from that answer.
+
+        High scores are cases whose output disagrees with neighbours that agree among themselves.
+        """
+        answer = self.predict(k, epsilon, short_circuit=False)
+        spread = np.median(np.abs(self.expected[self.ids[:, :k]] - answer[:, None]), axis=1)
+        return np.abs(self.expected - answer) / (spread + 1.0)
+
+
+def open_graph(cases_path, weights, size=DEFAULT_SIZE, rebuild=False):
+    """(graph, how) for the case file: loaded, extended with appended cases, or built from scratch."""
+    x, expected = load_cases(cases_path)
+    path = graph_path(cases_path)
+    if os.path.exists(path) and not rebuild:
+        graph = KnnGraph.load(path)
+        n = len(graph)
+        if (graph.weights == tuple(weights) and graph.size == size and n <= len(x)
+                and np.array_equal(graph.x, x[:n]) and np.array_equal(graph.expected, expected[:n])):
+            if n == len(x):
+                return graph, 'loaded'
+            graph = graph.append(x[n:], expected[n:])
+            graph.save(path)
+            return graph, f"extended with {len(x) - n} appended cases"
+    graph = KnnGraph.build(x, expected, weights, size)
+    graph.save(path)
+    return graph, 'built'
+
+
+def main():
+    memorizer = CURRENT['knn_memorizer']
+    parser = argparse.ArgumentParser(description='Build the kNN graph of a case file and report from it.')
+    parser.add_argument('--cases', default=os.path.join(HERE, 'public_cases.json'), help='case file')
+    parser.add_argument('--weights', default=','.join(f"{w:g}" for w in memorizer.weights),
+                        help="days,miles,receipts distance weights (default: knn_memorizer's)")
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE, help=f'neighbours stored per case (default {DEFAULT_SIZE})')
+    parser.add_argument('--rebuild', action='store_true', help='ignore a saved graph')
+    parser.add_argument('--k', type=int, default=memorizer.k, help=f'neighbours used by the queries (default {memorizer.k})')
+    parser.add_argument('--top', type=int, default=10, help='outliers to print (default 10)')
+    parser.add_argument('--base', metavar='PREDICTIONS',
+                        help="a model's answers, one per line in case order: report it with smoothed residuals added")
+    options = parser.parse_args()
+
+    weights = tuple(float(w) for w in options.weights.split(','))
+    if len(weights) != len(FEATURES):
+        parser.error(f"--weights needs {len(FEATURES)} values")
+    start = time.perf_counter()
+    graph, how = open_graph(options.cases, weights, options.size, options.rebuild)
+    print(f"Graph {how}: {len(graph)} cases x {graph.ids.shape[1]} neighbours, weights "
+          f"{', '.join(f'{w:g}' for w in graph.weights)} ({time.perf_counter() - start:.3f} s)")
+    if not 1 <= options.k <= graph.ids.shape[1]:
+        parser.error(f"--k must be between 1 and {graph.ids.shape[1]}")
+
+    expected_cents = np.rint(graph.expected * 100)
+    start = time.perf_counter()
+    rows = []
+    for k in range(1, graph.ids.shape[1] + 1):
+        errors = np.abs(np.rint(graph.predict(k) * 100) - expected_cents)
+        rows.append((k, errors.mean() / 100, int(np.count_nonzero(errors == 0))))
+    elapsed = time.perf_counter() - start
+    print(f"\nLeave-one-out error for k = 1..{len(rows)} ({elapsed * 1000:.1f} ms)")
+    print(f"{'k':>4}{'avg err':>10}{'exact':>7}")
+    best = min(rows, key=lambda row: (row[1], -row[2]))
+    for row in rows:
+        k, average, exact = row
+        print(f"{k:>4}{average:>10.2f}{exact:>7}{'   <- best' if row == best else ''}")
+
+    scores = graph.outlier_scores(options.k)
+    answer = graph.predict(options.k, short_circuit=False)
+    print(f"\nTop {options.top} outliers at k={options.k}")
+    print(f"{'case':>6}{'days':>6}{'miles':>9}{'receipts':>10}{'expected':>10}{'neighbours':>12}{'score':>8}")
+    for i in np.argsort(-scores, kind='stable')[:options.top]:
+        days, miles, receipts = graph.x[i]
+        print(f"{i:>6}{days:>6g}{miles:>9g}{receipts:>10.2f}{graph.expected[i]:>10.2f}{answer[i]:>12.2f}{scores[i]:>8.2f}")
+
+    if options.base:
+        base = np.loadtxt(options.base, ndmin=1)
+        if len(base) != len(graph):
+            parser.error(f"{options.base} has {len(base)} answers for {len(graph)} cases")
+        smoothed = base + graph.smooth(graph.expected - base, options.k)
+        for name, values in (('base', base), ('base + smoothed residual', smoothed)):
+            errors = np.abs(np.rint(values * 100) - expected_cents)
+            print(f"{name:<26}avg err {errors.mean() / 100:>8.2f}   exact {np.count_nonzero(errors == 0)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,13 @@ def euclidean_distance(input1, input2):
     
     return math.sqrt(days_diff**2 + miles_diff**2 + receipts_diff**2)
 
-def find_nearest_neighbors(target_input, cases, k=5):
+def find_nearest_neighbors(target_input, cases, k=5, index=None):
+    # An index over the same cases (e.g. Hybrid_Model/grid_index.GridIndex with weights
+    # (10, 1, 1) and ties='order') returns the same neighbours without scanning every case
+    if index is not None:
+        return index.nearest(target_input["trip_duration_days"], target_input["miles_traveled"],
+                             target_input["total_receipts_amount"], k)
+
     distances = []
     
     for case in cases:
@@ -35,8 +41,8 @@ def find_nearest_neighbors(target_input, cases, k=5):
     distances.sort(key=lambda x: x[0])
     return distances[:k]
 
-def predict_reimbursement(target_input, cases, k=5):
-    neighbors = find_nearest_neighbors(target_input, cases, k)
+def predict_reimbursement(target_input, cases, k=5, index=None):
+    neighbors = find_nearest_neighbors(target_input, cases, k, index)
     
     if not neighbors:
         return 0.0
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Leave-one-out search over kNN hyperparameters.
+
+The repo's two kNN models weight the features differently and were never tuned:
+
+    knn_fallback (13_ and its descendants)   days x15, miles x0.8, receipts x1.2, k=5
+    knn_memorizer (this directory)           days x10, miles x1,   receipts x1,   k=7, exact-match short-circuit
+
+both with inverse-distance weights 1 / (distance + 0.001). This tool scores a grid (or a
+random sample) of feature weights, k, epsilon and weighting scheme by exact leave-one-out
+over the case file: every case is predicted from all the others, and the configurations are
+ranked by average error, then exact matches.
+
+The per-feature squared differences of all case pairs are computed once per worker process.
+A task is one weight triple: its distance matrix is a weighted sum of those, the kmax nearest
+neighbours of every case are selected with argpartition and sorted, and every (k, epsilon,
+scheme, short-circuit) combination is then scored from those neighbour lists without
+touching the distances again. Weight triples are spread over a process pool.
+
+Neighbours at equal distance keep file order, as in knn_memorizer's stable sort. Answers are
+rounded to cents before scoring, like the models' printed output.
+
+Weighting schemes: inverse 1/(d+eps), inverse_square 1/(d+eps)^2, uniform. With the
+short-circuit, a case whose nearest neighbour is at distance 0 takes that neighbour's output.
+
+Usage: python3 knn_search.py [--cases FILE] [--days 5,10,15,20,30] [--miles 0.5,0.8,1,1.5]
+                             [--receipts 0.5,0.8,1,1.2,1.5,2] [--k 1:15] [--epsilons 0.001,0.1,1,10]
+                             [--schemes inverse,inverse_square,uniform] [--random N]
+                             [-j WORKERS] [--top N] [--csv knn_search.csv]
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FEATURES = ('trip_duration_days', 'miles_traveled', 'total_receipts_amount')
+SCHEMES = ('inverse', 'inverse_square', 'uniform')
+
+Config = namedtuple('Config', 'weights k epsilon scheme short_circuit')
+# The hard-coded configurations of the two kNN models
+CURRENT = {
+    'knn_fallback': Config((15.0, 0.8, 1.2), 5, 0.001, 'inverse', False),
+    'knn_memorizer': Config((10.0, 1.0, 1.0), 7, 0.001, 'inverse', True),
+}
+
+
+def load_cases(path):
+    """(cases x FEATURES) inputs and expected outputs."""
+    with open(path) as f:
+        cases = json.load(f)
+    x = np.array([[c['input'][name] for name in FEATURES] for c in cases], dtype=np.float64)
+    return x, np.array([c['expected_output'] for c in cases], dtype=np.float64)
+
+
+def squared_differences(x):
+    """(features x cases x cases) squared differences of every feature between every two cases."""
+    return np.stack([(x[:, f, None] - x[None, :, f]) ** 2 for f in range(x.shape[1])])
+
+
+def neighbours(squared, weights, kmax):
+    """(distances, indices) of every case's kmax nearest other cases, nearest first, ties in file order."""
+    distance = np.sqrt(np.tensordot(np.square(weights), squared, axes=1))
+    np.fill_diagonal(distance, np.inf)  # leave the case itself out
+    nearest = np.argpartition(distance, kmax - 1, axis=1)[:, :kmax]
+    nearest_distance = np.take_along_axis(distance, nearest, axis=1)
+    order = np.lexsort((nearest, nearest_distance), axis=1)
+    return np.take_along_axis(nearest_distance, order, axis=1), np.take_along_axis(nearest, order, axis=1)
+
+
+def weigh(distance, epsilon, scheme):
+    if scheme == 'uniform':
+        return np.ones_like(distance)
+    weight = 1.0 / (distance + epsilon)
+    return weight * weight if scheme == 'inverse_square' else weight
+
+
+def predict(distance, outputs, k, epsilon, scheme, short_circuit):
+    """Weighted kNN answer per row of a (cases x kmax) neighbour list."""
+    weight = weigh(distance[:, :k], epsilon, scheme)
+    result = (weight * outputs[:, :k]).sum(axis=1) / weight.sum(axis=1)
+    if short_circuit:
+        exact = distance[:, 0] == 0.0
+        result[exact] = outputs[exact, 0]
+    return result
+
+
+# Worker state, set once per pool process by _init_worker
+_squared = _expected = _expected_cents = None
+
+
+def _init_worker(x, expected):
+    global _squared, _expected, _expected_cents
+    _squared = squared_differences(x)
+    _expected = expected
+    _expected_cents = np.rint(expected * 100)
+
+
+def score_weights(weights, ks, epsilons, schemes, short_circuits):
+    """[(Config, total error in cents, exact matches)] for one weight triple and every other setting."""
+    distance, nearest = neighbours(_squared, np.asarray(weights, dtype=np.float64), max(ks))
+    outputs = _expected[nearest]
+    rows = []
+    for k, epsilon, scheme, short_circuit in itertools.product(ks, epsilons, schemes, short_circuits):
+        if scheme == 'uniform' and epsilon != epsilons[0]:
+            continue  # epsilon does not enter uniform weights
+        errors = np.abs(np.rint(predict(distance, outputs, k, epsilon, scheme, short_circuit) * 100)
+                        - _expected_cents)
+        rows.append((Config(tuple(weights), k, epsilon, scheme, short_circuit),
+                     float(errors.sum()), int(np.count_nonzero(errors == 0))))
+    return rows
+
+
+def weight_grid(days, miles, receipts, samples=0, seed=0):
+    """Every weight triple of the grid, or `samples` triples drawn log-uniformly within its ranges."""
+    if not samples:
+        return list(itertools.product(days, miles, receipts))
+    rng = np.random.default_rng(seed)
+    draw = lambda values: np.exp(rng.uniform(np.log(min(values)), np.log(max(values)), samples))
+    return [tuple(round(float(v), 3) for v in triple) for triple in zip(draw(days), draw(miles), draw(receipts))]
+
+
+def search(x, expected, weights, ks, epsilons, schemes, short_circuits=(False, True), workers=1):
+    """Rows of (Config, average error, exact matches, score), best first."""
+    n = len(expected)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(x, expected)) as pool:
+        scored = pool.map(score_weights, weights, itertools.repeat(ks), itertools.repeat(epsilons),
+                          itertools.repeat(schemes), itertools.repeat(short_circuits),
+                          chunksize=max(1, len(weights) // (4 * workers)))
+        rows = [(config, total / n / 100, exact, total / n + (n - exact) * 0.1)
+                for result in scored for config, total, exact in result]
+    rows.sort(key=lambda row: (row[1], -row[2]))
+    return rows
+
+
+def parse_list(text, kind=float):
+    if ':' in text:
+        start, stop = (int(v) for v in text.split(':'))
+        return list(range(start, stop + 1))
+    return [kind(v) for v in text.split(',')]
+
+
+def describe(config):
+    days, miles, receipts = config.weights
+    return (f"{days:>8g}{miles:>8g}{receipts:>9g}{config.k:>4}{config.epsilon:>9g}  {config.scheme:<15}"
+            f"{'yes' if config.short_circuit else 'no':<6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Leave-one-out search over kNN hyperparameters.')
+    parser.add_argument('--cases', default=os.path.join(HERE, 'public_cases.json'), help='case file')
+    parser.add_argument('--days', default='5,10,15,20,30', help='days weights')
+    parser.add_argument('--miles', default='0.5,0.8,1,1.5', help='miles weights')
+    parser.add_argument('--receipts', default='0.5,0.8,1,1.2,1.5,2', help='receipts weights')
+    parser.add_argument('--k', default='1:15', help='neighbour counts, as a list or START:STOP')
+    parser.add_argument('--epsilons', default='0.001,0.1,1,10', help='distance offsets of the weights')
+    parser.add_argument('--schemes', default=','.join(SCHEMES), help='weighting schemes')
+    parser.add_argument('--random', type=int, default=0, metavar='N',
+                        help='sample N weight triples log-uniformly within the weight ranges instead of the grid')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--top', type=int, default=15, help='configurations to print (default 15)')
+    parser.add_argument('--csv', help='write every configuration to this CSV file')
+    options = parser.parse_args()
+
+    schemes = options.schemes.split(',')
+    unknown = [s for s in schemes if s not in SCHEMES]
+    if unknown:
+        parser.error(f"unknown scheme(s): {', '.join(unknown)}")
+    ks, epsilons = parse_list(options.k, int), parse_list(options.epsilons)
+    weights = weight_grid(parse_list(options.days), parse_list(options.miles), parse_list(options.receipts),
+                          options.random)
+    weights += [c.weights for c in CURRENT.values() if c.weights not in weights]
+
+    start = time.perf_counter()
+    x, expected = load_cases(options.cases)
+    rows = search(x, expected, weights, sorted(set(ks) | {c.k for c in CURRENT.values()}),
+                  sorted(set(epsilons) | {c.epsilon for c in CURRENT.values()}), schemes, workers=options.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(rows):,} configurations ({len(weights)} weight triples) scored by leave-one-out on "
+          f"{len(expected)} cases in {elapsed:.2f} s\n")
+    header = f"{'':<15}{'avg err':>9}{'exact':>7}{'score':>10}{'days':>8}{'miles':>8}{'receipts':>9}{'k':>4}" \
+             f"{'epsilon':>9}  {'scheme':<15}{'exact-match'}"
+    print(header)
+    print('-' * len(header))
+    by_config = {row[0]: row for row in rows}
+    for name, config in CURRENT.items():
+        _, average, exact, score = by_config[config]
+        print(f"{name:<15}{average:>9.2f}{exact:>7}{score:>10.2f}{describe(config)}")
+    print()
+    for rank, (config, average, exact, score) in enumerate(rows[:options.top], 1):
+        print(f"{rank:<15}{average:>9.2f}{exact:>7}{score:>10.2f}{describe(config)}")
+
+    best = rows[0][0]
+    print(f"\nBest: weights days x{best.weights[0]:g}, miles x{best.weights[1]:g}, receipts x{best.weights[2]:g}, "
+          f"k={best.k}, epsilon={best.epsilon:g}, {best.scheme} weights, "
+          f"exact-match short-circuit {'on' if best.short_circuit else 'off'}")
+
+    grids = {'days': parse_list(options.days), 'miles': parse_list(options.miles),
+             'receipts': parse_list(options.receipts), 'k': ks}
+    edges = [name for name, value in zip(grids, (*best.weights, best.k))
+             if len(grids[name]) > 1 and value in (min(grids[name]), max(grids[name]))]
+    if edges:
+        print(f"The best configuration is on the edge of the {', '.join(edges)} range: widen it to look further.")
+
+    if options.csv:
+        with open(options.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['rank', 'average_error', 'exact', 'score', 'days_weight', 'miles_weight',
+                             'receipts_weight', 'k', 'epsilon', 'scheme', 'short_circuit'])
+            for rank, (config, average, exact, score) in enumerate(rows, 1):
+                writer.writerow([rank, f"{average:.4f}", exact, f"{score:.2f}", *config.weights, config.k,
+                                 config.epsilon, config.scheme, int(config.short_circuit)])
+        print(f"All {len(rows):,} configurations written to {options.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,140 @@
 import sys
-import subprocess
 import os
 
+import expert_default
+import expert_efficiency_paradox
+import expert_long_trip
+import expert_one_day_anomaly
+
+try:
+    # Written by train_routing_tree.py --write; when present it replaces the threshold rules below
+    import routing_tree
+except ImportError:
+    routing_tree = None
+
+# Experts are imported once and called in-process; each entry is the module that used to run
+# as `python <name>.py <days> <miles> <receipts> [mode]`
+EXPERTS = {
+    "expert_default.py": expert_default,
+    "expert_long_trip.py": expert_long_trip,
+    "expert_one_day_anomaly.py": expert_one_day_anomaly,
+    "expert_efficiency_paradox.py": expert_efficiency_paradox,
+}
+
+# These thresholds are initial estimates based on the error analysis.
+# They are the primary knobs we will tune.
+INEFFICIENCY_SPENDING_THRESHOLD = 220 # High daily spend
+INEFFICIENCY_MILES_THRESHOLD = 75    # Low miles per day
+EFFICIENCY_SPENDING_THRESHOLD = 100   # Low daily spend
+EFFICIENCY_MILES_THRESHOLD = 400     # High miles per day
+
 def get_script_path(script_name):
     """Gets the absolute path to a script in the same directory."""
     return os.path.join(os.path.dirname(__file__), script_name)
 
+def route(days, miles, receipts):
+    """(expert script name, expert args) for one case; days and miles are the router's integers."""
+    if routing_tree is not None:
+        return routing_tree.route(days, miles, receipts)
+    # Basic feature engineering
+    # Avoid division by zero for trips with 0 days, though unlikely.
+    daily_spending = receipts / days if days > 0 else receipts
+    miles_per_day = miles / days if days > 0 else miles
+
+    if days > 7:
+        return "expert_long_trip.py", []
+    elif days == 1 and miles > 600:
+        # Isolate the high-miles, 1-day anomaly specifically
+        return "expert_one_day_anomaly.py", []
+    elif daily_spending > INEFFICIENCY_SPENDING_THRESHOLD and miles_per_day < INEFFICIENCY_MILES_THRESHOLD:
+        return "expert_efficiency_paradox.py", ["inefficient"]
+    elif daily_spending < EFFICIENCY_SPENDING_THRESHOLD and miles_per_day > EFFICIENCY_MILES_THRESHOLD:
+        return "expert_efficiency_paradox.py", ["efficient"]
+    return "expert_default.py", []
+
+def run_expert(name, args, expert_args):
+    """In-process equivalent of the expert's command line: its printed answer, without the newline."""
+    expert = EXPERTS[name]
+    if expert is expert_efficiency_paradox:
+        days = int(args[0])
+        miles = int(float(args[1]))
+        receipts = float(args[2])
+        mode = expert_args[0] if expert_args else None
+        result = expert.vintage_calculation(days, miles, receipts, mode=mode)
+    else:
+        days, miles, receipts = (float(a) for a in args)
+        # Try KNN fallback for edge cases first
+        result = expert.knn_fallback(days, miles, receipts)
+        if result is None:
+            result = expert.vintage_calculation(days, miles, receipts)
+    return f"{result:.2f}"
+
+def predict_batch(days, miles, receipts, cases=None):
+    """
+    Ensemble answers for arrays of cases, in input order. Cases are partitioned by routing rule
+    (same priority as route()) and every partition goes through its expert in one vectorized call.
+    cases: kNN case arrays from experts_vectorized.load_cases() (default: the repo root's public_cases.json, as the experts read it).
+    """
+    import numpy as np
+    import experts_vectorized
+
+    raw_days = np.asarray(days, dtype=np.float64)
+    raw_miles = np.asarray(miles, dtype=np.float64)
+    receipts = np.asarray(receipts, dtype=np.float64)
+    if cases is None:
+        cases = experts_vectorized.load_cases()
+    int_days = np.trunc(raw_days)
+    int_miles = np.trunc(raw_miles)
+    positive = int_days > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_spending = np.where(positive, receipts / int_days, receipts)
+        miles_per_day = np.where(positive, int_miles / int_days, int_miles)
+
+    if routing_tree is not None:
+        choice = routing_tree.assign(int_days, int_miles, receipts, daily_spending, miles_per_day)
+        long_trip = one_day = np.zeros(len(receipts), dtype=bool)
+        inefficient, efficient, rest = (choice == routing_tree.EXPERTS.index(name)
+                                        for name in ("inefficient", "efficient", "vintage"))
+    else:
+        long_trip = int_days > 7
+        one_day = ~long_trip & (int_days == 1) & (int_miles > 600)
+        rest = ~long_trip & ~one_day
+        inefficient = rest & (daily_spending > INEFFICIENCY_SPENDING_THRESHOLD) & (miles_per_day < INEFFICIENCY_MILES_THRESHOLD)
+        rest &= ~inefficient
+        efficient = rest & (daily_spending < EFFICIENCY_SPENDING_THRESHOLD) & (miles_per_day > EFFICIENCY_MILES_THRESHOLD)
+        rest &= ~efficient
+
+    result = np.empty(len(receipts))
+    # expert_long_trip, expert_one_day_anomaly and expert_default share one implementation
+    for mask in (long_trip, one_day, rest):
+        idx = np.flatnonzero(mask)
+        if idx.size:
+            result[idx] = experts_vectorized.vintage_expert(raw_days[idx], raw_miles[idx], receipts[idx], cases)
+    for mask, mode in ((inefficient, "inefficient"), (efficient, "efficient")):
+        idx = np.flatnonzero(mask)
+        if idx.size:
+            result[idx] = experts_vectorized.efficiency_expert(int_days[idx], int_miles[idx], receipts[idx], mode)
+    return result
+
+def run_batch(path):
+    """--batch FILE: one answer per case of a JSON case list (public or private layout), in order."""
+    import json
+    with open(path) as f:
+        cases = json.load(f)
+    inputs = [c.get("input", c) for c in cases]
+    result = predict_batch([c["trip_duration_days"] for c in inputs],
+                           [c["miles_traveled"] for c in inputs],
+                           [c["total_receipts_amount"] for c in inputs])
+    sys.stdout.write("".join(f"{x:.2f}\n" for x in result))
+
 def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--batch":
+        run_batch(sys.argv[2])
+        return
     if len(sys.argv) != 4:
         # This should not be reached if called from run.sh
         print("Usage: python ensemble_router.py <days> <miles> <receipts>", file=sys.stderr)
+        print("       python ensemble_router.py --batch cases.json", file=sys.stderr)
         sys.exit(1)
 
     try:
@@ -20,49 +145,20 @@ def main():
         print("Invalid input types.", file=sys.stderr)
         sys.exit(1)
 
-    # Basic feature engineering
-    # Avoid division by zero for trips with 0 days, though unlikely.
-    daily_spending = receipts / days if days > 0 else receipts
-    miles_per_day = miles / days if days > 0 else miles
-
     # Routing Logic
-    chosen_expert = None
-    expert_args = [] # To allow for future expert-specific flags
-
-    # These thresholds are initial estimates based on the error analysis.
-    # They are the primary knobs we will tune.
-    INEFFICIENCY_SPENDING_THRESHOLD = 220 # High daily spend
-    INEFFICIENCY_MILES_THRESHOLD = 75    # Low miles per day
-    EFFICIENCY_SPENDING_THRESHOLD = 100   # Low daily spend
-    EFFICIENCY_MILES_THRESHOLD = 400     # High miles per day
-
-    if days > 7:
-        chosen_expert = get_script_path("expert_long_trip.py")
-    elif days == 1 and miles > 600:
-        # Isolate the high-miles, 1-day anomaly specifically
-        chosen_expert = get_script_path("expert_one_day_anomaly.py")
-    elif daily_spending > INEFFICIENCY_SPENDING_THRESHOLD and miles_per_day < INEFFICIENCY_MILES_THRESHOLD:
-        chosen_expert = get_script_path("expert_efficiency_paradox.py")
-        expert_args.append("inefficient")
-    elif daily_spending < EFFICIENCY_SPENDING_THRESHOLD and miles_per_day > EFFICIENCY_MILES_THRESHOLD:
-        chosen_expert = get_script_path("expert_efficiency_paradox.py")
-        expert_args.append("efficient")
-    else:
-        chosen_expert = get_script_path("expert_default.py")
+    chosen_expert, expert_args = route(days, miles, receipts)
 
     # Execute the chosen expert
-    command = ["python", chosen_expert] + sys.argv[1:] + expert_args
-    
-    result = subprocess.run(command, capture_output=True, text=True)
-
-    if result.returncode != 0:
+    try:
+        answer = run_expert(chosen_expert, sys.argv[1:], expert_args)
+    except Exception as e:
         # Pass through any errors from the expert
-        print(f"Expert {chosen_expert} failed:", file=sys.stderr)
-        print(result.stderr, file=sys.stderr)
+        print(f"Expert {get_script_path(chosen_expert)} failed:", file=sys.stderr)
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
         sys.exit(1)
-    
-    # Print the expert's output to stdout
-    print(result.stdout.strip())
+
+    # Print the expert's output
+    print(answer)
 
 if __name__ == "__main__":
     main()
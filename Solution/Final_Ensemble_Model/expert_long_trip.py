@@ -213,9 +213,8 @@ def knn_fallback(days, miles, receipts):
     
     # Load public cases for KNN
     try:
-        cases_path = "public_cases.json"
-        if not os.path.exists(cases_path):
-            cases_path = "../public_cases.json"
+        # The repo root's case file, found from this file rather than the CWD
+        cases_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "public_cases.json")
         if not os.path.exists(cases_path):
             return None  # Fallback to vintage model
             
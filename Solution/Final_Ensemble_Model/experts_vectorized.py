@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+NumPy twins of the ensemble experts, for routing whole batches of cases.
+
+The experts emulate fixed-point arithmetic with floats (int(round(x * 100)), truncation,
+half-to-even ties); every one of those steps is an exact IEEE operation that NumPy performs
+identically (np.rint, np.trunc, true division), so each element of a batch result equals
+what the scalar expert returns for that case. Branches become masks applied in the
+scalar rule order.
+
+expert_default.py, expert_long_trip.py and expert_one_day_anomaly.py are the same module,
+so vintage_expert() serves all three.
+"""
+import json
+import os
+
+import numpy as np
+
+import expert_default
+
+COEFF_DAYS = expert_default.simulate_cobol_pic_clause(50.0, 3, 2)
+COEFF_MILES = expert_default.simulate_cobol_pic_clause(0.45, 0, 3)
+COEFF_RECEIPTS = expert_default.simulate_cobol_pic_clause(0.38, 0, 3)
+BASE_CONSTANT = expert_default.simulate_cobol_pic_clause(270.0, 3, 2)
+MAX_VALUE = expert_default.simulate_cobol_pic_clause(9999.99, 4, 2)
+MIN_VALUE = expert_default.simulate_cobol_pic_clause(0.01, 0, 2)
+
+# The case file the experts' kNN fallback reads: the repo root's, found from this file
+PUBLIC = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      "public_cases.json")
+KNN_K = 5
+# Rows per block of the query x case distance matrix
+KNN_BLOCK = 512
+
+
+def vintage_round(value, precision_decimals=2):
+    multiplier = 10 ** precision_decimals
+    scaled = np.asarray(value, dtype=np.float64) * multiplier
+    integer_part = np.trunc(scaled)
+    fractional = np.abs(scaled - integer_part)
+    away = integer_part + np.where(scaled >= 0, 1.0, -1.0)
+    tie = np.where(np.mod(integer_part, 2) == 0, integer_part, away)
+    return np.where(fractional < 0.5, integer_part, np.where(fractional > 0.5, away, tie)) / multiplier
+
+
+def vintage_multiply(a, b, precision_decimals=2):
+    multiplier = 10 ** precision_decimals
+    a_fixed = np.rint(np.asarray(a, dtype=np.float64) * multiplier)
+    b_fixed = np.rint(np.asarray(b, dtype=np.float64) * multiplier)
+    return vintage_round(a_fixed * b_fixed / (multiplier * multiplier), precision_decimals)
+
+
+def vintage_add(a, b, precision_decimals=2):
+    multiplier = 10 ** precision_decimals
+    a_fixed = np.rint(np.asarray(a, dtype=np.float64) * multiplier)
+    b_fixed = np.rint(np.asarray(b, dtype=np.float64) * multiplier)
+    return vintage_round((a_fixed + b_fixed) / multiplier, precision_decimals)
+
+
+def _apply(base, mask, operation):
+    """base with operation applied to the masked elements only (one scalar if-branch)"""
+    idx = np.flatnonzero(mask)
+    if idx.size:
+        base[idx] = operation(base[idx])
+    return base
+
+
+def _linear_terms(days, miles, receipts):
+    days_term = vintage_multiply(days, COEFF_DAYS)
+    miles_term = vintage_multiply(miles, COEFF_MILES)
+    receipts_term = vintage_multiply(receipts, COEFF_RECEIPTS)
+    base = vintage_add(BASE_CONSTANT, days_term)
+    base = vintage_add(base, miles_term)
+    return vintage_add(base, receipts_term), miles_term
+
+
+def vintage_calculation(days, miles, receipts):
+    """expert_default.vintage_calculation (without temporal corrections) over arrays."""
+    days, miles, receipts = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=np.float64))
+                                                  for x in (days, miles, receipts)))
+    base, _ = _linear_terms(days, miles, receipts)
+
+    one_day = days == 1
+    very_high_miles = one_day & (miles > 1000)
+    base = _apply(base, very_high_miles & (receipts >= 500) & (receipts < 2000),
+                  lambda b: vintage_multiply(b, 0.75))
+    base = _apply(base, very_high_miles & (receipts >= 2000),
+                  lambda b: vintage_add(b, vintage_multiply(b, 0.15)))
+    base = _apply(base, one_day & ~(miles > 1000) & (miles > 700) & (receipts < 300),
+                  lambda b: vintage_multiply(b, 0.90))
+    base = _apply(base, days == 5, lambda b: vintage_add(b, vintage_multiply(b, 0.14)))
+    base = _apply(base, days == 6, lambda b: vintage_add(b, vintage_multiply(b, 0.17)))
+
+    daily_receipts = receipts / np.maximum(days, 1)
+    base = _apply(base, (miles < 250) & (daily_receipts > 280), lambda b: vintage_multiply(b, 0.80))
+    base = _apply(base, (days == 7) & (miles > 1000), lambda b: vintage_multiply(b, 1.35))
+    return vintage_round(np.clip(base, MIN_VALUE, MAX_VALUE), 2)
+
+
+def load_cases(path=PUBLIC):
+    """The public cases expert_default.knn_fallback reads, as (days, miles, receipts, outputs) arrays, or None."""
+    try:
+        with open(path) as f:
+            cases = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return (np.array([c["input"]["trip_duration_days"] for c in cases], dtype=np.float64),
+            np.array([c["input"]["miles_traveled"] for c in cases], dtype=np.float64),
+            np.array([c["input"]["total_receipts_amount"] for c in cases], dtype=np.float64),
+            np.array([c["expected_output"] for c in cases], dtype=np.float64))
+
+
+def is_edge_case(days, miles, receipts):
+    daily_receipts = receipts / np.maximum(days, 1)
+    return (((days >= 7) & (daily_receipts > 150)) |
+            ((days <= 2) & (miles > 800)) |
+            ((receipts > 1800) & (days <= 5)) |
+            ((days >= 8) & (miles > 700)))
+
+
+def knn_predict(cases, days, miles, receipts):
+    """Weighted 5-NN answer for every query, ranking (distance, output) like the scalar sort."""
+    case_days, case_miles, case_receipts, outputs = cases
+    result = np.empty(len(days))
+    for start in range(0, len(days), KNN_BLOCK):
+        stop = start + KNN_BLOCK
+        days_diff = (case_days - days[start:stop, None]) * 15.0
+        miles_diff = (case_miles - miles[start:stop, None]) * 0.8
+        receipts_diff = (case_receipts - receipts[start:stop, None]) * 1.2
+        distance = np.sqrt(days_diff ** 2 + miles_diff ** 2 + receipts_diff ** 2)
+        order = np.lexsort((np.broadcast_to(outputs, distance.shape), distance), axis=-1)[:, :KNN_K]
+        nearest = np.take_along_axis(distance, order, axis=-1)
+        total_weight = np.zeros(len(order))
+        weighted_sum = np.zeros(len(order))
+        for j in range(KNN_K):
+            weight = 1.0 / (nearest[:, j] + 0.001)
+            weighted_sum += weight * outputs[order[:, j]]
+            total_weight += weight
+        result[start:stop] = weighted_sum / total_weight
+    return result
+
+
+def vintage_expert(days, miles, receipts, cases=None):
+    """What `python expert_default.py <days> <miles> <receipts>` computes: kNN for edge cases, else vintage."""
+    days, miles, receipts = (np.asarray(x, dtype=np.float64) for x in (days, miles, receipts))
+    result = vintage_calculation(days, miles, receipts)
+    if cases is not None:
+        edge = np.flatnonzero(is_edge_case(days, miles, receipts))
+        if edge.size:
+            result[edge] = knn_predict(cases, days[edge], miles[edge], receipts[edge])
+    return result
+
+
+def efficiency_expert(days, miles, receipts, mode):
+    """expert_efficiency_paradox.vintage_calculation over arrays (days and miles already integers)."""
+    days, miles, receipts = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=np.float64))
+                                                  for x in (days, miles, receipts)))
+    base, miles_term = _linear_terms(days, miles, receipts)
+
+    if mode:
+        positive = days > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily_spending = np.where(positive, receipts / days, receipts)
+            miles_per_day = np.where(positive, miles / days, miles)
+        adjustment = np.zeros(len(base))
+        if mode == 'inefficient':
+            spending_excess = np.maximum(0, daily_spending - 200)
+            adjustment = vintage_add(adjustment, -((spending_excess * 1.5) * days))
+            low = miles_per_day < 50
+            adjustment[low] = vintage_add(adjustment[low], (50 - miles_per_day[low]) * -5.0)
+        elif mode == 'efficient':
+            adjustment = vintage_add(adjustment, vintage_multiply(miles_term, 0.20))
+        base = vintage_add(base, adjustment)
+
+    base = _apply(base, days == 5, lambda b: vintage_add(b, vintage_multiply(b, 0.14)))
+    base = _apply(base, days == 6, lambda b: vintage_add(b, vintage_multiply(b, 0.17)))
+    return np.ceil(np.clip(base, MIN_VALUE, MAX_VALUE) * 100) / 100
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Threshold sweep for ensemble_router against a cached expert-output matrix.
+
+The experts do not depend on the router's thresholds, so every expert's answer for every
+case is computed once (experts_vectorized, exactly as predict_batch computes them) and
+stored in expert_outputs.npz together with the routing features. The file is rebuilt when
+an expert, experts_vectorized.py or the case file changes.
+
+Only the two efficiency rules depend on the four thresholds: a case goes to the
+inefficient expert when daily_spending > INEFFICIENCY_SPENDING_THRESHOLD and miles_per_day
+< INEFFICIENCY_MILES_THRESHOLD, else to the efficient expert when daily_spending <
+EFFICIENCY_SPENDING_THRESHOLD and miles_per_day > EFFICIENCY_MILES_THRESHOLD; long trips,
+the 1-day anomaly and the default expert all give the vintage answer. The total error of a
+setting is therefore
+
+    vintage error + gain of the inefficient rule (over its rectangle of the feature plane)
+                  + gain of the efficient rule - its gain where both rectangles overlap
+
+Each term is a cumulative sum over per-case histograms on the threshold grids (2-D for the
+two rules, 4-D for the overlap), so every point of the grid is scored at once with a few
+array operations, whatever the number of cases. Exact matches are counted the same way.
+
+The report lists the Pareto front of (average error, exact matches) over the grid, the best
+settings by eval.sh score, and the current thresholds. When every best setting lies on an edge of
+a grid with cases still beyond it, the report says so. --verify N reroutes N random grid
+settings through ensemble_router.predict_batch and checks that the numbers agree.
+
+Grids are START:STOP:STEP (STOP included) for each threshold, in the router's units.
+
+Usage: python3 router_sweep.py [--cases FILE] [--ineff-spending 0:600:10] [--ineff-miles 0:100:2]
+                               [--eff-spending 0:100:2] [--eff-miles 0:600:20] [--top N]
+                               [--verify N] [--rebuild]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import ensemble_router
+import experts_vectorized
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))
+PUBLIC = os.path.join(ROOT, 'public_cases.json')
+MATRIX_PATH = os.path.join(HERE, 'expert_outputs.npz')
+# Columns of the expert-output matrix
+EXPERTS = ('vintage', 'inefficient', 'efficient')
+THRESHOLDS = ('INEFFICIENCY_SPENDING_THRESHOLD', 'INEFFICIENCY_MILES_THRESHOLD',
+              'EFFICIENCY_SPENDING_THRESHOLD', 'EFFICIENCY_MILES_THRESHOLD')
+DEFAULT_GRIDS = ('0:600:10', '0:100:2', '0:100:2', '0:600:20')
+# Bumped when the arrays stored in expert_outputs.npz change
+MATRIX_FORMAT = 2
+
+
+def source_digest(case_path):
+    """SHA-256 over the files the matrix is computed from."""
+    digest = hashlib.sha256(f'format {MATRIX_FORMAT}'.encode())
+    for name in ('expert_default.py', 'expert_long_trip.py', 'expert_one_day_anomaly.py',
+                 'expert_efficiency_paradox.py', 'experts_vectorized.py'):
+        with open(os.path.join(HERE, name), 'rb') as f:
+            digest.update(f.read())
+    for path in (case_path, experts_vectorized.PUBLIC):  # scored cases, kNN cases
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cents(values):
+    """Answers as the router prints them (f"{x:.2f}"), in integer cents."""
+    return np.array([round(float(f"{x:.2f}") * 100) for x in values.tolist()], dtype=np.int64)
+
+
+def build_matrix(case_path):
+    """Routing features (the router's integer days and miles), expected cents and the
+    (cases x EXPERTS) answer matrix in cents."""
+    with open(case_path) as f:
+        cases = json.load(f)
+    inputs = [c['input'] for c in cases]
+    raw_days, raw_miles, receipts = (np.array([i[key] for i in inputs], dtype=np.float64)
+                                     for key in ('trip_duration_days', 'miles_traveled', 'total_receipts_amount'))
+    int_days, int_miles = np.trunc(raw_days), np.trunc(raw_miles)
+    positive = int_days > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_spending = np.where(positive, receipts / int_days, receipts)
+        miles_per_day = np.where(positive, int_miles / int_days, int_miles)
+    knn_cases = experts_vectorized.load_cases()
+    outputs = np.stack([cents(experts_vectorized.vintage_expert(raw_days, raw_miles, receipts, knn_cases)),
+                        cents(experts_vectorized.efficiency_expert(int_days, int_miles, receipts, 'inefficient')),
+                        cents(experts_vectorized.efficiency_expert(int_days, int_miles, receipts, 'efficient'))],
+                       axis=1)
+    # long trips and the 1-day anomaly never reach the threshold rules
+    fixed = (int_days > 7) | ((int_days == 1) & (int_miles > 600))
+    expected = np.array([round(c['expected_output'] * 100) for c in cases], dtype=np.int64)
+    return {'days': int_days, 'miles': int_miles, 'receipts': receipts,
+            'daily_spending': daily_spending, 'miles_per_day': miles_per_day, 'fixed': fixed,
+            'expected': expected, 'outputs': outputs}
+
+
+def load_matrix(case_path, path=MATRIX_PATH, rebuild=False):
+    """The expert-output matrix for case_path, from path when it is current, else rebuilt and saved."""
+    digest = source_digest(case_path)
+    if not rebuild and os.path.exists(path):
+        with np.load(path) as stored:
+            if str(stored['digest']) == digest:
+                return {key: stored[key] for key in stored.files if key != 'digest'}
+    matrix = build_matrix(case_path)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, digest=np.array(digest), **matrix)
+    os.replace(tmp, path)
+    return matrix
+
+
+def parse_grid(text):
+    start, stop, step = (float(x) for x in text.split(':'))
+    return np.round(np.arange(start, stop + step / 2, step), 6)
+
+
+def _below(grid, values):
+    """Per value: how many grid thresholds are < value (value > grid[i] exactly for i below it)."""
+    return np.searchsorted(grid, values, side='left')
+
+
+def _not_above(grid, values):
+    """Per value: how many grid thresholds are <= value (value < grid[i] exactly for i at or past it)."""
+    return np.searchsorted(grid, values, side='right')
+
+
+def _accumulate(hist, kinds):
+    """Sum of a per-case histogram over the cases whose comparisons hold at each grid point.
+
+    hist has one axis per threshold, indexed by the per-case count from _below / _not_above
+    (so one longer than the grid). kinds[axis] is 'below' when the comparison holds for grid
+    indices under the case's index, 'from' when it holds at and past it."""
+    for axis, kind in enumerate(kinds):
+        if kind == 'below':
+            hist = np.flip(np.cumsum(np.flip(hist, axis), axis), axis)
+            hist = hist[(slice(None),) * axis + (slice(1, None),)]
+        else:
+            hist = np.cumsum(hist, axis)[(slice(None),) * axis + (slice(None, -1),)]
+    return hist
+
+
+def _histogram(shape, indices, weights):
+    hist = np.zeros(tuple(n + 1 for n in shape), dtype=np.int64)
+    np.add.at(hist, indices, weights)
+    return hist
+
+
+def sweep(matrix, grids):
+    """(total error in cents, exact matches), each an array shaped like the 4-D threshold grid."""
+    free = ~matrix['fixed']
+    spending, miles = matrix['daily_spending'][free], matrix['miles_per_day'][free]
+    ineff_spending, ineff_miles, eff_spending, eff_miles = grids
+    # per case, the grid indices at which each comparison of the two rules holds
+    a = _below(ineff_spending, spending)      # spending > T1   for T1 index < a
+    b = _not_above(ineff_miles, miles)         # miles < T2      for T2 index >= b
+    c = _not_above(eff_spending, spending)     # spending < T3   for T3 index >= c
+    d = _below(eff_miles, miles)               # miles > T4      for T4 index < d
+    shape = tuple(len(g) for g in grids)
+
+    errors = np.abs(matrix['outputs'] - matrix['expected'][:, None])
+    results = []
+    for metric in (errors, (errors == 0).astype(np.int64)):
+        vintage = metric[:, 0]
+        ineff_gain = (metric[:, 1] - vintage)[free]
+        eff_gain = (metric[:, 2] - vintage)[free]
+        ineff = _accumulate(_histogram(shape[:2], (a, b), ineff_gain), ('below', 'from'))
+        eff = _accumulate(_histogram(shape[2:], (c, d), eff_gain), ('from', 'below'))
+        # where both rules match, the inefficient rule wins: take the efficient gain back out
+        overlap = _accumulate(_histogram(shape, (a, b, c, d), eff_gain), ('below', 'from', 'from', 'below'))
+        results.append(int(vintage.sum()) + ineff[:, :, None, None] + eff[None, None, :, :] - overlap)
+    return results
+
+
+def pareto_front(errors, exact):
+    """Flat grid indices of the settings no other setting beats on both error and exact matches,
+    with the number of settings tied with each, by increasing error."""
+    errors, exact = errors.ravel(), exact.ravel()
+    order = np.lexsort((-exact, errors))
+    best_exact = np.maximum.accumulate(exact[order])
+    front = order[np.concatenate(([True], best_exact[1:] > best_exact[:-1]))]
+    ties = [int(np.count_nonzero((errors == errors[i]) & (exact == exact[i]))) for i in front]
+    return front, ties
+
+
+def grid_edges(matrix, grids, best):
+    """Thresholds for which every best setting sits on an edge of its grid past which some case still lies,
+    i.e. where a wider grid could find a better setting."""
+    free = ~matrix['fixed']
+    spending, miles = matrix['daily_spending'][free], matrix['miles_per_day'][free]
+    # per threshold: does some case change side below the first / above the last grid value
+    # (spending > T1, miles < T2, spending < T3, miles > T4)
+    beyond = [(lambda g: np.any(spending <= g[0]), lambda g: np.any(spending > g[-1])),
+              (lambda g: np.any(miles < g[0]), lambda g: np.any(miles >= g[-1])),
+              (lambda g: np.any(spending < g[0]), lambda g: np.any(spending >= g[-1])),
+              (lambda g: np.any(miles <= g[0]), lambda g: np.any(miles > g[-1]))]
+    edges = []
+    for name, grid, indices, (low, high) in zip(THRESHOLDS, grids, np.nonzero(best), beyond):
+        at_edge = ((indices == 0) & low(grid)) | ((indices == len(grid) - 1) & high(grid))
+        if len(grid) > 1 and at_edge.all():
+            edges.append(name)
+    return edges
+
+
+def evaluate_settings(matrix, thresholds, case_path):
+    """(total error in cents, exact matches) of ensemble_router.predict_batch with the given thresholds."""
+    with open(case_path) as f:
+        inputs = [c['input'] for c in json.load(f)]
+    saved = [getattr(ensemble_router, name) for name in THRESHOLDS]
+    # the thresholds only route when no trained routing tree (train_routing_tree.py) is loaded
+    tree, ensemble_router.routing_tree = ensemble_router.routing_tree, None
+    try:
+        for name, value in zip(THRESHOLDS, thresholds):
+            setattr(ensemble_router, name, value)
+        answers = ensemble_router.predict_batch(*([i[key] for i in inputs] for key in
+                                                  ('trip_duration_days', 'miles_traveled', 'total_receipts_amount')))
+    finally:
+        ensemble_router.routing_tree = tree
+        for name, value in zip(THRESHOLDS, saved):
+            setattr(ensemble_router, name, value)
+    errors = np.abs(cents(answers) - matrix['expected'])
+    return int(errors.sum()), int(np.count_nonzero(errors == 0))
+
+
+def row(label, thresholds, total_cents, exact, n, extra=''):
+    average = total_cents / n / 100
+    score = average * 100 + (n - exact) * 0.1
+    values = ''.join(f"{t:>12g}" for t in thresholds)
+    return f"{label:<10}{average:>9.2f}{exact:>7}{score:>10.2f}{values}{extra}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep ensemble_router thresholds against cached expert outputs.')
+    parser.add_argument('--cases', default=PUBLIC, help='case file with expected outputs (default: public_cases.json)')
+    for option, name, grid in zip(('--ineff-spending', '--ineff-miles', '--eff-spending', '--eff-miles'),
+                                  THRESHOLDS, DEFAULT_GRIDS):
+        parser.add_argument(option, default=grid, metavar='START:STOP:STEP', help=f'{name} grid (default {grid})')
+    parser.add_argument('--top', type=int, default=10, help='best settings by score to list (default 10)')
+    parser.add_argument('--verify', type=int, default=0, metavar='N',
+                        help='check N random grid settings against ensemble_router.predict_batch')
+    parser.add_argument('--matrix', default=MATRIX_PATH, help='expert-output matrix cache (default expert_outputs.npz)')
+    parser.add_argument('--rebuild', action='store_true', help='recompute the expert-output matrix')
+    options = parser.parse_args()
+
+    start = time.perf_counter()
+    matrix = load_matrix(options.cases, options.matrix, options.rebuild)
+    loaded = time.perf_counter()
+    grids = [parse_grid(text) for text in (options.ineff_spending, options.ineff_miles,
+                                           options.eff_spending, options.eff_miles)]
+    errors, exact = sweep(matrix, grids)
+    elapsed = time.perf_counter() - loaded
+    n = len(matrix['expected'])
+
+    def thresholds_at(flat):
+        return [float(g[i]) for g, i in zip(grids, np.unravel_index(flat, errors.shape))]
+
+    print(f"{errors.size:,} threshold settings scored on {n} cases in {elapsed:.2f} s "
+          f"(expert-output matrix {'loaded' if loaded - start < 0.05 else 'built'} in {loaded - start:.2f} s)\n")
+    header = f"{'':<10}{'avg err':>9}{'exact':>7}{'score':>10}" + ''.join(
+        f"{label:>12}" for label in ('ineff $/d', 'ineff mi/d', 'eff $/d', 'eff mi/d'))
+    current = [getattr(ensemble_router, name) for name in THRESHOLDS]
+    print(header)
+    print(row('current', current, *evaluate_settings(matrix, current, options.cases), n))
+
+    print('\nPareto front (lower error, more exact matches)')
+    print(header)
+    front, ties = pareto_front(errors, exact)
+    for flat, tied in zip(front, ties):
+        print(row('', thresholds_at(flat), errors.flat[flat], exact.flat[flat], n,
+                  f"   ({tied:,} settings tie)" if tied > 1 else ''))
+
+    print(f'\nBest {options.top} by score')
+    print(header)
+    score = errors / n + (n - exact) * 0.1  # eval.sh's score: errors are in cents
+    for rank, flat in enumerate(np.argsort(score, axis=None, kind='stable')[:options.top], 1):
+        print(row(f"{rank}", thresholds_at(flat), errors.flat[flat], exact.flat[flat], n))
+
+    edges = grid_edges(matrix, grids, score == score.min())
+    if edges:
+        print(f"\nThe best setting is on the edge of the grid for {', '.join(edges)}: widen it to look further.")
+
+    if options.verify:
+        rng = np.random.default_rng(0)
+        mismatches = 0
+        for flat in rng.choice(errors.size, size=min(options.verify, errors.size), replace=False):
+            thresholds = thresholds_at(flat)
+            expected = evaluate_settings(matrix, thresholds, options.cases)
+            if expected != (int(errors.flat[flat]), int(exact.flat[flat])):
+                mismatches += 1
+                print(f"MISMATCH at {thresholds}: sweep {(int(errors.flat[flat]), int(exact.flat[flat]))}, "
+                      f"predict_batch {expected}", file=sys.stderr)
+        if mismatches:
+            sys.exit(1)
+        print(f"\nVerified: {options.verify} random settings match ensemble_router.predict_batch")
+
+
+if __name__ == '__main__':
+    main()
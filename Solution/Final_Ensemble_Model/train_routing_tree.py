@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Fits a shallow CART routing tree for ensemble_router on the cached expert-output matrix.
+
+Every case is labelled with the expert whose answer is closest to its expected output
+(router_sweep.load_matrix: vintage, inefficient or efficient; long trips, the 1-day
+anomaly and the default expert all give the vintage answer). The tree splits on the
+router's features (days, miles, receipts, daily_spending, miles_per_day) with one of two
+criteria:
+
+    cost    each leaf routes to the expert with the least total error over its cases, and
+            a split minimises the children's total error (default; this is the eval.sh error)
+    gini    each leaf routes to its most common label; splits minimise Gini impurity
+
+Feature columns are sorted once. Each node keeps its cases in that order for every feature,
+so the best split of a feature is one cumulative sum of the per-case error (or label) rows
+along it, and splitting a node partitions the sorted lists stably instead of resorting.
+Training on the 1,000 public cases takes milliseconds; --synthetic N times a fit on N cases
+resampled from them with jittered features.
+
+--write emits routing_tree.py: route() as nested ifs, the same signature and return value
+as ensemble_router.route, and assign() as nested np.where for predict_batch. When
+routing_tree.py exists, ensemble_router routes with it instead of its threshold rules, at
+the cost of the same few comparisons per call. Delete the file to go back to the rules.
+
+Usage: python3 train_routing_tree.py [--cases FILE] [--max-depth 3] [--min-leaf 20]
+                                     [--criterion cost|gini] [--folds 5] [--synthetic N] [--write]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+import router_sweep
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUTPUT = os.path.join(HERE, 'routing_tree.py')
+FEATURES = ('days', 'miles', 'receipts', 'daily_spending', 'miles_per_day')
+# What ensemble_router.route returns for each expert column of the matrix
+ROUTES = {'vintage': ('expert_default.py', []), 'inefficient': ('expert_efficiency_paradox.py', ['inefficient']),
+          'efficient': ('expert_efficiency_paradox.py', ['efficient'])}
+
+
+def features(matrix):
+    """(cases x FEATURES) float64 columns."""
+    return np.column_stack([np.asarray(matrix[name], dtype=np.float64) for name in FEATURES])
+
+
+def errors(matrix):
+    """(cases x experts) absolute error in cents."""
+    return np.abs(matrix['outputs'] - matrix['expected'][:, None])
+
+
+def _impurity(sums, counts, criterion):
+    """Impurity of nodes from their per-expert row sums (error or label counts) and sizes."""
+    if criterion == 'cost':
+        return sums.min(axis=-1)
+    return counts - (sums.astype(np.float64) ** 2).sum(axis=-1) / counts
+
+
+def fit(x, cost, max_depth=3, min_leaf=20, criterion='cost'):
+    """Tree as nested dicts: leaves {'expert', 'cases'}, splits {'feature', 'threshold', 'left', 'right'}.
+
+    x: (cases x features) values, cost: (cases x experts) errors. Cases with x <= threshold go left."""
+    n = len(x)
+    rows = cost if criterion == 'cost' else np.eye(cost.shape[1], dtype=np.int64)[cost.argmin(axis=1)]
+    # one presorted case list per feature; nodes keep their slice of each in the same order
+    orders = [np.argsort(x[:, f], kind='stable') for f in range(x.shape[1])]
+    goes_left = np.zeros(n, dtype=bool)
+
+    def leaf(totals, size):
+        expert = int(totals.argmin() if criterion == 'cost' else totals.argmax())
+        return {'expert': expert, 'cases': size}
+
+    def build(orders, depth):
+        size = len(orders[0])
+        totals = rows[orders[0]].sum(axis=0)
+        parent = _impurity(totals, size, criterion)
+        if depth == max_depth or size < 2 * min_leaf:
+            return leaf(totals, size)
+        best = None
+        for f, order in enumerate(orders):
+            values = x[order, f]
+            left_sums = np.cumsum(rows[order], axis=0)[min_leaf - 1:size - min_leaf]
+            left_counts = np.arange(min_leaf, size - min_leaf + 1)
+            # a split must fall between two different values
+            valid = values[min_leaf - 1:size - min_leaf] < values[min_leaf:size - min_leaf + 1]
+            if not valid.any():
+                continue
+            impurity = (_impurity(left_sums, left_counts, criterion)
+                        + _impurity(totals - left_sums, size - left_counts, criterion))
+            impurity = np.where(valid, impurity, np.inf)
+            i = int(impurity.argmin())
+            if best is None or impurity[i] < best[0]:
+                low, high = values[min_leaf - 1 + i], values[min_leaf + i]
+                threshold = (low + high) / 2
+                best = (impurity[i], f, threshold if low <= threshold < high else low)
+        if best is None or best[0] >= parent - 1e-9:
+            return leaf(totals, size)
+        _, f, threshold = best
+        cases = orders[f]
+        goes_left[cases] = x[cases, f] <= threshold
+        left = [order[goes_left[order]] for order in orders]
+        right = [order[~goes_left[order]] for order in orders]
+        goes_left[cases] = False
+        left, right = build(left, depth + 1), build(right, depth + 1)
+        if 'expert' in left and left.get('expert') == right.get('expert'):
+            return leaf(totals, size)  # both sides route to the same expert
+        return {'feature': f, 'threshold': float(threshold), 'left': left, 'right': right}
+
+    return build(orders, 0)
+
+
+def predict(tree, x):
+    """Expert column chosen by the tree for every row of x."""
+    result = np.empty(len(x), dtype=np.int64)
+
+    def walk(node, idx):
+        if 'expert' in node:
+            result[idx] = node['expert']
+            return
+        left = x[idx, node['feature']] <= node['threshold']
+        walk(node['left'], idx[left])
+        walk(node['right'], idx[~left])
+
+    walk(tree, np.arange(len(x)))
+    return result
+
+
+def score(choice, cost):
+    """(average error in dollars, exact matches) of routing each case to its chosen expert."""
+    chosen = cost[np.arange(len(cost)), choice]
+    return chosen.mean() / 100, int(np.count_nonzero(chosen == 0))
+
+
+def router_choice(matrix):
+    """Expert column that the threshold rules of ensemble_router pick for each case."""
+    import ensemble_router
+    names = router_sweep.EXPERTS
+    choice = np.empty(len(matrix['expected']), dtype=np.int64)
+    tree, ensemble_router.routing_tree = ensemble_router.routing_tree, None
+    try:
+        for i, (days, miles, receipts) in enumerate(zip(matrix['days'].tolist(), matrix['miles'].tolist(),
+                                                        matrix['receipts'].tolist())):
+            script, args = ensemble_router.route(int(days), int(miles), receipts)
+            choice[i] = names.index(args[0] if args else 'vintage')
+    finally:
+        ensemble_router.routing_tree = tree
+    return choice
+
+
+def cross_validate(x, cost, folds, **options):
+    """(average error, exact matches) of trees fitted on all folds but one, scored on that one."""
+    order = np.random.default_rng(0).permutation(len(x))
+    choice = np.empty(len(x), dtype=np.int64)
+    for held_out in np.array_split(order, folds):
+        train = np.setdiff1d(order, held_out)
+        choice[held_out] = predict(fit(x[train], cost[train], **options), x[held_out])
+    return score(choice, cost)
+
+
+def synthetic(x, cost, n, seed=0):
+    """n cases resampled from (x, cost) with jittered features, for timing fits."""
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(x), n)
+    return x[idx] * rng.normal(1.0, 0.05, (n, x.shape[1])), cost[idx]
+
+
+def describe(node, names, indent=''):
+    if 'expert' in node:
+        return [f"{indent}-> {names[node['expert']]} ({node['cases']} cases)"]
+    feature, threshold = FEATURES[node['feature']], node['threshold']
+    return ([f"{indent}{feature} <= {threshold:g}"] + describe(node['left'], names, indent + '    ')
+            + [f"{indent}{feature} > {threshold:g}"] + describe(node['right'], names, indent + '    '))
+
+
+def route_source(node, names, indent='    '):
+    if 'expert' in node:
+        script, args = ROUTES[names[node['expert']]]
+        return [f"{indent}return {script!r}, {args!r}"]
+    condition = f"{FEATURES[node['feature']]} <= {node['threshold']!r}"
+    return ([f"{indent}if {condition}:"] + route_source(node['left'], names, indent + '    ')
+            + route_source(node['right'], names, indent))
+
+
+def assign_source(node):
+    if 'expert' in node:
+        return str(node['expert'])
+    return (f"np.where({FEATURES[node['feature']]} <= {node['threshold']!r}, "
+            f"{assign_source(node['left'])}, {assign_source(node['right'])})")
+
+
+def used_features(node):
+    if 'expert' in node:
+        return set()
+    return {FEATURES[node['feature']]} | used_features(node['left']) | used_features(node['right'])
+
+
+def generate(tree, names, summary):
+    """Source text of routing_tree.py."""
+    used = used_features(tree)
+    ratios = [line for name, line in (('daily_spending', '    daily_spending = receipts / days if days > 0 else receipts'),
+                                      ('miles_per_day', '    miles_per_day = miles / days if days > 0 else miles'))
+              if name in used]
+    lines = ['#!/usr/bin/env python3',
+             '"""Routing tree for ensemble_router, fitted by train_routing_tree.py.',
+             '',
+             *summary,
+             '',
+             'Generated code - rerun train_routing_tree.py --write instead of editing; delete this file',
+             'to route with the threshold rules in ensemble_router.py again.',
+             '"""',
+             '',
+             '# Columns of assign(): the expert-output matrix of router_sweep.py',
+             f"EXPERTS = {tuple(names)!r}",
+             '',
+             '',
+             'def route(days, miles, receipts):',
+             '    """(expert script name, expert args) for one case; days and miles are the router\'s integers."""',
+             *ratios,
+             *route_source(tree, names),
+             '',
+             '',
+             'def assign(days, miles, receipts, daily_spending, miles_per_day):',
+             '    """Index into EXPERTS for arrays of cases (the router\'s features, as predict_batch computes them)."""',
+             '    import numpy as np',
+             f"    return np.broadcast_to({assign_source(tree)}, days.shape)",
+             '']
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit a CART routing tree on the expert-output matrix.')
+    parser.add_argument('--cases', default=router_sweep.PUBLIC, help='case file with expected outputs')
+    parser.add_argument('--max-depth', type=int, default=3, help='tree depth (default 3)')
+    parser.add_argument('--min-leaf', type=int, default=20, help='fewest cases per leaf (default 20)')
+    parser.add_argument('--criterion', choices=('cost', 'gini'), default='cost', help='split criterion (default cost)')
+    parser.add_argument('--folds', type=int, default=5, help='cross-validation folds (default 5, 0 to skip)')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N', help='also time a fit on N resampled cases')
+    parser.add_argument('--write', action='store_true', help=f'write the fitted tree to {os.path.basename(OUTPUT)}')
+    options = parser.parse_args()
+
+    matrix = router_sweep.load_matrix(options.cases)
+    names = list(router_sweep.EXPERTS)
+    x, cost = features(matrix), errors(matrix)
+    settings = {'max_depth': options.max_depth, 'min_leaf': options.min_leaf, 'criterion': options.criterion}
+
+    start = time.perf_counter()
+    tree = fit(x, cost, **settings)
+    elapsed = time.perf_counter() - start
+    labels = np.bincount(cost.argmin(axis=1), minlength=len(names))
+    print(f"Fitted on {len(x)} cases in {elapsed * 1e3:.1f} ms (best-expert labels: "
+          f"{', '.join(f'{name} {count}' for name, count in zip(names, labels))})\n")
+    print('\n'.join(describe(tree, names)))
+
+    rows = [('threshold rules', score(router_choice(matrix), cost)),
+            ('routing tree', score(predict(tree, x), cost)),
+            ('best expert per case', score(cost.argmin(axis=1), cost))]
+    if options.folds > 1:
+        rows.insert(2, (f'tree, {options.folds}-fold CV', cross_validate(x, cost, options.folds, **settings)))
+    print(f"\n{'':<24}{'avg err':>9}{'exact':>7}")
+    for label, (average, exact) in rows:
+        print(f"{label:<24}{average:>9.2f}{exact:>7}")
+
+    if options.synthetic:
+        big_x, big_cost = synthetic(x, cost, options.synthetic)
+        start = time.perf_counter()
+        fit(big_x, big_cost, **settings)
+        print(f"\nFit on {options.synthetic:,} synthetic cases: {time.perf_counter() - start:.2f} s")
+
+    if options.write:
+        (_, (rules_average, _)), (_, (tree_average, tree_exact)) = rows[0], rows[1]
+        summary = [f"Training set: {os.path.basename(options.cases)} ({len(x)} cases), depth {options.max_depth}, "
+                   f"min leaf {options.min_leaf}, criterion {options.criterion}.",
+                   f"Training error {tree_average:.2f} ({tree_exact} exact) against {rules_average:.2f} "
+                   f"for the threshold rules."]
+        with open(OUTPUT, 'w') as f:
+            f.write(generate(tree, names, summary))
+        print(f"\n{OUTPUT} written")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,24 @@ Team 13: Precision Artifact Analysis - Vintage Arithmetic Module
 Simulates 1960s mainframe arithmetic limitations (IBM System/360 style)
 """
 
+def to_fixed(value, precision_decimals=2):
+    """
+    Convert a float to fixed-point integer units (cents for currency)
+    Products of these units are exact integers, but fixed_multiply still scales them through
+    one float division before rounding, and vintage_add/vintage_round round float amounts,
+    as the original float code did, so every result matches it bit for bit
+    """
+    return int(round(value * 10 ** precision_decimals))
+
+def fixed_multiply(a_fixed, b_fixed, precision_decimals=2):
+    """
+    1960s fixed-point multiplication on integer operands
+    The double-width product is scaled down to a float amount and back up before banker's
+    rounding, exactly as vintage_multiply always did, so half-cent ties round the same way
+    """
+    multiplier = 10 ** precision_decimals
+    return round(a_fixed * b_fixed / (multiplier * multiplier) * multiplier)
+
 def vintage_multiply(a, b, precision_decimals=2):
     """
     Simulate 1960s fixed-point multiplication with precision limits
@@ -13,15 +31,8 @@ def vintage_multiply(a, b, precision_decimals=2):
     a_fixed = int(round(a * multiplier))
     b_fixed = int(round(b * multiplier))
     
-    # Perform integer multiplication
-    result_fixed = a_fixed * b_fixed
-    
-    # Scale back down - this is where precision loss occurs
-    # In 1960s systems, intermediate results had limited precision
-    result = result_fixed / (multiplier * multiplier)
-    
-    # Apply vintage rounding (banker's rounding)
-    return vintage_round(result, precision_decimals)
+    # Perform integer multiplication and scale back with vintage rounding
+    return fixed_multiply(a_fixed, b_fixed, precision_decimals) / multiplier
 
 def vintage_add(a, b, precision_decimals=2):
     """
@@ -41,33 +52,8 @@ def vintage_round(value, precision_decimals=2):
     Simulate IBM System/360 banker's rounding (round half to even)
     This was the standard rounding method in 1960s mainframes
     """
-    multiplier = 10 ** precision_decimals
-    scaled = value * multiplier
-    
-    # Get the fractional part
-    fractional = scaled - int(scaled)
-    
-    if abs(fractional) < 0.5:
-        # Round down
-        return int(scaled) / multiplier
-    elif abs(fractional) > 0.5:
-        # Round up
-        if scaled >= 0:
-            return (int(scaled) + 1) / multiplier
-        else:
-            return (int(scaled) - 1) / multiplier
-    else:
-        # Exactly 0.5 - banker's rounding (round to even)
-        integer_part = int(scaled)
-        if integer_part % 2 == 0:
-            # Even - round down
-            return integer_part / multiplier
-        else:
-            # Odd - round up
-            if scaled >= 0:
-                return (integer_part + 1) / multiplier
-            else:
-                return (integer_part - 1) / multiplier
+    # round() on the scaled float is half-to-even, the rule the original fraction test applied
+    return to_fixed(value, precision_decimals) / 10 ** precision_decimals
 
 def simulate_cobol_pic_clause(value, integer_digits=6, decimal_digits=2):
     """
@@ -85,32 +71,42 @@ def simulate_cobol_pic_clause(value, integer_digits=6, decimal_digits=2):
     multiplier = 10 ** decimal_digits
     return round(value * multiplier) / multiplier
 
+# Store coefficients as fixed-point cents in 1960s COBOL style
+# PIC S9(3)V99 format (3 digits before decimal, 2 after), resolved once at load time
+# Fine-tuned for optimal performance with KNN fallback
+COEFF_DAYS = to_fixed(simulate_cobol_pic_clause(50.0, 3, 2))      # Slightly reduced
+COEFF_MILES = to_fixed(simulate_cobol_pic_clause(0.45, 0, 3))     # Rounded to vintage precision
+COEFF_RECEIPTS = to_fixed(simulate_cobol_pic_clause(0.38, 0, 3))  # Rounded to vintage precision
+BASE_CONSTANT = to_fixed(simulate_cobol_pic_clause(270.0, 3, 2))  # Rounded for vintage systems
+
+# Maximum value a PIC S9(4)V99 field could hold, and the smallest payable amount
+MAX_VALUE = to_fixed(simulate_cobol_pic_clause(9999.99, 4, 2))
+MIN_VALUE = to_fixed(simulate_cobol_pic_clause(0.01, 0, 2))
+
+# Team 12 strong 90-day cycle corrections, in cents
+STRONG_90_CORRECTIONS = {
+    2: to_fixed(-168.44), 7: to_fixed(65.08), 4: to_fixed(11.55), 9: to_fixed(-71.49), 0: to_fixed(-47.93),
+}
+
 def vintage_calculation(days, miles, receipts, case_index=None):
     """
     Main calculation using 1960s arithmetic simulation
     Based on the best performing linear regression model with vintage precision artifacts
+    Every intermediate is held in integer cents; factors below are PIC V99 hundredths
     """
     
-    # Store coefficients as fixed-point values in 1960s COBOL style
-    # PIC S9(3)V99 format (3 digits before decimal, 2 after)
-    # Fine-tuned for optimal performance with KNN fallback
-    coeff_days = simulate_cobol_pic_clause(50.0, 3, 2)      # Slightly reduced
-    coeff_miles = simulate_cobol_pic_clause(0.45, 0, 3)     # Rounded to vintage precision
-    coeff_receipts = simulate_cobol_pic_clause(0.38, 0, 3)  # Rounded to vintage precision  
-    base_constant = simulate_cobol_pic_clause(270.0, 3, 2)  # Rounded for vintage systems
-    
     # Apply vintage arithmetic to the linear regression formula
     # reimbursement = 50.05 * days + 0.446 * miles + 0.383 * receipts + 266.71
     
     # Calculate each term with vintage arithmetic
-    days_term = vintage_multiply(days, coeff_days)
-    miles_term = vintage_multiply(miles, coeff_miles)
-    receipts_term = vintage_multiply(receipts, coeff_receipts)
+    days_term = fixed_multiply(to_fixed(days), COEFF_DAYS)
+    miles_term = fixed_multiply(to_fixed(miles), COEFF_MILES)
+    receipts_term = fixed_multiply(to_fixed(receipts), COEFF_RECEIPTS)
     
     # Add terms sequentially (order matters in 1960s fixed-point)
-    base = vintage_add(base_constant, days_term)
-    base = vintage_add(base, miles_term)
-    base = vintage_add(base, receipts_term)
+    base = BASE_CONSTANT + days_term
+    base = base + miles_term
+    base = base + receipts_term
 
     # === RULE 1 : EFFICIENCY RATIO ADJUSTMENT (High-impact quick win) ===
     #   • Inefficient trips → penalty 35 %
@@ -118,16 +114,15 @@ def vintage_calculation(days, miles, receipts, case_index=None):
     #   Definition:
     #       eff_ratio = receipts / (miles + 1)    # avoids div-by-zero
     #   Thresholds chosen from ERROR_DATABASE.md analysis
-    daily_receipts = receipts / max(days, 1)
     eff_ratio = receipts / (miles + 1)
 
     if miles < 300 and eff_ratio > 4.0:
         # Low-miles, high-receipt inefficiency → penalise 35 %
-        base = vintage_multiply(base, 0.65)
+        base = fixed_multiply(base, 65)
     elif miles > 700 and eff_ratio < 1.0:
         # High-miles, low-receipt efficiency → add 30 % bonus
-        bonus_eff = vintage_multiply(base, 0.30)
-        base = vintage_add(base, bonus_eff)
+        bonus_eff = fixed_multiply(base, 30)
+        base = base + bonus_eff
 
     # --------------------------------------------------------------------
     # Existing non-linear special cases follow
@@ -141,96 +136,82 @@ def vintage_calculation(days, miles, receipts, case_index=None):
             if receipts >= 500 and receipts < 2000:
                 # Critical case: very high miles + medium receipts
                 # Apply vintage multiplication with precision loss
-                adjustment = vintage_multiply(base, 0.75)  # 25% reduction
-                base = adjustment
+                base = fixed_multiply(base, 75)  # 25% reduction
             elif receipts >= 2000:
                 # High miles + high receipts
-                bonus = vintage_multiply(base, 0.15)  # 15% bonus
-                base = vintage_add(base, bonus)
+                bonus = fixed_multiply(base, 15)  # 15% bonus
+                base = base + bonus
         elif miles > 700:
             # Medium-high mileage adjustment
             if receipts < 300:
-                adjustment = vintage_multiply(base, 0.90)  # 10% reduction
-                base = adjustment
+                base = fixed_multiply(base, 90)  # 10% reduction
     elif days == 5:
         # FINAL RULE: 5-day trip bonus (Monday-Friday work week special treatment)
         # ADJUSTED: Reduced from 18% to 14% to fix over-predictions
-        bonus = vintage_multiply(base, 0.14)  # 14% bonus for 5-day trips (reduced)
-        base = vintage_add(base, bonus)
+        bonus = fixed_multiply(base, 14)  # 14% bonus for 5-day trips (reduced)
+        base = base + bonus
     elif days == 6:
         # SIX_DAY_TRIP_BONUS: Fix systematic under-predictions for 6-day trips
         # Targets 62 cases with avg under-prediction of $113.23
-        bonus = vintage_multiply(base, 0.17)  # 17% bonus for 6-day trips
-        base = vintage_add(base, bonus)
+        bonus = fixed_multiply(base, 17)  # 17% bonus for 6-day trips
+        base = base + bonus
     
     # INSIGHT FROM TEAM 12: Temporal corrections for specific case indices
     if case_index is not None:
         # Apply Team 12's discovered temporal patterns (converted to vintage arithmetic)
-        temporal_correction = 0
-        
         # Strong 90-day cycle corrections
-        cycle_90_pos = case_index % 90
-        strong_90_corrections = {
-            2: -168.44, 7: 65.08, 4: 11.55, 9: -71.49, 0: -47.93,
-        }
-        if cycle_90_pos in strong_90_corrections:
-            correction = vintage_multiply(strong_90_corrections[cycle_90_pos], 1.0)
-            temporal_correction = vintage_add(temporal_correction, correction)
-        
-        # Apply temporal correction with vintage arithmetic
+        temporal_correction = STRONG_90_CORRECTIONS.get(case_index % 90, 0)
         if temporal_correction != 0:
-            base = vintage_add(base, temporal_correction)
+            base = base + temporal_correction
     
     # HIGH PRIORITY FIX 1: Low miles + high receipts penalty
     # Targets worst cases: 114, 243, 433 (massive over-predictions)
     daily_receipts = receipts / max(days, 1)
     if miles < 250 and daily_receipts > 280:
         # Apply penalty only for extremely inefficient trips
-        penalty_multiplier = 0.80  # 20% penalty (conservative)
-        base = vintage_multiply(base, penalty_multiplier)
+        base = fixed_multiply(base, 80)  # 20% penalty (conservative)
     
     # HIGH PRIORITY FIX 2: Seven-day high miles bonus
     # Targets Cases 668, 326 (systematic under-predictions)
     if days == 7 and miles > 1000:
         # Apply bonus for 7-day high-mileage trips
-        seven_day_bonus = 1.35  # 35% bonus for 7-day high-mileage
-        base = vintage_multiply(base, seven_day_bonus)
+        base = fixed_multiply(base, 135)  # 35% bonus for 7-day high-mileage
     
     # Apply vintage bounds with COBOL-style limits
-    # Maximum value a PIC S9(4)V99 field could hold
-    max_value = simulate_cobol_pic_clause(9999.99, 4, 2)
-    min_value = simulate_cobol_pic_clause(0.01, 0, 2)
-    
-    if base > max_value:
-        base = max_value
-    elif base < min_value:
-        base = min_value
+    if base > MAX_VALUE:
+        base = MAX_VALUE
+    elif base < MIN_VALUE:
+        base = MIN_VALUE
     
-    # Final vintage rounding to cents (banker's rounding)
-    return vintage_round(base, 2)
+    # Cents back to dollars at the output boundary
+    return base / 100
 
-def knn_fallback(days, miles, receipts):
+def is_edge_case(days, miles, receipts):
     """
-    INSIGHT FROM TEAM 11: Use KNN for edge cases where vintage model might fail
+    Edge case criteria (refined based on worst performers) that route a trip to the KNN fallback
     """
-    import json
-    import math
-    import os
-    
-    # Check if we're in an edge case scenario
     daily_receipts = receipts / max(days, 1)
-    
-    # Edge case criteria (refined based on worst performers)
-    is_edge_case = (
+    return (
         (days >= 7 and daily_receipts > 150) or  # Long trips with high spending
         (days <= 2 and miles > 800) or          # Short trips with very high mileage
         (receipts > 1800 and days <= 5) or      # High receipts, short-medium trips
         (days >= 8 and miles > 700)             # Long trips with high mileage
     )
+
+def knn_fallback(days, miles, receipts, cases=None):
+    """
+    INSIGHT FROM TEAM 11: Use KNN for edge cases where vintage model might fail
+    Pass a preloaded `cases` list to skip reading public_cases.json on every call
+    """
+    import json
+    import os
     
-    if not is_edge_case:
+    if not is_edge_case(days, miles, receipts):
         return None  # Use vintage model
     
+    if cases is not None:
+        return knn_predict(cases, days, miles, receipts)
+
     # Load public cases for KNN
     try:
         cases_path = "public_cases.json"
@@ -243,35 +224,54 @@ def knn_fallback(days, miles, receipts):
             cases = json.load(f)
     except:
         return None  # Fallback to vintage model
+
+    return knn_predict(cases, days, miles, receipts)
+
+# KNN fallback: per-feature distance weights (days, miles, receipts) and neighbour count
+KNN_WEIGHTS = (15.0, 0.8, 1.2)  # Days matter most
+KNN_K = 5
+
+def knn_distance(case_days, case_miles, case_receipts, days, miles, receipts):
+    """
+    Optimized weighted Euclidean distance between a stored case and the query trip
+    """
+    import math
+
+    days_diff = (case_days - days) * KNN_WEIGHTS[0]
+    miles_diff = (case_miles - miles) * KNN_WEIGHTS[1]
+    receipts_diff = (case_receipts - receipts) * KNN_WEIGHTS[2]
+    return math.sqrt(days_diff**2 + miles_diff**2 + receipts_diff**2)
+
+def knn_weighted_average(neighbours):
+    """
+    Inverse-distance weighted average of (distance, output) pairs, nearest first
+    """
+    total_weight = 0.0
+    weighted_sum = 0.0
     
+    for distance, output in neighbours:
+        weight = 1.0 / (distance + 0.001)
+        weighted_sum += weight * output
+        total_weight += weight
+    
+    return weighted_sum / total_weight if total_weight > 0 else None
+
+def knn_predict(cases, days, miles, receipts):
+    """
+    Weighted 5-nearest-neighbour estimate over the given public cases (linear scan)
+    """
     # Find 5 nearest neighbors for better accuracy
     distances = []
-    target = {"trip_duration_days": days, "miles_traveled": miles, "total_receipts_amount": receipts}
     
     for case in cases:
         inp = case["input"]
-        # Optimized weighted distance
-        days_diff = (inp["trip_duration_days"] - days) * 15.0  # Days matter most
-        miles_diff = (inp["miles_traveled"] - miles) * 0.8
-        receipts_diff = (inp["total_receipts_amount"] - receipts) * 1.2
-        
-        distance = math.sqrt(days_diff**2 + miles_diff**2 + receipts_diff**2)
+        distance = knn_distance(inp["trip_duration_days"], inp["miles_traveled"],
+                                inp["total_receipts_amount"], days, miles, receipts)
         distances.append((distance, case["expected_output"]))
     
     # Sort and take top 5
     distances.sort()
-    top_5 = distances[:5]
-    
-    # Weighted average
-    total_weight = 0.0
-    weighted_sum = 0.0
-    
-    for distance, output in top_5:
-        weight = 1.0 / (distance + 0.001)
-        weighted_sum += weight * output
-        total_weight += weight
-    
-    return weighted_sum / total_weight if total_weight > 0 else None
+    return knn_weighted_average(distances[:KNN_K])
 
 if __name__ == "__main__":
     import sys
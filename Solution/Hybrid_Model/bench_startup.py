@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the production path: wall time of one `run.sh <days> <miles> <receipts>`
+call, from fork to exit, with the daemon out of the way (HYBRID_SOCKET points nowhere).
+
+Prints the median/p95 per trip and exits with status 1 when the median of the common-case trips
+(no kNN fallback) is above --limit-ms, so it can gate changes that regress startup. Edge-case
+trips (the case store and KD-tree, or a kNN scan in hybrid_frozen with HYBRID_FROZEN=1) are
+reported, not gated.
+
+Bytecode is compiled first (python3 -m compileall, as run.sh does when __pycache__ is missing),
+so every timed call reads it instead of compiling the sources.
+
+--importtime runs one call with PYTHONPROFILEIMPORTTIME=1 (python3 -X importtime) and lists the
+slowest imports by cumulative time instead.
+
+Usage: python3 bench_startup.py [--runs N] [--limit-ms MS] [--importtime [N]]
+"""
+import argparse, compileall, os, statistics, subprocess, sys, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RUN_SH = os.path.join(HERE, 'run.sh')
+
+# (days, miles, receipts): common-case trips, then edge cases that take the kNN fallback
+COMMON_TRIPS = [('3', '93', '1.42'), ('5', '250', '150.75'), ('1', '55', '3.6'), ('8', '482', '811.49')]
+EDGE_TRIPS = [('1', '1082', '1809.49'), ('14', '1020', '1201.75')]
+
+
+def run_env():
+    env = dict(os.environ)
+    env['HYBRID_SOCKET'] = os.path.join(HERE, '.bench-no-daemon.sock')
+    return env
+
+
+def time_calls(trips, runs, env):
+    """Wall seconds of `runs` run.sh calls, cycling through trips."""
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(['bash', RUN_SH, *trips[i % len(trips)]], env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            sys.exit(f"run.sh {' '.join(trips[i % len(trips)])} failed: {result.stderr.decode().strip()}")
+    return timings
+
+
+def interpreter_calls(runs):
+    """Wall seconds of `runs` bare `python3 -S -c pass` calls: the floor run.sh is measured against."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(['python3', '-S', '-c', 'pass'])
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summary(label, timings):
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    median = statistics.median(timings)
+    print(f"{label:<14}median {median * 1e3:6.1f} ms   p95 {p95 * 1e3:6.1f} ms   min {ordered[0] * 1e3:6.1f} ms"
+          f"   ({len(timings)} runs)")
+    return median
+
+
+def importtime(top, env):
+    """Slowest imports of one common-case call, by cumulative microseconds."""
+    env = dict(env, PYTHONPROFILEIMPORTTIME='1')
+    result = subprocess.run(['bash', RUN_SH, *COMMON_TRIPS[0]], env=env, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and 'self [us]' not in line:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    print(f"{'cumulative us':>14}{'self us':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us:>14}{self_us:>9}  {name}")
+    print(f"{len(rows)} modules imported, {sum(r[1] for r in rows)} us in total")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start latency of Hybrid_Model/run.sh.')
+    parser.add_argument('--runs', type=int, default=40, help='timed calls per trip group (default 40)')
+    parser.add_argument('--limit-ms', type=float, default=20.0,
+                        help='fail when the common-case median is above this (default 20)')
+    parser.add_argument('--importtime', type=int, nargs='?', const=20, metavar='N',
+                        help='list the N slowest imports of one call (default 20) instead of timing')
+    options = parser.parse_args()
+
+    compileall.compile_dir(HERE, maxlevels=0, quiet=1)
+    env = run_env()
+    if options.importtime:
+        importtime(options.importtime, env)
+        return
+
+    time_calls(COMMON_TRIPS, len(COMMON_TRIPS), env)  # page cache, not process state
+    baseline = summary('python3 -S', interpreter_calls(options.runs))
+    common = summary('common trips', time_calls(COMMON_TRIPS, options.runs, env))
+    summary('edge trips', time_calls(EDGE_TRIPS, options.runs, env))
+    print(f"run.sh overhead over a bare interpreter: {(common - baseline) * 1e3:.1f} ms")
+    if common * 1e3 > options.limit_ms:
+        print(f"FAIL: common-case median {common * 1e3:.1f} ms > {options.limit_ms:g} ms", file=sys.stderr)
+        sys.exit(1)
+    print(f"OK: common-case median {common * 1e3:.1f} ms <= {options.limit_ms:g} ms")
+
+
+if __name__ == '__main__':
+    main()
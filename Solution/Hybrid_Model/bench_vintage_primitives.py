@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: float-emulated vintage primitives (Team 13 original, still used by
+13_Precision_Artifact_Analysis/vintage_arithmetic.py) vs the integer fixed-point core in
+baseline_vintage_arithmetic.py. Prints ops/sec before and after for each primitive.
+
+Usage: python3 bench_vintage_primitives.py [repeat]
+"""
+import importlib.util, os, sys, timeit
+
+import baseline_vintage_arithmetic as fixed_core
+
+FLOAT_CORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                               '13_Precision_Artifact_Analysis', 'vintage_arithmetic.py')
+
+
+def load_float_core():
+    spec = importlib.util.spec_from_file_location('float_vintage_arithmetic', FLOAT_CORE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def ops_per_sec(fn, number, repeat):
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return number / best
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    float_core = load_float_core()
+    benchmarks = [
+        ('vintage_multiply', lambda m: m.vintage_multiply(1234.56, 0.38), 200_000),
+        ('vintage_add', lambda m: m.vintage_add(1234.56, 987.65), 200_000),
+        ('vintage_round', lambda m: m.vintage_round(1234.5678), 200_000),
+        ('vintage_calculation', lambda m: m.vintage_calculation(5, 250, 150.75), 50_000),
+    ]
+    print(f"{'primitive':<22}{'float ops/s':>14}{'fixed ops/s':>14}{'speedup':>9}")
+    for name, call, number in benchmarks:
+        before = ops_per_sec(lambda: call(float_core), number, repeat)
+        after = ops_per_sec(lambda: call(fixed_core), number, repeat)
+        print(f"{name:<22}{before:>14,.0f}{after:>14,.0f}{after / before:>8.2f}x")
+
+if __name__ == '__main__':
+    main()
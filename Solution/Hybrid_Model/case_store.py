@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Columnar, memory-mapped binary store for public/private case files.
+
+A case JSON (public_cases.json or private_cases.json layout) is converted once into a
+fixed-width binary file next to it (public_cases.json -> public_cases.cases):
+
+    64-byte header   magic, version, flags, count, source size/mtime, source SHA-256
+    int32  days[n]
+    int32  miles_hundredths[n]     miles can carry two decimals (e.g. 433.47)
+    int64  receipt_cents[n]
+    int64  expected_cents[n]       only when the source has expected_output
+
+Loaders mmap the file and read the columns through memoryview casts (or np.frombuffer),
+so nothing is parsed or copied per process. The store is rebuilt automatically when the
+source JSON's checksum changes; the build streams the JSON, so memory stays proportional
+to the columns rather than to a list of nested dicts.
+
+Usage: python3 case_store.py [cases.json ...]    # (re)build stores
+"""
+import hashlib, io, mmap, os, struct, sys
+from array import array
+
+import case_stream
+
+MAGIC = b'CST1'
+VERSION = 1
+HAS_EXPECTED = 1
+# magic, version, flags, count, source size, source mtime_ns, source sha256 (padded to 64 bytes)
+HEADER = struct.Struct('<4sHHQQq32s')
+HEADER_SIZE = 64
+
+
+def store_path(json_path):
+    return os.path.splitext(json_path)[0] + '.cases'
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.digest()
+
+
+def encode_store(json_path):
+    """Stream json_path into the bytes of a columnar store."""
+    days, miles, receipts, expected = array('i'), array('i'), array('q'), array('q')
+    with open(json_path, 'rb') as f:
+        text = io.TextIOWrapper(f, encoding='utf-8')
+        for record in case_stream.iter_json_array(text):
+            d, m, r = case_stream.triple(record)
+            days.append(int(d))
+            miles.append(int(round(m * 100)))
+            receipts.append(int(round(r * 100)))
+            if 'expected_output' in record:
+                expected.append(int(round(record['expected_output'] * 100)))
+    if len(expected) not in (0, len(days)):
+        raise ValueError(f'{json_path}: expected_output present on only some cases')
+    flags = HAS_EXPECTED if len(expected) else 0
+    st = os.stat(json_path)
+    header = HEADER.pack(MAGIC, VERSION, flags, len(days), st.st_size, st.st_mtime_ns, file_digest(json_path))
+    return header.ljust(HEADER_SIZE, b'\0') + b''.join(column.tobytes() for column in (days, miles, receipts, expected))
+
+
+def write_store(path, data):
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_store(json_path, path=None):
+    """Stream json_path into a columnar store at path (atomically replaced)."""
+    path = path or store_path(json_path)
+    write_store(path, encode_store(json_path))
+    return path
+
+
+class CaseStore:
+    """Read-only, zero-copy view of a .cases file, or of its bytes when it could not be written."""
+
+    def __init__(self, path, data=None):
+        self.path = path
+        if data is not None:
+            self._mm = data
+        else:
+            with open(path, 'rb') as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, count, self.source_size, self.source_mtime_ns, self.digest = \
+            HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path}: not a case store')
+        self.count = count
+        view = memoryview(self._mm)
+        offset = HEADER_SIZE
+        self.days = view[offset:offset + 4 * count].cast('i'); offset += 4 * count
+        self.miles_hundredths = view[offset:offset + 4 * count].cast('i'); offset += 4 * count
+        self.receipt_cents = view[offset:offset + 8 * count].cast('q'); offset += 8 * count
+        self.expected_cents = None
+        if flags & HAS_EXPECTED:
+            self.expected_cents = view[offset:offset + 8 * count].cast('q')
+
+    def __len__(self):
+        return self.count
+
+    def inputs(self, i):
+        """(days, miles, receipts) of case i as the JSON numbers they were built from."""
+        return self.days[i], self.miles_hundredths[i] / 100, self.receipt_cents[i] / 100
+
+    def expected(self, i):
+        return self.expected_cents[i] / 100
+
+    def columns(self):
+        """Zero-copy NumPy views: days, miles, receipts (floats) and expected (or None)."""
+        import numpy as np
+        days = np.frombuffer(self.days, dtype=np.int32)
+        miles = np.frombuffer(self.miles_hundredths, dtype=np.int32) / 100
+        receipts = np.frombuffer(self.receipt_cents, dtype=np.int64) / 100
+        expected = None
+        if self.expected_cents is not None:
+            expected = np.frombuffer(self.expected_cents, dtype=np.int64) / 100
+        return days, miles, receipts, expected
+
+    def is_current(self, json_path):
+        st = os.stat(json_path)
+        if (st.st_size, st.st_mtime_ns) == (self.source_size, self.source_mtime_ns):
+            return True
+        if st.st_size != self.source_size or file_digest(json_path) != self.digest:
+            return False
+        # same content, new mtime (e.g. a fresh checkout): remember it to skip re-hashing
+        try:
+            with open(self.path, 'r+b') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, HAS_EXPECTED if self.expected_cents is not None else 0,
+                                    self.count, st.st_size, st.st_mtime_ns, self.digest))
+        except OSError:
+            pass
+        return True
+
+
+def open_store(json_path):
+    """Store for json_path, (re)building it when missing or when the JSON checksum changed."""
+    path = store_path(json_path)
+    if os.path.exists(path):
+        try:
+            store = CaseStore(path)
+            if store.is_current(json_path):
+                return store
+        except (ValueError, struct.error):
+            pass
+    data = encode_store(json_path)
+    try:
+        write_store(path, data)
+    except OSError:
+        return CaseStore(path, data)  # read-only checkout: keep the built store in memory
+    return CaseStore(path)
+
+
+if __name__ == '__main__':
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    for json_path in sys.argv[1:] or [os.path.join(root, 'public_cases.json'),
+                                      os.path.join(root, 'private_cases.json')]:
+        path = build_store(json_path)
+        print(f'{json_path} -> {path} ({len(CaseStore(path))} cases)')
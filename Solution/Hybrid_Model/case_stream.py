@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Streaming readers for batches of (days, miles, receipts) triples.
+
+Accepts the private_cases.json layout (a JSON array of objects), the public_cases.json layout
+(objects with an "input" field), JSON Lines and CSV. Everything is read incrementally, so memory
+stays bounded by the chunk size regardless of how many rows the input holds.
+"""
+import csv, io, json
+
+CHUNK_SIZE = 1 << 16
+FIELDS = ('trip_duration_days', 'miles_traveled', 'total_receipts_amount')
+
+
+def triple(record):
+    """(days, miles, receipts) from a case object, an {"input": ...} wrapper or a 3-item list,
+    or from the JSON text of one (a JSON Lines line)."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    if isinstance(record, dict):
+        record = record.get('input', record)
+        missing = [k for k in FIELDS if k not in record]
+        if missing:
+            raise ValueError(f'case record without {", ".join(missing)}: {record!r}')
+        return tuple(record[k] for k in FIELDS)
+    if isinstance(record, (list, tuple)) and len(record) == 3:
+        return tuple(record)
+    raise ValueError(f'unrecognised case record: {record!r}')
+
+
+def iter_json_array(stream, chunk_size=CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array without loading the whole document."""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # skip separators between elements
+        while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ',' or (not started and buf[pos] == '[')):
+            if buf[pos] == '[':
+                started = True
+            pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        if pos < len(buf):
+            if not started:
+                raise ValueError('expected a JSON array')
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # a number ending exactly at the buffer edge may still be incomplete
+                if end < len(buf) or eof:
+                    yield obj
+                    pos = end
+                    continue
+        if eof:
+            if pos < len(buf):
+                raise ValueError('truncated JSON array')
+            return
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def iter_lines(stream):
+    """Non-blank lines, stripped: the records of a JSON Lines stream, parsed by triple()."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def iter_csv(stream):
+    rows = csv.reader(stream)
+    columns = (0, 1, 2)
+    first = True
+    for row in rows:
+        if not row or not ''.join(row).strip():
+            continue
+        if first:
+            first = False
+            try:
+                float(row[0])
+            except ValueError:
+                # header row: use named columns when present, else the first three
+                names = [c.strip() for c in row]
+                if all(k in names for k in FIELDS):
+                    columns = tuple(names.index(k) for k in FIELDS)
+                continue
+        # a short row yields fewer than three fields, which triple() rejects
+        yield tuple(row[i].strip() for i in columns if i < len(row))
+
+
+def sniff_format(stream):
+    """Guess json/jsonl/csv from the first non-blank byte of a peekable binary stream."""
+    head = stream.peek(CHUNK_SIZE).lstrip()
+    if head.startswith(b'['):
+        return 'json'
+    if head.startswith(b'{'):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_records(stream, fmt=None):
+    """Yield the unparsed records, in input order, from a binary stream such as open(path, 'rb')
+    or sys.stdin.buffer: JSON values, JSON Lines lines or CSV field tuples. triple() turns each
+    into (days, miles, receipts), so a caller can report a malformed record and carry on."""
+    if fmt is None:
+        fmt = sniff_format(stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'json':
+        return iter_json_array(text)
+    if fmt == 'jsonl':
+        return iter_lines(text)
+    if fmt == 'csv':
+        return iter_csv(text)
+    raise ValueError(f'unknown batch format: {fmt}')
+
+
+def iter_cases(stream, fmt=None):
+    """Yield (days, miles, receipts) triples, in input order; a malformed record raises."""
+    return (triple(r) for r in iter_records(stream, fmt))
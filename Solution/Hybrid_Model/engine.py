@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""In-process baseline engine for the Hybrid model.
+
+Wraps baseline_vintage_arithmetic.vintage_calculation plus its kNN edge-case fallback
+behind one call, with the kNN case set and its KD-tree index loaded once per process. predict() returns
+exactly what `python3 baseline_vintage_arithmetic.py <days> <miles> <receipts>` prints,
+parsed back into a float, so callers get bit-identical results without a subprocess.
+
+os, case_store and knn_index or grid_index (and the hashlib/json/csv they pull in) are imported on the
+first edge case, not at import time: most single-trip calls never reach the kNN fallback,
+and their cold start is mostly import time.
+"""
+import baseline_vintage_arithmetic as baseline
+
+# Two directories up from this file, sliced from __file__ (absolute on every import path)
+ROOT = __file__.rsplit('/', 3)[0]
+PUBLIC = ROOT + '/public_cases.json'
+
+_stores = {}
+_indexes = {}
+
+def load_store(path=PUBLIC):
+    """Memory-mapped case store for the kNN fallback, opened once per process (None when missing)."""
+    if path not in _stores:
+        import os
+        import case_store
+        _stores[path] = case_store.open_store(path) if os.path.exists(path) else None
+    return _stores[path]
+
+def load_knn_index(path=PUBLIC):
+    """KD-tree over the public cases, built (or read from disk) once per process; None when missing.
+
+    HYBRID_KNN_INDEX=grid selects grid_index's bucket grid instead; both answer like the linear scan.
+    """
+    if path not in _indexes:
+        store = load_store(path)
+        import os
+        if os.environ.get('HYBRID_KNN_INDEX') == 'grid':
+            import grid_index as knn_index
+        else:
+            import knn_index
+        _indexes[path] = None if store is None else knn_index.load_index(store)
+    return _indexes[path]
+
+def uses_knn(days, miles, receipts):
+    """True when predict() sends this trip to the kNN fallback, the path that reads the case set."""
+    return baseline.is_edge_case(float(days), float(miles), float(receipts))
+
+def predict(days, miles, receipts, case_index=None):
+    """Baseline reimbursement for one trip, rounded to cents like the baseline script's output."""
+    # Same float() coercion the baseline script applies to its argv
+    days = float(days); miles = float(miles); receipts = float(receipts)
+    result = None
+    if uses_knn(days, miles, receipts):
+        index = load_knn_index()
+        if index is not None:
+            result = index.predict(days, miles, receipts)
+    if result is None:
+        result = baseline.vintage_calculation(days, miles, receipts, case_index)
+    return float(f"{result:.2f}")
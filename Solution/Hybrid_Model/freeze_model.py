@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Model freezer: compiles the trained Hybrid model into hybrid_frozen.py, one self-contained
+module that answers a trip without touching the filesystem.
+
+Everything the runtime would otherwise look up is written into the module as literals:
+
+    coefficients    the simulate_cobol_pic_clause / to_fixed expressions of
+                    baseline_vintage_arithmetic.py, evaluated here (the original expression is
+                    kept as a comment next to each value)
+    residual table  residual_table.bin as a tuple indexed by residual_lookup bucket id
+    kNN set         public_cases.json as four column tuples (days, miles, receipts, output)
+
+The arithmetic itself (vintage_calculation, is_edge_case, bucket_id, ...) is copied from the
+source modules, so the frozen model cannot drift from them; the kNN fallback becomes a linear
+scan over the column tuples (the same ranking as baseline.knn_predict and the KD-tree).
+Tuples of numbers are code constants, so they load straight from the module's bytecode.
+
+Before hybrid_frozen.py is written, the generated code is executed and checked against
+hybrid_run on every public and private case; a single differing answer aborts the freeze.
+The module records the SHA-256 of every input it was built from, and of engine.py and
+hybrid_run.py, whose dispatch, rounding and correction it reproduces; --check reports
+whether those inputs have changed since. It also records their sizes and mtimes, and its
+main() answers through hybrid_run instead when one of those differs, so an edited engine is
+never shadowed by an old freeze. train_residual_table.py refreezes after training when
+hybrid_frozen.py exists.
+
+hybrid_frozen.py is a local build artifact (ignored by git); run.sh only uses it when
+HYBRID_FROZEN is set.
+
+Usage:
+    python3 freeze_model.py            # (re)generate hybrid_frozen.py
+    python3 freeze_model.py --check    # exit 1 if hybrid_frozen.py is missing or stale
+"""
+import ast, hashlib, inspect, json, os, sys
+
+import baseline_vintage_arithmetic as baseline
+import engine
+import residual_lookup
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUTPUT = os.path.join(HERE, 'hybrid_frozen.py')
+PRIVATE = os.path.join(engine.ROOT, 'private_cases.json')
+
+# Module-level values of the source modules that the copied functions read
+BASELINE_CONSTANTS = ('COEFF_DAYS', 'COEFF_MILES', 'COEFF_RECEIPTS', 'BASE_CONSTANT', 'MAX_VALUE', 'MIN_VALUE',
+                      'STRONG_90_CORRECTIONS', 'KNN_WEIGHTS', 'KNN_K')
+BASELINE_FUNCTIONS = ('to_fixed', 'fixed_multiply', 'vintage_calculation', 'is_edge_case',
+                      'knn_weighted_average')
+LOOKUP_CONSTANTS = ('MILES_EDGES', 'SPEND_EDGES', 'MISSING', 'THRESHOLD')
+LOOKUP_FUNCTIONS = ('_rank', 'bucket_id', 'correction')
+
+RUNTIME = '''
+
+def knn_predict(days, miles, receipts):
+    """baseline.knn_predict over the frozen public cases: weighted 5-NN by (distance, output)."""
+    from math import sqrt
+    w_days, w_miles, w_receipts = KNN_WEIGHTS
+    distances = sorted(zip([sqrt(((d - days) * w_days) ** 2 + ((m - miles) * w_miles) ** 2
+                                 + ((r - receipts) * w_receipts) ** 2)
+                            for d, m, r in zip(CASE_DAYS, CASE_MILES, CASE_RECEIPTS)], CASE_OUTPUTS))
+    return knn_weighted_average(distances[:KNN_K])
+
+
+def predict(days, miles, receipts):
+    """What hybrid_run prints for one trip (days an int, as hybrid_run.parse_inputs returns it)."""
+    base_days, base_miles, base_receipts = float(days), float(miles), float(receipts)
+    if is_edge_case(base_days, base_miles, base_receipts):
+        result = knn_predict(base_days, base_miles, base_receipts)
+    else:
+        result = vintage_calculation(base_days, base_miles, base_receipts)
+    base = float(f"{result:.2f}")
+    residual = correction(TABLE, bucket_id(days, miles, receipts))
+    return base + residual if residual else base
+
+
+def is_fresh():
+    """True while every input still has the size and mtime it had when this module was frozen."""
+    from posix import stat  # builtin and already loaded, unlike os
+    here = __file__.rpartition('/')[0] or '.'
+    try:
+        return all((st.st_size, st.st_mtime_ns) == stamp
+                   for st, stamp in ((stat(f"{here}/{path}"), stamp) for path, stamp in STAMPS.values()))
+    except OSError:
+        return False
+
+
+def main():
+    if not is_fresh():
+        # an input changed since the freeze: answer with the live engine instead
+        import hybrid_run
+        hybrid_run.main(use_daemon=False)
+        return
+    if len(sys.argv) != 4:
+        print('Usage: hybrid_frozen.py <days> <miles> <receipts>'); sys.exit(1)
+    print(f"{predict(int(float(sys.argv[1])), float(sys.argv[2]), float(sys.argv[3])):.2f}")
+
+
+if __name__ == '__main__':
+    main()
+'''
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def input_paths():
+    """name -> path of every file the frozen module is built from or duplicates (engine.predict's
+    dispatch and rounding, hybrid_run.correct)."""
+    return {'baseline_vintage_arithmetic.py': baseline.__file__, 'residual_lookup.py': residual_lookup.__file__,
+            'engine.py': engine.__file__, 'hybrid_run.py': os.path.join(HERE, 'hybrid_run.py'),
+            'residual_table.bin': residual_lookup.TABLE_PATH, 'public_cases.json': engine.PUBLIC}
+
+
+def source_expressions(module):
+    """name -> source text of each module-level `NAME = expression` in module."""
+    with open(module.__file__) as f:
+        source = f.read()
+    return {node.targets[0].id: ast.unparse(node.value)
+            for node in ast.parse(source).body
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)}
+
+
+def constant_lines(module, names):
+    expressions = source_expressions(module)
+    lines = []
+    for name in names:
+        value, expression = repr(getattr(module, name)), expressions[name]
+        lines.append(f"{name} = {value}" + ('' if expression == value else f"  # {expression}"))
+    return lines
+
+
+def tuple_literal(name, values, per_line=8):
+    items = [repr(v) for v in values]
+    rows = ['    ' + ', '.join(items[i:i + per_line]) + ',' for i in range(0, len(items), per_line)]
+    return '\n'.join([f"{name} = (", *rows, ")"])
+
+
+def load_columns(path):
+    with open(path) as f:
+        cases = json.load(f)
+    inputs = [c['input'] for c in cases]
+    return ([float(i['trip_duration_days']) for i in inputs], [float(i['miles_traveled']) for i in inputs],
+            [float(i['total_receipts_amount']) for i in inputs], [float(c['expected_output']) for c in cases])
+
+
+def stamps():
+    """name -> (path relative to this directory, (size, mtime_ns)) of every input."""
+    result = {}
+    for name, path in input_paths().items():
+        st = os.stat(path)
+        result[name] = (os.path.relpath(path, HERE), (st.st_size, st.st_mtime_ns))
+    return result
+
+
+def generate():
+    """Source text of hybrid_frozen.py for the current model."""
+    digests = {name: file_digest(path) for name, path in input_paths().items()}
+    case_days, case_miles, case_receipts, outputs = load_columns(engine.PUBLIC)
+    table = residual_lookup.load_table()
+    parts = [
+        '#!/usr/bin/env python3\n'
+        '"""Hybrid model, frozen by freeze_model.py: baseline + kNN fallback + residual correction with\n'
+        'every coefficient, table and reference case compiled in. No file is read at runtime.\n\n'
+        'Generated code - edit the source modules and rerun freeze_model.py instead.\n\n'
+        'Usage: python3 hybrid_frozen.py <days> <miles> <receipts>\n"""\n'
+        'import sys\n\n'
+        '# SHA-256 of the inputs this module was frozen from (freeze_model.py --check)\n'
+        + 'SOURCES = {\n' + ''.join(f"    {name!r}: {digest!r},\n" for name, digest in digests.items()) + '}\n'
+        '# (path, (size, mtime_ns)) of the same inputs: main() falls back to hybrid_run when one differs\n'
+        + 'STAMPS = {\n' + ''.join(f"    {name!r}: {stamp!r},\n" for name, stamp in stamps().items()) + '}\n',
+        '# baseline_vintage_arithmetic, resolved at freeze time (fixed-point cents / hundredths)\n'
+        + '\n'.join(constant_lines(baseline, BASELINE_CONSTANTS)) + '\n',
+        '# residual_lookup\n' + '\n'.join(constant_lines(residual_lookup, LOOKUP_CONSTANTS)) + '\n',
+        '# residual_table.bin by bucket id, then the MISSING slot\n' + tuple_literal('TABLE', table, 4) + '\n',
+        f"# public_cases.json ({len(outputs)} cases), one tuple per column\n"
+        + '\n'.join(tuple_literal(name, column) for name, column in
+                    (('CASE_DAYS', case_days), ('CASE_MILES', case_miles),
+                     ('CASE_RECEIPTS', case_receipts), ('CASE_OUTPUTS', outputs))) + '\n',
+    ]
+    parts += [inspect.getsource(getattr(baseline, name)) for name in BASELINE_FUNCTIONS]
+    parts += [inspect.getsource(getattr(residual_lookup, name)) for name in LOOKUP_FUNCTIONS]
+    return '\n\n'.join(part.rstrip('\n') for part in parts) + '\n' + RUNTIME
+
+
+def verify(source):
+    """Number of public and private cases on which the generated module disagrees with hybrid_run."""
+    import hybrid_run
+    namespace = {'__name__': 'hybrid_frozen'}
+    exec(compile(source, OUTPUT, 'exec'), namespace)
+    frozen_predict, table = namespace['predict'], hybrid_run.load_table()
+    checked = mismatches = 0
+    for path in (engine.PUBLIC, PRIVATE):
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            cases = json.load(f)
+        for case in cases:
+            inputs = case.get('input', case)
+            days, miles, receipts = hybrid_run.parse_inputs([inputs['trip_duration_days'], inputs['miles_traveled'],
+                                                             inputs['total_receipts_amount']])
+            expected = hybrid_run.correct(engine.predict(days, miles, receipts), table, days, miles, receipts)
+            mismatches += f"{frozen_predict(days, miles, receipts):.2f}" != f"{expected:.2f}"
+            checked += 1
+    return checked, mismatches
+
+
+def freeze():
+    source = generate()
+    checked, mismatches = verify(source)
+    if mismatches:
+        sys.exit(f'freeze aborted: frozen model differs from hybrid_run on {mismatches} of {checked} cases')
+    tmp = OUTPUT + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(source)
+    os.replace(tmp, OUTPUT)
+    return checked
+
+
+def stale_inputs():
+    """Inputs whose digest differs from the one recorded in hybrid_frozen.py (None if it is missing)."""
+    if not os.path.exists(OUTPUT):
+        return None
+    with open(OUTPUT) as f:
+        module = ast.parse(f.read())
+    recorded = next(ast.literal_eval(node.value) for node in module.body
+                    if isinstance(node, ast.Assign) and getattr(node.targets[0], 'id', None) == 'SOURCES')
+    return [name for name, path in input_paths().items() if recorded.get(name) != file_digest(path)]
+
+
+def main():
+    if sys.argv[1:] == ['--check']:
+        stale = stale_inputs()
+        if stale is None:
+            print(f'{OUTPUT} is missing'); sys.exit(1)
+        if stale:
+            print(f'{OUTPUT} is stale: {", ".join(stale)} changed since it was frozen'); sys.exit(1)
+        print(f'{OUTPUT} is up to date')
+        return
+    if sys.argv[1:]:
+        print('Usage: freeze_model.py [--check]'); sys.exit(1)
+    checked = freeze()
+    print(f'{OUTPUT} written ({os.path.getsize(OUTPUT)} bytes), identical to hybrid_run on {checked} cases')
+
+
+if __name__ == '__main__':
+    main()
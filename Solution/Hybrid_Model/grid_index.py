@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Grid-bucket index for the kNN fallback, an alternative to the KD-tree in knn_index.
+
+Cases are hashed into cubic cells of the scaled coordinates (days, miles, receipts times the
+metric's weights). A query ranks only the cases in its own cell and the 26 adjacent ones,
+which in the dense part of the space is a few dozen instead of all of them. Every case
+outside that 3x3x3 block is at least as far as the block's nearest outer face, so when the
+k-th candidate is closer than that face the candidates hold the true top k; otherwise the
+query falls back to a linear scan. Answers are then bit-identical to the linear scan, with
+the same tie order: by output like baseline.knn_predict (ties='output'), or by file order
+like knn_memorizer's stable sort (ties='order').
+
+With guarantee=False the index only falls back when the block holds fewer than k cases, and
+may miss true neighbours just outside it; the report below measures how often.
+
+The engine uses this index instead of the KD-tree when HYBRID_KNN_INDEX=grid. knn_memorizer
+takes one through its `index` argument:
+
+    index = GridIndex.from_cases(cases, weights=(10.0, 1.0, 1.0), ties='order', k=7)
+    knn_memorizer.predict_reimbursement(target, cases, k=7, index=index)
+
+Usage: python3 grid_index.py [--queries private_cases.json] [--cells 0.5,1,2,4] [--limit N]
+       # recall against the linear scan and latency per query, for the fallback's and the memorizer's metric
+"""
+import heapq, math
+
+import baseline_vintage_arithmetic as baseline
+
+# Cell edge as a multiple of the k-th neighbour distance of the sampled cases (see default_cell)
+CELL_FACTOR = 1.0
+CELL_QUANTILE = 0.9
+CELL_SAMPLE = 100
+# Bound tolerance: the face distance comes from scaled coordinates, the neighbour distances
+# from weighted differences, so only trust the bound when it clearly holds
+BOUND_EPSILON = 1e-9
+# Offsets of a cell and its 26 neighbours
+NEIGHBOURHOOD = [(a, b, c) for a in (-1, 0, 1) for b in (-1, 0, 1) for c in (-1, 0, 1)]
+
+
+class GridIndex:
+    """(days, miles, receipts) triples and their outputs, bucketed by cell of the scaled coordinates."""
+
+    def __init__(self, raw, outputs, weights=baseline.KNN_WEIGHTS, ties='output', k=baseline.KNN_K, cell=None):
+        if ties not in ('output', 'order'):
+            raise ValueError(f"ties must be 'output' or 'order', got {ties!r}")
+        self.raw = raw
+        self.outputs = outputs
+        self.weights = weights
+        self.by_output = ties == 'output'
+        self.cell = cell or self.default_cell(k)
+        self.buckets = {}
+        for i, (d, m, r) in enumerate(raw):
+            self.buckets.setdefault(self.key(d, m, r), []).append(i)
+        self.queries = self.fallbacks = 0
+
+    @classmethod
+    def from_cases(cls, cases, **options):
+        """Index over a parsed case list ({"input": ..., "expected_output": ...})."""
+        raw = [(c['input']['trip_duration_days'], c['input']['miles_traveled'],
+                c['input']['total_receipts_amount']) for c in cases]
+        return cls(raw, [c['expected_output'] for c in cases], **options)
+
+    @classmethod
+    def from_store(cls, store, **options):
+        """Index over a case_store.CaseStore with expected outputs."""
+        raw = [store.inputs(i) for i in range(len(store))]
+        return cls(raw, [store.expected(i) for i in range(len(store))], **options)
+
+    def default_cell(self, k):
+        """CELL_FACTOR x the CELL_QUANTILE quantile of the k-th neighbour distance over a sample of the cases.
+
+        A query that lies in its cell is at least one cell edge from the outer faces of the block,
+        so with this edge about CELL_QUANTILE of queries like the cases need no fallback.
+        """
+        n = len(self.raw)
+        if n <= k:
+            return 1.0
+        kth = sorted(heapq.nsmallest(k, (self.distance(j, *self.raw[i]) for j in range(n) if j != i))[-1]
+                     for i in range(0, n, max(1, n // CELL_SAMPLE)))
+        return max(CELL_FACTOR * kth[min(len(kth) - 1, int(CELL_QUANTILE * len(kth)))], 1e-6)
+
+    def key(self, days, miles, receipts):
+        w, s = self.weights, self.cell
+        return math.floor(days * w[0] / s), math.floor(miles * w[1] / s), math.floor(receipts * w[2] / s)
+
+    def distance(self, i, days, miles, receipts):
+        """Weighted Euclidean distance from case i, the same expression as knn_distance and knn_memorizer."""
+        d, m, r = self.raw[i]
+        w = self.weights
+        days_diff = (d - days) * w[0]
+        miles_diff = (m - miles) * w[1]
+        receipts_diff = (r - receipts) * w[2]
+        return math.sqrt(days_diff**2 + miles_diff**2 + receipts_diff**2)
+
+    def _ranked(self, ids, days, miles, receipts):
+        outputs = self.outputs
+        return sorted((self.distance(i, days, miles, receipts), outputs[i] if self.by_output else i, i) for i in ids)
+
+    def neighbours(self, days, miles, receipts, k, guarantee=True):
+        """The k nearest (distance, tie key, case id), nearest first, and whether the linear scan was needed."""
+        self.queries += 1
+        cx, cy, cz = self.key(days, miles, receipts)
+        candidates = []
+        for a, b, c in NEIGHBOURHOOD:
+            candidates.extend(self.buckets.get((cx + a, cy + b, cz + c), ()))
+        if len(candidates) >= k:
+            best = self._ranked(candidates, days, miles, receipts)[:k]
+            if not guarantee:
+                return best, False
+            # distance from the query to the nearest outer face of the searched block
+            w, s = self.weights, self.cell
+            reach = min(min(q * weight - (c - 1) * s, (c + 2) * s - q * weight)
+                        for q, weight, c in zip((days, miles, receipts), w, (cx, cy, cz)))
+            if best[-1][0] * (1 + BOUND_EPSILON) + BOUND_EPSILON < reach:
+                return best, False
+        self.fallbacks += 1
+        return self._ranked(range(len(self.raw)), days, miles, receipts)[:k], True
+
+    def nearest(self, days, miles, receipts, k=baseline.KNN_K, guarantee=True):
+        """The k nearest (distance, output) pairs, nearest first, like KDTreeIndex.nearest."""
+        outputs = self.outputs
+        return [(d, outputs[i]) for d, _, i in self.neighbours(days, miles, receipts, k, guarantee)[0]]
+
+    def predict(self, days, miles, receipts):
+        return baseline.knn_weighted_average(self.nearest(days, miles, receipts))
+
+
+def load_index(store):
+    """Grid over a case_store.CaseStore with the baseline fallback's metric."""
+    return GridIndex.from_store(store)
+
+
+# The two kNN models this index serves: constructor options and the exact-match short-circuit
+METRICS = {
+    'knn_fallback': (dict(weights=baseline.KNN_WEIGHTS, ties='output', k=baseline.KNN_K), False),
+    'knn_memorizer': (dict(weights=(10.0, 1.0, 1.0), ties='order', k=7), True),
+}
+
+
+def answer(pairs, short_circuit):
+    """Inverse-distance weighted answer of (distance, output) pairs, optionally short-circuiting a distance-0 neighbour."""
+    if short_circuit and pairs[0][0] == 0.0:
+        return pairs[0][1]
+    return baseline.knn_weighted_average(pairs)
+
+
+def measure(grid, queries, k, short_circuit, exact, exact_answers, guarantee):
+    """(fraction of linear scans, recall of the true top k, fraction of identical answers, max answer error, s/query)."""
+    import time
+    grid.queries = grid.fallbacks = 0
+    start = time.perf_counter()
+    found = [grid.neighbours(*q, k, guarantee)[0] for q in queries]
+    latency = (time.perf_counter() - start) / len(queries)
+    recall = sum(len({i for *_, i in got} & {i for *_, i in want}) for got, want in zip(found, exact)) / (k * len(queries))
+    errors = [abs(answer([(d, grid.outputs[i]) for d, _, i in got], short_circuit) - want)
+              for got, want in zip(found, exact_answers)]
+    return grid.fallbacks / grid.queries, recall, sum(e == 0 for e in errors) / len(errors), max(errors), latency
+
+
+def report(cases, queries, factors):
+    """Print recall against the linear scan and latency per query for every metric and cell size."""
+    import time
+    import knn_index
+    for name, (options, short_circuit) in METRICS.items():
+        k = options['k']
+        start = time.perf_counter()
+        index = GridIndex.from_cases(cases, **options)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        exact = [index._ranked(range(len(cases)), *q)[:k] for q in queries]
+        scan = (time.perf_counter() - start) / len(queries)
+        exact_answers = [answer([(d, index.outputs[i]) for d, _, i in best], short_circuit) for best in exact]
+        print(f"\n{name}: weights {', '.join(f'{w:g}' for w in options['weights'])}, k={k}, ties by {options['ties']}")
+        print(f"default cell {index.cell:.2f} ({built * 1000:.0f} ms to build), linear scan {scan * 1e6:.0f} us/query", end='')
+        if options['weights'] == baseline.KNN_WEIGHTS:  # the KD-tree only serves the fallback's metric
+            tree = knn_index.KDTreeIndex.from_cases(cases)
+            start = time.perf_counter()
+            for q in queries:
+                tree.nearest(*q, k)
+            print(f", KD-tree {(time.perf_counter() - start) / len(queries) * 1e6:.0f} us/query", end='')
+        print()
+        header = (f"{'cell':>8}{'cases/cell':>11}  |{'guaranteed: scans':>18}{'us/query':>10}"
+                  f"  |{'approximate: scans':>19}{'recall':>8}{'same':>7}{'max err':>9}{'us/query':>10}")
+        print(header)
+        print('-' * len(header))
+        for factor in factors:
+            grid = GridIndex(index.raw, index.outputs, options['weights'], options['ties'], k, index.cell * factor)
+            scans, recall, same, _, latency = measure(grid, queries, k, short_circuit, exact, exact_answers, True)
+            assert recall == 1.0 and same == 1.0, 'guaranteed grid search disagrees with the linear scan'
+            row = f"{grid.cell:>8.2f}{len(cases) / len(grid.buckets):>11.1f}  |{scans:>18.1%}{latency * 1e6:>10.1f}"
+            scans, recall, same, error, latency = measure(grid, queries, k, short_circuit, exact, exact_answers, False)
+            print(f"{row}  |{scans:>19.1%}{recall:>8.4f}{same:>7.1%}{error:>9.2f}{latency * 1e6:>10.1f}")
+
+
+def main():
+    import argparse, json, os
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+    parser = argparse.ArgumentParser(description='Recall and latency of the grid index against a linear scan.')
+    parser.add_argument('--cases', default=os.path.join(root, 'public_cases.json'), help='indexed cases')
+    parser.add_argument('--queries', default=os.path.join(root, 'private_cases.json'),
+                        help='JSON list of trips or cases to look up (default: private_cases.json)')
+    parser.add_argument('--cells', default='0.25,0.5,1,2,4',
+                        help='cell edges to try, as multiples of the default cell (default 0.25,0.5,1,2,4)')
+    parser.add_argument('--limit', type=int, default=0, metavar='N', help='only the first N queries')
+    options = parser.parse_args()
+
+    with open(options.cases) as f:
+        cases = json.load(f)
+    with open(options.queries) as f:
+        trips = [c.get('input', c) for c in json.load(f)]
+    if options.limit:
+        trips = trips[:options.limit]
+    queries = [(t['trip_duration_days'], t['miles_traveled'], t['total_receipts_amount']) for t in trips]
+    print(f"{len(queries)} queries against {len(cases)} cases")
+    report(cases, queries, [float(v) for v in options.cells.split(',')])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,131 @@
 #!/usr/bin/env python3
-"""Hybrid runner: calls baseline engine and optionally applies residual correction from lookup table."""
-import sys, os, json, subprocess
+"""Hybrid runner: calls the in-process baseline engine and optionally applies residual correction from lookup table.
+Answers through the prediction daemon (hybrid_server.py) when it is running, otherwise computes in-process.
+os and socket are imported only to reach the daemon: run.sh checks for the socket itself and
+calls main(use_daemon=False) when there is none."""
+import sys
+
+import engine
+import residual_lookup
+
+def socket_path():
+    """$HYBRID_SOCKET, else .hybrid.sock next to this file."""
+    import os
+    return os.environ.get('HYBRID_SOCKET', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.hybrid.sock'))
 
 def load_table():
-    table_path = os.path.join(os.path.dirname(__file__), 'residual_table.json')
-    if not os.path.exists(table_path):
-        return {}
-    with open(table_path) as f:
-        return json.load(f)
+    """Dense residual table indexed by residual_lookup bucket ids."""
+    return residual_lookup.load_table()
 
 def bucketize(days, miles, receipts):
-    def days_bucket(d):
-        return str(d) if d<=14 else '15+'
-    def miles_bucket(m):
-        if m<100: return '0-100'
-        if m<300: return '100-300'
-        if m<600: return '300-600'
-        if m<1000: return '600-1000'
-        return '1000+'
-    def spend_bucket(daily):
-        if daily<50: return '<50'
-        if daily<150: return '50-150'
-        if daily<300: return '150-300'
-        return '300+'
-    return "|".join((days_bucket(days), miles_bucket(miles), spend_bucket(receipts/days)))
+    return residual_lookup.bucket_id(days, miles, receipts)
 
 def baseline_predict(days,miles,receipts):
-    baseline_script = os.path.join(os.path.dirname(__file__), 'baseline_vintage_arithmetic.py')
-    out = subprocess.check_output(['python3', baseline_script, str(days), str(miles), str(receipts)], text=True)
-    return float(out.strip())
+    return engine.predict(days, miles, receipts)
 
-def main():
-    if len(sys.argv)!=4:
-        print('Usage: hybrid_run.py <days> <miles> <receipts>'); sys.exit(1)
-    days = int(float(sys.argv[1])); miles = float(sys.argv[2]); receipts = float(sys.argv[3])
+def parse_inputs(args):
+    days = int(float(args[0])); miles = float(args[1]); receipts = float(args[2])
+    return days, miles, receipts
+
+def correct(base, tbl, days, miles, receipts):
+    # applied only when abs(residual) >= residual_lookup.THRESHOLD
+    residual = residual_lookup.correction(tbl, bucketize(days,miles,receipts))
+    if residual:
+        return base + residual
+    return base
+
+def daemon_predict(args, path=None, timeout=5.0):
+    """Ask a running hybrid_server.py for the answer; returns None when no daemon is reachable."""
+    import os
+    path = path or socket_path()
+    if not os.path.exists(path):
+        return None
+    import socket
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall((" ".join(args) + "\n").encode())
+            reply = b""
+            while not reply.endswith(b"\n"):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                reply += chunk
+    except OSError:
+        return None
+    reply = reply.decode().strip()
+    if not reply or reply.startswith('ERROR'):
+        return None
+    return reply
 
-    base = baseline_predict(days,miles,receipts)
+def run_batch(args):
+    """--batch [FILE|-] [--format json|jsonl|csv] [-o OUT]: one answer per input case, in input order,
+    in the private_results.txt format (ERROR lines for cases that fail)."""
+    import case_stream
+    source, fmt, out_path = '-', None, None
+    rest = list(args)
+    while rest:
+        arg = rest.pop(0)
+        if arg == '--format' and rest:
+            fmt = rest.pop(0)
+        elif arg == '-o' and rest:
+            out_path = rest.pop(0)
+        else:
+            source = arg
+
+    stream = sys.stdin.buffer if source == '-' else open(source, 'rb')
+    out = sys.stdout if out_path is None else open(out_path, 'w')
     tbl = load_table()
-    key = bucketize(days,miles,receipts)
-    residual = tbl.get(key,0.0)
+    try:
+        for n, record in enumerate(case_stream.iter_records(stream, fmt), 1):
+            try:
+                days, miles, receipts = parse_inputs(case_stream.triple(record))
+                base = baseline_predict(days,miles,receipts)
+                line = f"{correct(base, tbl, days, miles, receipts):.2f}"
+            except Exception as e:
+                print(f"Error on case {n}: {e}", file=sys.stderr)
+                line = "ERROR"
+            out.write(line + "\n")
+    finally:
+        out.flush()
+        if out is not sys.stdout:
+            out.close()
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+def main(use_daemon=True, cache_path=None):
+    """cache_path: prediction_cache database for kNN trips, consulted first and filled on a miss
+    (run.sh passes $HYBRID_CACHE)."""
+    if sys.argv[1:2] == ['--batch']:
+        run_batch(sys.argv[2:])
+        return
+    if len(sys.argv)!=4:
+        print('Usage: hybrid_run.py <days> <miles> <receipts>')
+        print('       hybrid_run.py --batch [FILE|-] [--format json|jsonl|csv] [-o OUT]'); sys.exit(1)
+
+    days, miles, receipts = parse_inputs(sys.argv[1:])
+    # Other trips compute faster than the sqlite3 import (see prediction_cache)
+    cache = None
+    if cache_path and engine.uses_knn(days, miles, receipts):
+        import prediction_cache
+        cache = prediction_cache.open_cache(cache_path)
+    if cache is not None:
+        answer = cache.get(days, miles, receipts)
+        if answer is not None:
+            print(answer)
+            return
 
-    # apply correction only if abs(residual)>50
-    if abs(residual)>=50:
-        corrected = base + residual
-    else:
-        corrected = base
-    print(f"{corrected:.2f}")
+    answer = daemon_predict(sys.argv[1:]) if use_daemon else None
+    if answer is None:
+        base = baseline_predict(days,miles,receipts)
+        corrected = correct(base, load_table(), days, miles, receipts)
+        answer = f"{corrected:.2f}"
+        # Only answers computed here: a daemon may still be serving the model it started with
+        if cache is not None:
+            cache.put(days, miles, receipts, answer)
+    print(answer)
 
 if __name__=='__main__':
-    main() 
\ No newline at end of file
+    import os
+    main(cache_path=os.environ.get('HYBRID_CACHE'))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Prediction daemon for the Hybrid model.
+
+Loads the baseline engine, the residual table and the kNN case set once, then answers
+requests on a Unix domain socket so run.sh does not pay interpreter start-up per reimbursement.
+
+Protocol: one request per line, "<days> <miles> <receipts>", answered with one line holding
+the reimbursement formatted exactly like hybrid_run.py prints it, or "ERROR <message>".
+
+Usage:
+    python3 hybrid_server.py [--socket PATH]      # serve until SIGINT/SIGTERM
+"""
+import os, signal, socket, socketserver, sys
+
+import engine
+import hybrid_run
+
+
+class HybridModel:
+    """Everything a prediction needs, loaded once per process."""
+
+    def __init__(self):
+        self.table = hybrid_run.load_table()
+        engine.load_knn_index()
+
+    def predict(self, args):
+        days, miles, receipts = hybrid_run.parse_inputs(args)
+        base = engine.predict(days, miles, receipts)
+        corrected = hybrid_run.correct(base, self.table, days, miles, receipts)
+        return f"{corrected:.2f}"
+
+
+class PredictionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            args = line.decode().split()
+            try:
+                if len(args) != 3:
+                    raise ValueError('expected <days> <miles> <receipts>')
+                reply = self.server.model.predict(args)
+            except Exception as e:
+                reply = f"ERROR {e}"
+            self.wfile.write((reply + "\n").encode())
+            self.wfile.flush()
+
+
+class PredictionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, model):
+        self.model = model
+        super().__init__(socket_path, PredictionHandler)
+
+
+def claim_socket(socket_path):
+    """Remove a stale socket file; refuse to start if another daemon is answering on it."""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    print(f'hybrid_server already running on {socket_path}', file=sys.stderr)
+    sys.exit(1)
+
+
+def main():
+    socket_path = hybrid_run.socket_path()
+    args = sys.argv[1:]
+    if args[:1] == ['--socket'] and len(args) == 2:
+        socket_path = args[1]
+    elif args:
+        print('Usage: hybrid_server.py [--socket PATH]'); sys.exit(1)
+
+    model = HybridModel()
+    claim_socket(socket_path)
+    server = PredictionServer(socket_path, model)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f'hybrid_server listening on {socket_path}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""KD-tree index for the baseline engine's kNN fallback.
+
+The tree lives over the pre-scaled coordinates (days x 15, miles x 0.8, receipts x 1.2) and
+answers top-k queries by visiting only the branches that can still beat the current k-th
+neighbour, instead of scanning and sorting every case. Candidate distances are computed with
+baseline_vintage_arithmetic.knn_distance and ranked by (distance, output) exactly like the
+linear scan, so predictions are bit-identical to knn_predict.
+
+The tree layout (a permutation of the cases plus the split axis of every node) is persisted
+as a small binary file next to the cases and reused until the case file's checksum changes.
+
+Usage: python3 knn_index.py [cases.json]    # (re)build the index file
+"""
+import os, struct, sys
+from array import array
+from bisect import insort
+
+import baseline_vintage_arithmetic as baseline
+
+LEAF_SIZE = 8
+MAGIC = b'KDT1'
+HEADER = struct.Struct('<4sII32s')  # magic, case count, leaf size, sha256 of the case file
+# Pruning tolerance: scaled-coordinate gaps are computed differently from knn_distance,
+# so only prune when the gap clearly exceeds the current k-th distance
+PRUNE_EPSILON = 1e-9
+
+
+def index_path(cases_path):
+    return os.path.splitext(cases_path)[0] + '.kdtree'
+
+
+class KDTreeIndex:
+    """Static KD-tree over (days, miles, receipts) triples and their expected outputs."""
+
+    def __init__(self, raw, outputs, perm=None, split_dims=None):
+        self.raw = raw
+        self.outputs = outputs
+        w = baseline.KNN_WEIGHTS
+        self.points = [(d * w[0], m * w[1], r * w[2]) for d, m, r in self.raw]
+        if perm is None:
+            perm, split_dims = self._build()
+        self.perm = perm
+        self.split_dims = split_dims
+
+    def _build(self):
+        n = len(self.points)
+        perm = array('i', range(n))
+        split_dims = array('b', [-1]) * n
+        stack = [(0, n)]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            members = perm[lo:hi]
+            # split on the axis with the widest spread
+            spreads = [max(self.points[i][d] for i in members) - min(self.points[i][d] for i in members)
+                       for d in range(3)]
+            dim = spreads.index(max(spreads))
+            perm[lo:hi] = array('i', sorted(members, key=lambda i: (self.points[i][dim], i)))
+            mid = (lo + hi) // 2
+            split_dims[mid] = dim
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+        return perm, split_dims
+
+    @classmethod
+    def from_cases(cls, cases, *layout):
+        """Index over a parsed case list ({"input": ..., "expected_output": ...})."""
+        raw = [(c['input']['trip_duration_days'], c['input']['miles_traveled'],
+                c['input']['total_receipts_amount']) for c in cases]
+        return cls(raw, [c['expected_output'] for c in cases], *layout)
+
+    @classmethod
+    def from_store(cls, store, *layout):
+        """Index over a case_store.CaseStore with expected outputs."""
+        raw = [store.inputs(i) for i in range(len(store))]
+        return cls(raw, [store.expected(i) for i in range(len(store))], *layout)
+
+    def nearest(self, days, miles, receipts, k=baseline.KNN_K):
+        """The k nearest (distance, output) pairs, nearest first, ties broken by output."""
+        w = baseline.KNN_WEIGHTS
+        query = (days * w[0], miles * w[1], receipts * w[2])
+        best = []
+        raw, outputs, points, perm, split_dims = self.raw, self.outputs, self.points, self.perm, self.split_dims
+
+        def consider(i):
+            d, m, r = raw[i]
+            candidate = (baseline.knn_distance(d, m, r, days, miles, receipts), outputs[i])
+            if len(best) < k or candidate < best[-1]:
+                insort(best, candidate)
+                if len(best) > k:
+                    best.pop()
+
+        def search(lo, hi):
+            if hi - lo <= LEAF_SIZE:
+                for pos in range(lo, hi):
+                    consider(perm[pos])
+                return
+            mid = (lo + hi) // 2
+            i = perm[mid]
+            gap = query[split_dims[mid]] - points[i][split_dims[mid]]
+            near, far = ((lo, mid), (mid + 1, hi)) if gap < 0 else ((mid + 1, hi), (lo, mid))
+            search(*near)
+            consider(i)
+            if len(best) < k or abs(gap) <= best[-1][0] * (1 + PRUNE_EPSILON) + PRUNE_EPSILON:
+                search(*far)
+
+        search(0, len(perm))
+        return best
+
+    def predict(self, days, miles, receipts):
+        return baseline.knn_weighted_average(self.nearest(days, miles, receipts))
+
+    def save(self, path, digest):
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(self.perm), LEAF_SIZE, digest))
+            self.perm.tofile(f)
+            self.split_dims.tofile(f)
+
+    @staticmethod
+    def read_layout(path, n, digest):
+        """(perm, split_dims) from a persisted index, or None if it is missing or stale."""
+        try:
+            with open(path, 'rb') as f:
+                magic, count, leaf_size, stored = HEADER.unpack(f.read(HEADER.size))
+                if (magic, count, leaf_size, stored) != (MAGIC, n, LEAF_SIZE, digest):
+                    return None
+                perm = array('i'); perm.fromfile(f, n)
+                split_dims = array('b'); split_dims.fromfile(f, n)
+        except (OSError, EOFError, struct.error):
+            return None
+        return perm, split_dims
+
+
+def load_index(store):
+    """Index over a case_store.CaseStore, reusing the persisted tree while the source JSON is unchanged."""
+    path = index_path(store.path)
+    layout = KDTreeIndex.read_layout(path, len(store), store.digest)
+    if layout is not None:
+        return KDTreeIndex.from_store(store, *layout)
+    index = KDTreeIndex.from_store(store)
+    try:
+        index.save(path, store.digest)
+    except OSError:
+        pass  # read-only checkout: keep the in-memory tree
+    return index
+
+
+if __name__ == '__main__':
+    import case_store
+    cases_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', '..', 'public_cases.json')
+    store = case_store.open_store(cases_path)
+    index = KDTreeIndex.from_store(store)
+    index.save(index_path(cases_path), store.digest)
+    print(f'KD-tree over {len(store)} cases written to {index_path(cases_path)}')
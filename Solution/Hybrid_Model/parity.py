@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Shared inputs and mismatch counting for the bit-for-bit parity checks
+(test_vectorized_parity.py, test_rule_table_parity.py, Swarms/test_overlay_parity.py).
+
+    load_inputs()            days, miles, receipts arrays of every public then private case
+    random_trips(n, ...)     the same arrays for n random trips, including edge values
+    count_mismatches(rows)   how many (label, expected, actual) rows differ, printing the first few
+"""
+import json, os
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+FIELDS = ('trip_duration_days', 'miles_traveled', 'total_receipts_amount')
+SHOWN = 5
+
+
+def load_inputs(root=ROOT):
+    with open(os.path.join(root, 'public_cases.json')) as f:
+        public = [c['input'] for c in json.load(f)]
+    with open(os.path.join(root, 'private_cases.json')) as f:
+        private = json.load(f)
+    cases = public + private
+    return tuple(np.array([c[key] for c in cases], dtype=np.float64) for key in FIELDS)
+
+
+def random_trips(n, seed=0, max_days=15):
+    """Whole days 0..max_days, miles rounded to 0, 1 or 2 decimals (one draw per batch), receipts to cents."""
+    rng = np.random.default_rng(seed)
+    return (rng.integers(0, max_days + 1, n).astype(np.float64), np.round(rng.uniform(0, 1500, n), rng.integers(0, 3)),
+            np.round(rng.uniform(0, 3000, n), 2))
+
+
+def count_mismatches(rows, shown=SHOWN):
+    """Number of (label, expected, actual) rows with expected != actual; the first `shown` are printed."""
+    mismatches = 0
+    for label, expected, actual in rows:
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= shown:
+                print(f"  {label}: expected {expected!r}, got {actual!r}")
+    return mismatches
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Opt-in persistent prediction cache for the Hybrid model (SQLite).
+
+Set HYBRID_CACHE to a database path and run.sh / hybrid_run.py look kNN trips up there
+before asking the daemon or the engine; answers computed in-process on a miss are stored
+(not the daemon's, which may come from the model the daemon started with). A hit prints the
+stored text without loading the case set. Other trips skip the cache: they compute in less
+time than the sqlite3 import takes. On a 1-CPU container, median run.sh wall time:
+
+    trip                        no cache   cache hit
+    common (3 93 1.42)          21 ms      (not cached)
+    kNN (1 1082 1809.49)        50 ms      35 ms
+
+Rows are keyed by the parsed trip (days as hybrid_run.parse_inputs makes it, miles and
+receipts as floats, so "3" and "3.0" share an entry) and by the model version: the SHA-256
+digests of the files that decide an answer (MODEL_FILES), numbered in the versions table.
+Changing any of them, e.g. editing baseline_vintage_arithmetic.py or retraining
+residual_table.json, gives a new version, so old answers are never returned; they age out
+through the LRU. The per-file digests are memoized in the database by (size, mtime), so a
+lookup only stats the files; hashlib is imported and a file reread only when one changed.
+
+Eviction is least-recently-used: rows carry the value of a counter bumped on every insert,
+and once the row count exceeds the cap (100,000 by default, stored in the database) the
+oldest tenth is deleted in one statement. A hit is a single read; it restamps its row only
+when the stamp is more than half the cap old, which is before eviction can reach it, so a
+hot entry costs one write per cap/2 inserts rather than one per lookup. Triggers keep the
+row count, so no lookup scans the table.
+The database runs in WAL mode with a busy timeout, so parallel run.sh calls can share it;
+any SQLite error makes the caller fall back to computing the answer.
+
+Usage:
+    python3 prediction_cache.py PATH                     # entries, cap and model version
+    python3 prediction_cache.py PATH --max-entries N     # set the size cap (evicts at once)
+    python3 prediction_cache.py PATH --clear             # drop every entry
+"""
+import os, sqlite3, sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))
+# Everything an answer depends on: engine sources, the kNN case set and the code that reads it,
+# and the trained artifacts
+MODEL_FILES = [os.path.join(HERE, name) for name in
+               ('baseline_vintage_arithmetic.py', 'engine.py', 'case_store.py', 'case_stream.py',
+                'knn_index.py', 'grid_index.py', 'residual_lookup.py', 'hybrid_run.py',
+                'residual_table.json', 'residual_table.bin')] + \
+              [os.path.join(ROOT, 'public_cases.json')]
+MAX_ENTRIES = 100_000
+# Fraction of the cap removed per eviction, so eviction runs once per that many inserts
+EVICT_FRACTION = 0.1
+
+SCHEMA_VERSION = 1
+SCHEMA = '''
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS versions (id INTEGER PRIMARY KEY, files TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS predictions (
+    model INTEGER NOT NULL, days INTEGER NOT NULL, miles REAL NOT NULL, receipts REAL NOT NULL,
+    answer TEXT NOT NULL, used INTEGER NOT NULL,
+    PRIMARY KEY (model, days, miles, receipts)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS predictions_used ON predictions (used);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('entries', 0), ('clock', 0), ('max_entries', {max_entries});
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT);
+CREATE TRIGGER IF NOT EXISTS predictions_insert AFTER INSERT ON predictions
+    BEGIN UPDATE meta SET value = value + 1 WHERE key = 'entries'; END;
+CREATE TRIGGER IF NOT EXISTS predictions_delete AFTER DELETE ON predictions
+    BEGIN UPDATE meta SET value = value - 1 WHERE key = 'entries'; END;
+PRAGMA user_version = {schema_version};
+'''
+
+
+class PredictionCache:
+    """One open cache database; get() and put() take the parsed trip."""
+
+    def __init__(self, path, model_files=MODEL_FILES):
+        self.db = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self.db.executescript(SCHEMA.format(max_entries=MAX_ENTRIES, schema_version=SCHEMA_VERSION))
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.model = self.model_version(model_files)
+
+    def model_version(self, paths):
+        """Version id for the current SHA-256 digests of paths (a missing file counts as "missing")."""
+        digests = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                digests.append(f'{os.path.basename(path)}:missing')
+                continue
+            row = self.db.execute('SELECT sha256 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?',
+                                  (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+            if row is None:
+                import hashlib
+                with open(path, 'rb') as f:
+                    row = (hashlib.sha256(f.read()).hexdigest(),)
+                self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                (path, stat.st_size, stat.st_mtime_ns, row[0]))
+            digests.append(f'{os.path.basename(path)}:{row[0]}')
+        files = '\n'.join(digests)
+        row = self.db.execute('SELECT id FROM versions WHERE files = ?', (files,)).fetchone()
+        if row is None:
+            row = self.db.execute('INSERT OR IGNORE INTO versions (files) VALUES (?) RETURNING id', (files,)).fetchone() \
+                or self.db.execute('SELECT id FROM versions WHERE files = ?', (files,)).fetchone()
+        return row[0]
+
+    def _tick(self):
+        return self.db.execute("UPDATE meta SET value = value + 1 WHERE key = 'clock' RETURNING value").fetchone()[0]
+
+    def get(self, days, miles, receipts):
+        """Stored answer text for the trip under the current model version, or None (also on SQLite errors)."""
+        key = (self.model, days, float(miles), float(receipts))
+        try:
+            row = self.db.execute("SELECT answer, used, (SELECT value FROM meta WHERE key = 'clock'), "
+                                  "(SELECT value FROM meta WHERE key = 'max_entries') FROM predictions "
+                                  "WHERE model = ? AND days = ? AND miles = ? AND receipts = ?", key).fetchone()
+            if row is not None and row[1] < row[2] - row[3] // 2:
+                self.db.execute('UPDATE predictions SET used = ? WHERE model = ? AND days = ? AND miles = ? '
+                                'AND receipts = ?', (self._tick(), *key))
+        except sqlite3.Error as e:
+            print(f'prediction cache lookup failed: {e}', file=sys.stderr)
+            return None
+        return None if row is None else row[0]
+
+    def put(self, days, miles, receipts, answer):
+        """Store an answer, evicting the least recently used entries past the cap; SQLite errors are reported only."""
+        try:
+            with self.db:
+                self.db.execute('BEGIN IMMEDIATE')
+                self.db.execute('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)',
+                                (self.model, days, float(miles), float(receipts), answer, self._tick()))
+                entries, cap = self.db.execute("SELECT (SELECT value FROM meta WHERE key = 'entries'), "
+                                               "(SELECT value FROM meta WHERE key = 'max_entries')").fetchone()
+                if entries > cap:
+                    self.evict(entries - cap + int(cap * EVICT_FRACTION))
+        except sqlite3.Error as e:
+            print(f'prediction cache store failed: {e}', file=sys.stderr)
+
+    def evict(self, count):
+        """Delete the count least recently used entries."""
+        self.db.execute('DELETE FROM predictions WHERE (model, days, miles, receipts) IN '
+                        '(SELECT model, days, miles, receipts FROM predictions ORDER BY used LIMIT ?)', (count,))
+
+    def stats(self):
+        return dict(self.db.execute("SELECT key, value FROM meta WHERE key IN ('entries', 'max_entries')"))
+
+    def set_max_entries(self, max_entries):
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.execute("UPDATE meta SET value = ? WHERE key = 'max_entries'", (max_entries,))
+            entries = self.stats()['entries']
+            if entries > max_entries:
+                self.evict(entries - max_entries)
+
+    def clear(self):
+        self.db.execute('DELETE FROM predictions')
+
+    def close(self):
+        self.db.close()
+
+
+def open_cache(path):
+    """PredictionCache at path, or None when it cannot be opened (the caller computes instead)."""
+    try:
+        return PredictionCache(path)
+    except (sqlite3.Error, OSError) as e:
+        print(f'prediction cache {path} unavailable: {e}', file=sys.stderr)
+        return None
+
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[1:] not in ([], ['--clear']) and not (len(args) == 3 and args[1] == '--max-entries'):
+        print('Usage: prediction_cache.py PATH [--clear | --max-entries N]'); sys.exit(1)
+    cache = PredictionCache(args[0])
+    if args[1:] == ['--clear']:
+        cache.clear()
+    elif args[1:2] == ['--max-entries']:
+        cache.set_max_entries(int(args[2]))
+    stats = cache.stats()
+    print(f"{args[0]}: {stats['entries']} entries (cap {stats['max_entries']}), model version {cache.model}")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Compiled residual table: a dense float64 array indexed by integer bucket id.
+
+The bucket id of a trip is (days_bucket * 5 + miles_bucket) * 4 + spend_bucket, with
+
+    days_bucket   0-13 for 1-14 days, 14 for 15+
+    miles_bucket  0-100, 100-300, 300-600, 600-1000, 1000+
+    spend_bucket  daily receipts <50, 50-150, 150-300, 300+
+
+so the correction step is one integer computation plus one array read instead of building
+and hashing a "5|100-300|50-150" string. Trips shorter than one day map to MISSING, an
+extra slot that always holds 0.0 (the string keys never matched those either).
+
+The trainer writes the array as residual_table.bin (raw little-endian float64, one value per
+bucket, 0.0 for buckets with no training cases) next to residual_table.json. bucket_ids()
+and corrections() are the NumPy versions for whole batches.
+
+Nothing beyond sys is imported on the single-trip path (bucket_id, load_table, correction).
+
+Usage: python3 residual_lookup.py    # recompile residual_table.bin from residual_table.json
+"""
+import sys
+
+HERE = __file__.rpartition('/')[0]
+JSON_PATH = HERE + '/residual_table.json'
+TABLE_PATH = HERE + '/residual_table.bin'
+
+DAYS_LABELS = [str(d) for d in range(1, 15)] + ['15+']
+MILES_LABELS = ['0-100', '100-300', '300-600', '600-1000', '1000+']
+SPEND_LABELS = ['<50', '50-150', '150-300', '300+']
+MILES_EDGES = (100, 300, 600, 1000)
+SPEND_EDGES = (50, 150, 300)
+
+N_BUCKETS = len(DAYS_LABELS) * len(MILES_LABELS) * len(SPEND_LABELS)
+MISSING = N_BUCKETS
+# corrections smaller than this are treated as noise and not applied
+THRESHOLD = 50.0
+
+
+def _rank(edges, value):
+    """bisect.bisect_right(edges, value) for these few edges, without importing bisect."""
+    rank = 0
+    for edge in edges:
+        if value < edge:
+            break
+        rank += 1
+    return rank
+
+
+def bucket_id(days, miles, receipts):
+    """Integer bucket of one trip (days is an int, as hybrid_run.parse_inputs returns it)."""
+    if days < 1:
+        return MISSING
+    daily = receipts / days
+    return ((min(days, 15) - 1) * 5 + _rank(MILES_EDGES, miles)) * 4 + _rank(SPEND_EDGES, daily)
+
+
+def bucket_labels(bucket):
+    """(days, miles, spend) labels of a bucket id, i.e. the parts of its residual_table.json key."""
+    rest, spend = divmod(bucket, len(SPEND_LABELS))
+    days, miles = divmod(rest, len(MILES_LABELS))
+    return DAYS_LABELS[days], MILES_LABELS[miles], SPEND_LABELS[spend]
+
+
+def compile_table(mean_table):
+    """Dense table (N_BUCKETS + the MISSING slot) from a {"5|100-300|50-150": mean} mapping."""
+    from array import array
+    ids = {"|".join(bucket_labels(b)): b for b in range(N_BUCKETS)}
+    table = array('d', [0.0]) * (N_BUCKETS + 1)
+    for key, value in mean_table.items():
+        table[ids[key]] = value
+    return table
+
+
+def save_table(table, path=TABLE_PATH):
+    from array import array
+    data = array('d', table[:N_BUCKETS])
+    if sys.byteorder == 'big':
+        data.byteswap()
+    with open(path, 'wb') as f:
+        data.tofile(f)
+
+
+def load_table(path=TABLE_PATH, json_path=JSON_PATH):
+    """Dense table from residual_table.bin, compiled from the JSON if only that exists; all zeros if neither.
+
+    On little-endian machines the file bytes are viewed as doubles in place (a read-only
+    memoryview), which keeps the array module, and the collections.abc it imports, off the
+    single-trip path."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(N_BUCKETS * 8)
+    except FileNotFoundError:
+        data = None
+    if data is not None and sys.byteorder == 'little':
+        return memoryview(data + bytes(8)).cast('d')  # + the MISSING slot
+    from array import array
+    if data is not None:
+        table = array('d', data)
+        table.byteswap()
+        table.append(0.0)  # MISSING
+        return table
+    try:
+        with open(json_path) as f:
+            import json
+            return compile_table(json.load(f))
+    except FileNotFoundError:
+        return array('d', [0.0]) * (N_BUCKETS + 1)
+
+
+def correction(table, bucket):
+    """Residual to add for one bucket: the bucket mean when it clears THRESHOLD, else 0."""
+    residual = table[bucket]
+    return residual if abs(residual) >= THRESHOLD else 0.0
+
+
+def bucket_ids(days, miles, receipts):
+    """bucket_id over NumPy arrays (days are integers) in one pass."""
+    import numpy as np
+    days = np.asarray(days, dtype=np.int64)
+    miles = np.asarray(miles, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily = np.asarray(receipts, dtype=np.float64) / days
+    ids = ((np.minimum(days, 15) - 1) * 5 + np.searchsorted(MILES_EDGES, miles, side='right')) * 4 \
+        + np.searchsorted(SPEND_EDGES, daily, side='right')
+    return np.where(days >= 1, ids, MISSING)
+
+
+def corrections(table, ids):
+    """Vectorized correction(): one gather, then the THRESHOLD mask."""
+    import numpy as np
+    residuals = np.asarray(table, dtype=np.float64)[ids]
+    return np.where(np.abs(residuals) >= THRESHOLD, residuals, 0.0)
+
+
+if __name__ == '__main__':
+    import json
+    with open(JSON_PATH) as f:
+        save_table(compile_table(json.load(f)))
+    print(f'{JSON_PATH} -> {TABLE_PATH} ({N_BUCKETS} buckets)')
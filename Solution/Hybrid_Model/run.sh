@@ -1,4 +1,34 @@
 #!/bin/bash
 # Hybrid model runner: baseline + residual lookup
-SCRIPT_DIR="$(dirname "$0")"
-python3 "$SCRIPT_DIR/hybrid_run.py" "$@" 
\ No newline at end of file
+# Talks to the prediction daemon (hybrid_server.py) directly when socat is available,
+# otherwise hybrid_run asks the daemon itself or falls back to computing in-process.
+# Cold start is kept close to the interpreter's own: no subprocesses before python3 (the
+# script directory comes from parameter expansion, not dirname), python3 -S skips site-packages,
+# hybrid_run is imported as a module so its bytecode comes from __pycache__ (compiled once, on
+# the first call), and without a socket it is told not to look for the daemon, which keeps os
+# and socket unimported. bench_startup.py measures it.
+case "$0" in */*) SCRIPT_DIR="${0%/*}" ;; *) SCRIPT_DIR=. ;; esac
+case "$SCRIPT_DIR" in /*) ;; *) SCRIPT_DIR="$PWD/$SCRIPT_DIR" ;; esac
+SOCKET="${HYBRID_SOCKET:-$SCRIPT_DIR/.hybrid.sock}"
+USE_DAEMON=False
+if [ -S "$SOCKET" ]; then
+    USE_DAEMON=True
+    if command -v socat >/dev/null 2>&1 && out=$(echo "$1 $2 $3" | socat -t 5 - "UNIX-CONNECT:$SOCKET" 2>/dev/null) \
+            && [ -n "$out" ] && [[ $out != ERROR* ]]; then
+        echo "$out"
+        exit 0
+    fi
+fi
+if [ ! -d "$SCRIPT_DIR/__pycache__" ] && [ -w "$SCRIPT_DIR" ]; then
+    python3 -m compileall -q "$SCRIPT_DIR" >/dev/null 2>&1
+fi
+# With HYBRID_FROZEN set, a locally built hybrid_frozen (freeze_model.py) answers a single trip
+# without reading any file, and hands over to hybrid_run when its inputs changed since the freeze;
+# with HYBRID_CACHE set, hybrid_run consults that prediction cache (prediction_cache.py) first
+if [ -n "$HYBRID_FROZEN" ] && [ "$USE_DAEMON" = False ] && [ -z "$HYBRID_CACHE" ] && [ $# -eq 3 ] \
+        && [ -f "$SCRIPT_DIR/hybrid_frozen.py" ]; then
+    exec python3 -S -c "import sys; sys.path.insert(0, sys.argv.pop(1)); import hybrid_frozen; hybrid_frozen.main()" \
+        "$SCRIPT_DIR" "$@"
+fi
+exec python3 -S -c "import sys; sys.path.insert(0, sys.argv.pop(1)); cache = sys.argv.pop(1)
+import hybrid_run; hybrid_run.main(use_daemon=$USE_DAEMON, cache_path=cache)" "$SCRIPT_DIR" "$HYBRID_CACHE" "$@"
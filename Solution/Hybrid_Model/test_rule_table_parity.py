@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Parity check: vintage_rules.BASELINE, compiled to its scalar function and to NumPy masks,
+must reproduce baseline_vintage_arithmetic.vintage_calculation to the last bit on every
+public and private case (with and without temporal case indices) and on 200k random trips.
+Also times the batch evaluator on all cases and on a 1M-trip batch.
+
+Usage: python3 test_rule_table_parity.py
+"""
+import sys, time
+
+import numpy as np
+
+import baseline_vintage_arithmetic as baseline
+import vintage_rules
+from parity import count_mismatches, load_inputs, random_trips
+
+
+def check(days, miles, receipts, case_index=None):
+    """Mismatches of the compiled scalar and the batch evaluator against the hand-written engine."""
+    batch = vintage_rules.BASELINE.batch(days, miles, receipts, case_index)
+
+    def rows():
+        for i in range(len(days)):
+            idx = None if case_index is None else int(case_index[i])
+            args = float(days[i]), float(miles[i]), float(receipts[i])
+            expected = baseline.vintage_calculation(*args, idx)
+            yield f"case {i} (rules, batch)", (expected, expected), (vintage_rules.BASELINE(*args, idx), batch[i])
+    return count_mismatches(rows())
+
+
+def test_parity():
+    days, miles, receipts = load_inputs()
+    assert check(days, miles, receipts) == 0
+    assert check(days, miles, receipts, np.arange(len(days))) == 0
+    assert check(*random_trips(20_000)) == 0
+
+
+def main():
+    days, miles, receipts = load_inputs()
+    failed = 0
+    for label, inputs, case_index in (('no case_index', (days, miles, receipts), None),
+                                      ('case_index', (days, miles, receipts), np.arange(len(days))),
+                                      ('random trips', random_trips(200_000), None)):
+        bad = check(*inputs, case_index)
+        print(f"{label}: {len(inputs[0]) - bad}/{len(inputs[0])} bit-identical")
+        failed += bad
+
+    variant = vintage_rules.BASELINE.replace('six_day_bonus', factor=10)
+    start = time.perf_counter()
+    variant.batch(days, miles, receipts)
+    print(f"variant over {len(days)} cases in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    d, m, r = random_trips(1_000_000, seed=1)
+    start = time.perf_counter()
+    vintage_rules.BASELINE.batch(d, m, r, np.arange(len(d)))
+    print(f"1M trips in {time.perf_counter() - start:.3f}s")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
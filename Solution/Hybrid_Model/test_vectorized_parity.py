@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Parity check: vintage_vectorized.vintage_calculation must reproduce the scalar
+baseline_vintage_arithmetic.vintage_calculation to the last bit on every public and
+private case, with and without temporal case indices. Also times a 1M-trip batch.
+
+Usage: python3 test_vectorized_parity.py
+"""
+import sys, time
+
+import numpy as np
+
+import baseline_vintage_arithmetic as baseline
+import vintage_vectorized
+from parity import count_mismatches, load_inputs
+
+
+def check(days, miles, receipts, case_index=None):
+    batch = vintage_vectorized.vintage_calculation(days, miles, receipts, case_index)
+    return count_mismatches(
+        (f"case {i}", baseline.vintage_calculation(float(days[i]), float(miles[i]), float(receipts[i]),
+                                                   None if case_index is None else int(case_index[i])), batch[i])
+        for i in range(len(days)))
+
+
+def test_parity():
+    days, miles, receipts = load_inputs()
+    assert check(days, miles, receipts) == 0
+    assert check(days, miles, receipts, np.arange(len(days))) == 0
+
+
+def main():
+    days, miles, receipts = load_inputs()
+    failed = 0
+    for label, case_index in (('no case_index', None), ('case_index', np.arange(len(days)))):
+        bad = check(days, miles, receipts, case_index)
+        print(f"{label}: {len(days) - bad}/{len(days)} bit-identical")
+        failed += bad
+
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    d = rng.integers(1, 15, n).astype(np.float64)
+    m = rng.integers(5, 1300, n).astype(np.float64)
+    r = np.round(rng.uniform(1, 2500, n), 2)
+    start = time.perf_counter()
+    vintage_vectorized.vintage_calculation(d, m, r, np.arange(n))
+    print(f"1M trips in {time.perf_counter() - start:.3f}s")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,152 @@
 #!/usr/bin/env python3
 """Builds a simple residual look-up table (3D buckets) from the public_cases.json using the frozen baseline engine.
-Outputs residual_table.json with the mean residual for each bucket.
+Outputs residual_table.json with the mean residual for each bucket, plus the dense residual_table.bin
+that hybrid_run.py reads (see residual_lookup.py).
 Buckets:
    days_bucket: 1-14 (individual days), >=15 aggregated
    miles_bucket: 0-100,100-300,300-600,600-1000,>1000
    spend_bucket (daily receipts): <50,50-150,150-300,>300
+
+Baselines are computed in one vectorized batch (vintage_vectorized, with the kNN fallback only
+for the edge-case rows) and residuals are summed per bucket with math.fsum: the table was first
+built with sum() on a Python whose float sum is compensated, and a plain running sum (or
+np.bincount) differs from it in the last bit of some means. Per-bucket counts, residual sums
+and sums of squared deviations are kept in residual_stats.npz, so newly labelled cases can be
+folded in (--add) without retraining; means and variances are merged as if the new cases had
+been part of one combined run (to the last bit only after a full retrain). When
+hybrid_frozen.py exists it is refrozen with the new table (see freeze_model.py).
+
+Usage:
+    python3 train_residual_table.py                    # retrain from public_cases.json
+    python3 train_residual_table.py --add labelled.json [...]   # update with new labelled cases
 """
-import json, math, subprocess, os, sys
-from collections import defaultdict
-
-ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-PUBLIC = os.path.join(ROOT, 'public_cases.json')
-BASELINE = os.path.join(os.path.dirname(__file__), 'baseline_vintage_arithmetic.py')
-
-if not os.path.exists(PUBLIC):
-    print('public_cases.json not found'); sys.exit(1)
-
-def days_bucket(d):
-    return str(d) if d<=14 else '15+'
-
-def miles_bucket(m):
-    if m<100: return '0-100'
-    if m<300: return '100-300'
-    if m<600: return '300-600'
-    if m<1000: return '600-1000'
-    return '1000+'
-
-def spend_bucket(daily):
-    if daily<50: return '<50'
-    if daily<150: return '50-150'
-    if daily<300: return '150-300'
-    return '300+'
-
-def baseline_predict(days,miles,receipts):
-    # Call baseline vintage script via subprocess to reuse same logic
-    result = subprocess.check_output([
-        'python3', BASELINE, str(days), str(miles), str(receipts)
-    ], text=True)
-    return float(result.strip())
-
-table = defaultdict(list)
-with open(PUBLIC) as f:
-    cases = json.load(f)
-for idx, case in enumerate(cases):
-    inp = case['input']; expected = case['expected_output']
-    days = inp['trip_duration_days']; miles = inp['miles_traveled']; receipts = inp['total_receipts_amount']
-    pred = baseline_predict(days,miles,receipts)
-    resid = expected - pred
-    key = (days_bucket(days), miles_bucket(miles), spend_bucket(receipts/days))
-    table[key].append(resid)
-
-# compute mean residual per bucket
-mean_table = {"|".join(k): sum(v)/len(v) for k,v in table.items() if v}
-with open(os.path.join(os.path.dirname(__file__), 'residual_table.json'), 'w') as f:
-    json.dump(mean_table, f, indent=2)
-print('Residual table written with', len(mean_table), 'buckets') 
\ No newline at end of file
+import json, math, os, sys
+
+import numpy as np
+
+import case_store
+import engine
+import freeze_model
+import residual_lookup
+import vintage_vectorized
+
+ROOT = engine.ROOT
+PUBLIC = engine.PUBLIC
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'residual_stats.npz')
+SLOTS = residual_lookup.N_BUCKETS + 1  # real buckets plus MISSING (days < 1), never written out
+
+
+def baseline_predictions(days, miles, receipts):
+    """engine.predict over arrays: the vectorized vintage engine, kNN fallback for the edge cases."""
+    base = vintage_vectorized.vintage_calculation(days, miles, receipts)
+    for i in np.flatnonzero(vintage_vectorized.is_edge_case(days, miles, receipts)):
+        base[i] = engine.predict(days[i], miles[i], receipts[i])
+    return base
+
+
+def residuals_of(store):
+    """(bucket ids, expected - baseline) for every case in a case_store.CaseStore."""
+    days, miles, receipts, expected = store.columns()
+    if expected is None:
+        raise ValueError(f'{store.path}: cases have no expected_output')
+    residuals = expected - baseline_predictions(days, miles, receipts)
+    return residual_lookup.bucket_ids(days, miles, receipts), residuals
+
+
+def bucket_sums(ids, values):
+    """Correctly rounded sum of the values in each bucket slot."""
+    order = np.argsort(ids, kind='stable')
+    bounds = np.searchsorted(ids[order], np.arange(SLOTS + 1))
+    ordered = values[order]
+    return np.array([math.fsum(ordered[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])])
+
+
+class ResidualStats:
+    """Per-bucket count, residual sum and M2 (sum of squared deviations from the bucket mean)."""
+
+    def __init__(self, counts=None, sums=None, m2=None, order=None):
+        self.counts = np.zeros(SLOTS, dtype=np.int64) if counts is None else counts
+        self.sums = np.zeros(SLOTS) if sums is None else sums
+        self.m2 = np.zeros(SLOTS) if m2 is None else m2
+        # rank of each bucket's first appearance (-1 = never seen): keeps the JSON key order stable
+        self.order = np.full(SLOTS, -1, dtype=np.int64) if order is None else order
+
+    def update(self, ids, residuals):
+        """Fold a batch in, merging means and variances with Chan et al.'s pairwise formula."""
+        counts = np.bincount(ids, minlength=SLOTS)
+        sums = bucket_sums(ids, residuals)
+        seen = counts > 0
+        batch_means = np.divide(sums, counts, out=np.zeros(SLOTS), where=seen)
+        m2 = np.bincount(ids, weights=(residuals - batch_means[ids]) ** 2, minlength=SLOTS)
+
+        old_means = self.means()
+        total = self.counts + counts
+        delta = batch_means - old_means
+        with np.errstate(invalid='ignore'):
+            cross = np.where(seen, delta ** 2 * self.counts * counts / np.maximum(total, 1), 0.0)
+
+        new = seen & (self.order < 0)
+        first = np.full(SLOTS, len(ids), dtype=np.int64)
+        np.minimum.at(first, ids, np.arange(len(ids)))
+        ranked = np.flatnonzero(new)[np.argsort(first[new], kind='stable')]
+        self.order[ranked] = self.order.max(initial=-1) + 1 + np.arange(len(ranked))
+
+        self.m2 = self.m2 + m2 + cross
+        self.sums = self.sums + sums
+        self.counts = total
+
+    def means(self):
+        return np.divide(self.sums, self.counts, out=np.zeros(SLOTS), where=self.counts > 0)
+
+    def variances(self):
+        """Population variance of the residuals in each bucket (0 for empty buckets)."""
+        return np.divide(self.m2, self.counts, out=np.zeros(SLOTS), where=self.counts > 0)
+
+    def mean_table(self):
+        """{"5|100-300|50-150": mean} for every non-empty bucket, in first-seen order."""
+        buckets = [b for b in np.argsort(self.order, kind='stable')
+                   if self.order[b] >= 0 and b != residual_lookup.MISSING]
+        return {"|".join(residual_lookup.bucket_labels(b)): float(self.sums[b] / self.counts[b])
+                for b in buckets}
+
+    def save(self, path=STATS_PATH):
+        np.savez(path, counts=self.counts, sums=self.sums, m2=self.m2, order=self.order)
+
+    @classmethod
+    def load(cls, path=STATS_PATH):
+        with np.load(path) as data:
+            return cls(data['counts'], data['sums'], data['m2'], data['order'])
+
+
+def write_table(stats):
+    mean_table = stats.mean_table()
+    with open(residual_lookup.JSON_PATH, 'w') as f:
+        json.dump(mean_table, f, indent=2)
+    residual_lookup.save_table(residual_lookup.compile_table(mean_table))
+    stats.save()
+    return mean_table
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--add']:
+        if not args[1:] or not os.path.exists(STATS_PATH):
+            print('Usage: train_residual_table.py --add labelled.json [...] (after a full training run)')
+            sys.exit(1)
+        stats, sources = ResidualStats.load(), args[1:]
+    else:
+        if not os.path.exists(PUBLIC):
+            print('public_cases.json not found'); sys.exit(1)
+        stats, sources = ResidualStats(), [PUBLIC]
+    for path in sources:
+        stats.update(*residuals_of(case_store.open_store(path)))
+    mean_table = write_table(stats)
+    print('Residual table written with', len(mean_table), 'buckets from',
+          int(stats.counts.sum()), 'labelled cases')
+    if os.path.exists(freeze_model.OUTPUT):
+        freeze_model.freeze()
+        print('Refroze', freeze_model.OUTPUT)
+
+
+if __name__ == '__main__':
+    main()
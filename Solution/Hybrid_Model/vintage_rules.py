@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+vintage_calculation as a declarative rule table.
+
+The adjustments that baseline_vintage_arithmetic.vintage_calculation applies after the linear
+formula are listed in BASELINE_RULES, in order, one Rule each:
+
+    name     identifies the rule for variants (RuleSet.replace / without / insert)
+    group    rules sharing a group form one if/elif chain: the first match wins
+    when     conditions over the trip that must all hold: (feature, comparison, value)
+    op       'scale'    base = base * factor / 100       (banker's rounding, integer cents)
+             'bonus'    base = base + base * factor / 100
+             'temporal' base += Team 12 cycle correction for case_index % 90 (when given)
+    factor   hundredths, like the PIC V99 factors in the scalar engine
+
+Features are days, miles, receipts, eff_ratio (receipts / (miles + 1)) and daily_receipts
+(receipts / max(days, 1)). The PIC clamp and the cents -> dollars step close every rule set.
+
+A RuleSet compiles its table once into a scalar function (generated Python source, as fast
+as the hand-written chain; see .source) and into a NumPy evaluator that turns each rule
+into one mask over the whole batch. Both reproduce the fixed-point engine bit for bit: the
+baseline table gives vintage_calculation's results exactly (test_rule_table_parity.py).
+
+A variant is a one-line change instead of a copied module, e.g. the Swarms 6-day patch:
+
+    six_day_10 = BASELINE.replace('six_day_bonus', factor=10)
+    six_day_10.batch(days, miles, receipts)          # all 6000 cases in a few milliseconds
+
+Usage: python3 vintage_rules.py    # print the table and the generated scalar source
+"""
+from collections import namedtuple
+
+import baseline_vintage_arithmetic as baseline
+
+Rule = namedtuple('Rule', 'name group when op factor')
+
+FEATURES = {
+    'days': None, 'miles': None, 'receipts': None,
+    'eff_ratio': 'receipts / (miles + 1)',
+    'daily_receipts': 'receipts / max(days, 1)',
+}
+COMPARISONS = ('<', '<=', '>', '>=', '==', '!=')
+OPS = ('scale', 'bonus', 'temporal')
+
+BASELINE_RULES = (
+    # Rule 1: efficiency ratio
+    Rule('inefficient', 'efficiency', (('miles', '<', 300), ('eff_ratio', '>', 4.0)), 'scale', 65),
+    Rule('efficient', 'efficiency', (('miles', '>', 700), ('eff_ratio', '<', 1.0)), 'bonus', 30),
+    # 1-day mileage bands, 5-day and 6-day bonuses
+    Rule('one_day_very_high_miles', 'trip_length',
+         (('days', '==', 1), ('miles', '>', 1000), ('receipts', '>=', 500), ('receipts', '<', 2000)), 'scale', 75),
+    Rule('one_day_very_high_miles_high_receipts', 'trip_length',
+         (('days', '==', 1), ('miles', '>', 1000), ('receipts', '>=', 2000)), 'bonus', 15),
+    Rule('one_day_high_miles', 'trip_length',
+         (('days', '==', 1), ('miles', '<=', 1000), ('miles', '>', 700), ('receipts', '<', 300)), 'scale', 90),
+    Rule('five_day_bonus', 'trip_length', (('days', '==', 5),), 'bonus', 14),
+    Rule('six_day_bonus', 'trip_length', (('days', '==', 6),), 'bonus', 17),
+    # Team 12 90-case cycle
+    Rule('temporal', None, (), 'temporal', None),
+    # High priority fixes: low miles + high receipts penalty, 7-day high miles bonus
+    Rule('low_miles_high_spend', None, (('miles', '<', 250), ('daily_receipts', '>', 280)), 'scale', 80),
+    Rule('seven_day_high_miles', None, (('days', '==', 7), ('miles', '>', 1000)), 'scale', 135),
+)
+
+
+def validate(rules):
+    names, closed_groups, previous_group = set(), set(), None
+    for rule in rules:
+        if rule.name in names:
+            raise ValueError(f'duplicate rule name {rule.name!r}')
+        names.add(rule.name)
+        if rule.group != previous_group:
+            if rule.group is not None and rule.group in closed_groups:
+                raise ValueError(f'rule {rule.name!r}: the rules of group {rule.group!r} must be adjacent')
+            closed_groups.add(previous_group)
+            previous_group = rule.group
+        if rule.op not in OPS:
+            raise ValueError(f'rule {rule.name!r}: unknown op {rule.op!r}')
+        if rule.op != 'temporal' and not isinstance(rule.factor, int):
+            raise ValueError(f'rule {rule.name!r}: factor must be an integer number of hundredths')
+        for feature, comparison, value in rule.when:
+            if feature not in FEATURES or comparison not in COMPARISONS:
+                raise ValueError(f'rule {rule.name!r}: bad condition {(feature, comparison, value)!r}')
+            if not isinstance(value, (int, float)):
+                raise ValueError(f'rule {rule.name!r}: condition value must be a number')
+
+
+def _features_used(rules):
+    used = {feature for rule in rules for feature, _, _ in rule.when}
+    return [name for name, expression in FEATURES.items() if expression and name in used]
+
+
+def scalar_source(rules):
+    """Python source of evaluate(days, miles, receipts, case_index=None) for the rule table."""
+    lines = ['def evaluate(days, miles, receipts, case_index=None):',
+             '    base = (BASE_CONSTANT + fixed_multiply(to_fixed(days), COEFF_DAYS)',
+             '            + fixed_multiply(to_fixed(miles), COEFF_MILES) + fixed_multiply(to_fixed(receipts), COEFF_RECEIPTS))']
+    lines += [f'    {name} = {FEATURES[name]}' for name in _features_used(rules)]
+    previous_group = None
+    for rule in rules:
+        if rule.op == 'temporal':
+            lines += ['    if case_index is not None:',
+                      '        base = base + STRONG_90_CORRECTIONS.get(case_index % 90, 0)']
+            previous_group = None
+            continue
+        condition = ' and '.join(f'{f} {c} {v!r}' for f, c, v in rule.when) or 'True'
+        keyword = 'elif' if rule.group is not None and rule.group == previous_group else 'if'
+        update = (f'fixed_multiply(base, {rule.factor})' if rule.op == 'scale'
+                  else f'base + fixed_multiply(base, {rule.factor})')
+        lines += [f'    {keyword} {condition}:  # {rule.name}', f'        base = {update}']
+        previous_group = rule.group
+    lines += ['    if base > MAX_VALUE:', '        base = MAX_VALUE',
+              '    elif base < MIN_VALUE:', '        base = MIN_VALUE',
+              '    return base / 100']
+    return '\n'.join(lines) + '\n'
+
+
+def compile_scalar(rules):
+    namespace = {name: getattr(baseline, name) for name in
+                 ('to_fixed', 'fixed_multiply', 'BASE_CONSTANT', 'COEFF_DAYS', 'COEFF_MILES', 'COEFF_RECEIPTS',
+                  'MAX_VALUE', 'MIN_VALUE', 'STRONG_90_CORRECTIONS')}
+    exec(compile(scalar_source(rules), '<vintage_rules>', 'exec'), namespace)
+    return namespace['evaluate']
+
+
+def evaluate_batch(rules, days, miles, receipts, case_index=None):
+    """The rule table over NumPy arrays: one mask per rule, groups exclude earlier matches."""
+    import numpy as np
+    import vintage_vectorized as vv
+
+    days, miles, receipts = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(days, dtype=np.float64)),
+        np.asarray(miles, dtype=np.float64),
+        np.asarray(receipts, dtype=np.float64))
+    base = (baseline.BASE_CONSTANT + vv.fixed_multiply(vv.to_fixed(days), baseline.COEFF_DAYS)
+            + vv.fixed_multiply(vv.to_fixed(miles), baseline.COEFF_MILES)
+            + vv.fixed_multiply(vv.to_fixed(receipts), baseline.COEFF_RECEIPTS))
+    features = {'days': days, 'miles': miles, 'receipts': receipts}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'eff_ratio' in _features_used(rules):
+            features['eff_ratio'] = receipts / (miles + 1)
+        if 'daily_receipts' in _features_used(rules):
+            features['daily_receipts'] = receipts / np.maximum(days, 1)
+    compare = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+               '==': np.equal, '!=': np.not_equal}
+
+    taken = {}  # group -> trips already matched by an earlier rule of the group
+    for rule in rules:
+        if rule.op == 'temporal':
+            if case_index is not None:
+                base = base + vv.TEMPORAL_CORRECTIONS[np.mod(np.asarray(case_index, dtype=np.int64), 90)]
+            continue
+        mask = np.ones(len(base), dtype=bool)
+        for feature, comparison, value in rule.when:
+            mask &= compare[comparison](features[feature], value)
+        if rule.group is not None:
+            matched = taken.setdefault(rule.group, np.zeros(len(base), dtype=bool))
+            mask &= ~matched
+            matched |= mask
+        idx = np.flatnonzero(mask)
+        if idx.size:
+            adjusted = vv.fixed_multiply(base[idx], rule.factor)
+            base[idx] = adjusted if rule.op == 'scale' else base[idx] + adjusted
+    return np.clip(base, baseline.MIN_VALUE, baseline.MAX_VALUE) / 100
+
+
+class RuleSet:
+    """An ordered rule table compiled for scalar calls (ruleset(days, miles, receipts)) and batches (.batch)."""
+
+    def __init__(self, rules):
+        self.rules = tuple(Rule(*rule) for rule in rules)
+        validate(self.rules)
+        self.source = scalar_source(self.rules)
+        self.evaluate = compile_scalar(self.rules)
+
+    def __call__(self, days, miles, receipts, case_index=None):
+        return self.evaluate(days, miles, receipts, case_index)
+
+    def batch(self, days, miles, receipts, case_index=None):
+        return evaluate_batch(self.rules, days, miles, receipts, case_index)
+
+    def _index(self, name):
+        for i, rule in enumerate(self.rules):
+            if rule.name == name:
+                return i
+        raise KeyError(name)
+
+    def replace(self, name, **changes):
+        """Variant with one rule's fields changed, e.g. replace('six_day_bonus', factor=10)."""
+        rules = list(self.rules)
+        rules[self._index(name)] = rules[self._index(name)]._replace(**changes)
+        return RuleSet(rules)
+
+    def without(self, *names):
+        for name in names:
+            self._index(name)
+        return RuleSet(rule for rule in self.rules if rule.name not in names)
+
+    def insert(self, rule, before=None):
+        """Variant with rule added before the named rule (at the end when before is None)."""
+        rules = list(self.rules)
+        rules.insert(len(rules) if before is None else self._index(before), Rule(*rule))
+        return RuleSet(rules)
+
+
+BASELINE = RuleSet(BASELINE_RULES)
+
+
+if __name__ == '__main__':
+    for rule in BASELINE.rules:
+        conditions = ' and '.join(f'{f} {c} {v}' for f, c, v in rule.when) or '-'
+        print(f"{rule.name:<40}{rule.group or '':<13}{rule.op:<10}{'' if rule.factor is None else rule.factor:>5}  "
+              f"{conditions}")
+    print()
+    print(BASELINE.source)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+NumPy-vectorized twin of baseline_vintage_arithmetic.vintage_calculation.
+
+Same fixed-point core as the scalar engine: amounts are int64 cents, and products are
+scaled back through the same float steps and half-to-even rounding, so each element of the
+batch result is identical to the scalar function. Branches become boolean masks applied in
+the scalar rule order.
+"""
+import numpy as np
+
+import baseline_vintage_arithmetic as baseline
+
+# Team 12 temporal corrections (cents) by case_index % 90
+TEMPORAL_CORRECTIONS = np.zeros(90, dtype=np.int64)
+for _pos, _cents in baseline.STRONG_90_CORRECTIONS.items():
+    TEMPORAL_CORRECTIONS[_pos] = _cents
+
+
+def to_fixed(value, precision_decimals=2):
+    """Float array -> int64 fixed-point units; np.rint is half-to-even like round()"""
+    return np.rint(np.asarray(value, dtype=np.float64) * 10 ** precision_decimals).astype(np.int64)
+
+
+def fixed_multiply(a_fixed, b_fixed, precision_decimals=2):
+    """int64 product scaled down to float dollars and back up, then rounded half-to-even, like the scalar core"""
+    multiplier = 10 ** precision_decimals
+    product = np.asarray(a_fixed, dtype=np.int64) * b_fixed
+    return np.rint(product / (multiplier * multiplier) * multiplier).astype(np.int64)
+
+
+def vintage_multiply(a, b, precision_decimals=2):
+    multiplier = 10 ** precision_decimals
+    return fixed_multiply(to_fixed(a, precision_decimals), to_fixed(b, precision_decimals),
+                          precision_decimals) / multiplier
+
+
+def vintage_add(a, b, precision_decimals=2):
+    multiplier = 10 ** precision_decimals
+    return vintage_round((to_fixed(a, precision_decimals) + to_fixed(b, precision_decimals)) / multiplier,
+                         precision_decimals)
+
+
+def vintage_round(value, precision_decimals=2):
+    return to_fixed(value, precision_decimals) / 10 ** precision_decimals
+
+
+def _apply(base, mask, operation):
+    """base with operation applied to the masked elements only (one scalar if-branch)"""
+    idx = np.flatnonzero(mask)
+    if idx.size:
+        base[idx] = operation(base[idx])
+    return base
+
+
+def vintage_calculation(days, miles, receipts, case_index=None):
+    """
+    Batch vintage_calculation over arrays of trips. case_index is None (no temporal
+    corrections, like the scalar default) or an integer array aligned with the trips.
+    """
+    days, miles, receipts = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(days, dtype=np.float64)),
+        np.asarray(miles, dtype=np.float64),
+        np.asarray(receipts, dtype=np.float64))
+
+    days_term = fixed_multiply(to_fixed(days), baseline.COEFF_DAYS)
+    miles_term = fixed_multiply(to_fixed(miles), baseline.COEFF_MILES)
+    receipts_term = fixed_multiply(to_fixed(receipts), baseline.COEFF_RECEIPTS)
+    base = baseline.BASE_CONSTANT + days_term + miles_term + receipts_term
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eff_ratio = receipts / (miles + 1)
+        daily_receipts = receipts / np.maximum(days, 1)
+
+    def scale(hundredths):
+        return lambda b: fixed_multiply(b, hundredths)
+
+    def bonus(hundredths):
+        return lambda b: b + fixed_multiply(b, hundredths)
+
+    # RULE 1: efficiency ratio penalty / bonus
+    inefficient = (miles < 300) & (eff_ratio > 4.0)
+    efficient = ~inefficient & (miles > 700) & (eff_ratio < 1.0)
+    base = _apply(base, inefficient, scale(65))
+    base = _apply(base, efficient, bonus(30))
+
+    # 1-day mileage bands, 5-day and 6-day bonuses
+    one_day = days == 1
+    very_high_miles = one_day & (miles > 1000)
+    base = _apply(base, very_high_miles & (receipts >= 500) & (receipts < 2000), scale(75))
+    base = _apply(base, very_high_miles & (receipts >= 2000), bonus(15))
+    base = _apply(base, one_day & ~(miles > 1000) & (miles > 700) & (receipts < 300), scale(90))
+    base = _apply(base, days == 5, bonus(14))
+    base = _apply(base, days == 6, bonus(17))
+
+    # Team 12 temporal corrections (90-case cycle)
+    if case_index is not None:
+        base = base + TEMPORAL_CORRECTIONS[np.mod(np.asarray(case_index, dtype=np.int64), 90)]
+
+    # Low miles + high receipts penalty, 7-day high miles bonus
+    base = _apply(base, (miles < 250) & (daily_receipts > 280), scale(80))
+    base = _apply(base, (days == 7) & (miles > 1000), scale(135))
+
+    # PIC S9(4)V99 bounds, then cents back to dollars
+    return np.clip(base, baseline.MIN_VALUE, baseline.MAX_VALUE) / 100
+
+
+def is_edge_case(days, miles, receipts):
+    """Mask of the trips baseline_vintage_arithmetic.is_edge_case routes to the kNN fallback"""
+    days = np.asarray(days, dtype=np.float64)
+    miles = np.asarray(miles, dtype=np.float64)
+    receipts = np.asarray(receipts, dtype=np.float64)
+    daily_receipts = receipts / np.maximum(days, 1)
+    return (((days >= 7) & (daily_receipts > 150)) |
+            ((days <= 2) & (miles > 800)) |
+            ((receipts > 1800) & (days <= 5)) |
+            ((days >= 8) & (miles > 700)))
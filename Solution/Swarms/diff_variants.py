@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Differential evaluation of the Swarms patches in one process.
+
+Every Swarms/*/vintage_arithmetic.py is imported as a module (named after its directory),
+together with the unpatched model they were all forked from
+(Fix_114_LowMiles_HighReceipts/vintage_arithmetic_original.py, or --baseline). The cases
+are loaded once into shared columns and the variants are evaluated over them on a process
+pool, one task per variant, so the comparison costs a handful of interpreter starts instead
+of one per case and variant. Each answer is the text the variant's run.sh prints for the case.
+
+The kNN fallback is the same function in every variant, reading the same case set, so its
+answers are computed once for all of them: the edge-case mask and the weighted 5-NN come
+from Final_Ensemble_Model/experts_vectorized.py, which reproduces that knn_fallback bit for
+bit over NumPy arrays. A variant whose knn_fallback source differs from the baseline's, or
+whose directory holds a different public_cases.json, runs its own knn_fallback instead.
+
+Reported per variant, against the baseline:
+    changed     cases whose answer differs from the baseline's
+    fixed       cases within --tolerance of the expected output that were not before
+    broke       cases that were within --tolerance and no longer are
+    exact, average error, score    as eval.sh computes them
+The fixed and broken case numbers (1-based, as eval.sh numbers them) are listed, and the
+diff matrix (--matrix, CSV, Swarms/diff_matrix.csv by default) has one row per case: inputs, expected output, the baseline's
+answer and every variant's answer minus the baseline's.
+
+--verify N also runs each model's script on N random cases, as run.sh does, and fails if any
+of its answers differ from the in-process ones.
+
+Usage: python3 diff_variants.py [--cases FILE] [--baseline FILE] [-j WORKERS] [--tolerance DOLLARS]
+                                [--matrix FILE] [--json diff_report.json] [--verify N]
+"""
+import argparse
+import csv
+import glob
+import importlib.util
+import inspect
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SWARMS = os.path.dirname(os.path.abspath(__file__))
+SOLUTION = os.path.dirname(SWARMS)
+ROOT = os.path.dirname(SOLUTION)
+PUBLIC = os.path.join(ROOT, 'public_cases.json')
+BASELINE = os.path.join(SWARMS, 'Fix_114_LowMiles_HighReceipts', 'vintage_arithmetic_original.py')
+# Default --matrix: next to this script whatever the working directory (ignored by git)
+MATRIX = os.path.join(SWARMS, 'diff_matrix.csv')
+
+sys.path.insert(0, os.path.join(SOLUTION, 'Final_Ensemble_Model'))
+import experts_vectorized  # noqa: E402
+
+
+def discover_variants():
+    """name -> path of every patched Swarms model, by directory name."""
+    return {os.path.basename(os.path.dirname(path)): path
+            for path in sorted(glob.glob(os.path.join(SWARMS, '*', 'vintage_arithmetic.py')))}
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(f'swarm_{name}'.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_cases(path):
+    """(days, miles, receipts, expected or None) columns of a case file."""
+    with open(path) as f:
+        cases = json.load(f)
+    inputs = [c.get('input', c) for c in cases]
+    columns = tuple(np.array([i[key] for i in inputs], dtype=np.float64)
+                    for key in ('trip_duration_days', 'miles_traveled', 'total_receipts_amount'))
+    expected = None
+    if all('expected_output' in c for c in cases):
+        expected = np.array([c['expected_output'] for c in cases], dtype=np.float64)
+    return columns + (expected,)
+
+
+def shares_knn(module, baseline):
+    """Whether module's kNN answers are the shared ones: same knn_fallback, same case file beside it."""
+    if inspect.getsource(module.knn_fallback) != inspect.getsource(baseline.knn_fallback):
+        return False
+    local = os.path.join(os.path.dirname(module.__file__), 'public_cases.json')
+    if not os.path.exists(local):
+        local = os.path.join(os.path.dirname(os.path.dirname(module.__file__)), 'public_cases.json')
+    if not os.path.exists(local):
+        return False
+    with open(local, 'rb') as a, open(PUBLIC, 'rb') as b:
+        return a.read() == b.read()
+
+
+def shared_knn(days, miles, receipts):
+    """case index -> knn_fallback answer, for the edge cases only."""
+    edge = np.flatnonzero(experts_vectorized.is_edge_case(days, miles, receipts))
+    reference = load_cases(PUBLIC)
+    answers = experts_vectorized.knn_predict(reference, days[edge], miles[edge], receipts[edge])
+    return dict(zip(edge.tolist(), answers.tolist()))
+
+
+# Worker state, set once per pool process by _init_worker
+_columns = _knn = None
+
+
+def _init_worker(columns, knn):
+    global _columns, _knn
+    _columns, _knn = columns, knn
+
+
+def evaluate(name, path, use_shared_knn):
+    """(answers as printed by the model's CLI, seconds) for one model over the shared cases."""
+    start = time.perf_counter()
+    module = load_module(name, path)
+    knn_fallback = module.knn_fallback
+    if use_shared_knn:
+        knn_fallback = None
+    else:
+        os.chdir(os.path.dirname(path))  # knn_fallback finds public_cases.json relative to the CWD
+    vintage_calculation = module.vintage_calculation
+    answers = []
+    for i, (days, miles, receipts) in enumerate(zip(*_columns)):
+        result = _knn.get(i) if knn_fallback is None else knn_fallback(days, miles, receipts)
+        if result is None:
+            result = vintage_calculation(days, miles, receipts)
+        answers.append(f"{result:.2f}")
+    return answers, time.perf_counter() - start
+
+
+def cents(text):
+    return round(float(text) * 100)
+
+
+def compare(answers, baseline_answers, expected_cents, tolerance_cents):
+    """Summary of one variant's answers against the baseline's (and the expected outputs, if known)."""
+    summary = {'changed': sum(a != b for a, b in zip(answers, baseline_answers))}
+    if expected_cents is None:
+        return summary
+    errors = [abs(cents(a) - e) for a, e in zip(answers, expected_cents)]
+    baseline_errors = [abs(cents(b) - e) for b, e in zip(baseline_answers, expected_cents)]
+    pairs = list(enumerate(zip(errors, baseline_errors), 1))
+    average = sum(errors) / len(errors) / 100
+    exact = sum(error == 0 for error in errors)
+    summary.update({
+        'fixed': [case for case, (error, before) in pairs if error < tolerance_cents <= before],
+        'broke': [case for case, (error, before) in pairs if before < tolerance_cents <= error],
+        'improved': sum(error < before for _, (error, before) in pairs),
+        'worsened': sum(error > before for _, (error, before) in pairs),
+        'exact': exact,
+        'average_error': round(average, 2),
+        'score': round(average * 100 + (len(errors) - exact) * 0.1, 2),
+    })
+    return summary
+
+
+def verify(models, columns, samples, seed=0):
+    """[(model, case, in-process answer, CLI answer)] for sampled cases where the two differ."""
+    mismatches = []
+    rng = random.Random(seed)
+    cases = rng.sample(range(len(columns[0])), min(samples, len(columns[0])))
+    for name, (path, answers) in models.items():
+        for i in cases:
+            args = [repr(float(column[i])) for column in columns]
+            result = subprocess.run([sys.executable, path, *args], cwd=os.path.dirname(path),
+                                    capture_output=True, text=True)
+            if result.stdout.strip() != answers[i]:
+                mismatches.append((name, i + 1, answers[i], result.stdout.strip() or result.stderr.strip()))
+    return mismatches
+
+
+def write_matrix(path, names, columns, expected, baseline_answers, variant_answers):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['case', 'days', 'miles', 'receipts', 'expected', 'baseline', *names])
+        for i, baseline_answer in enumerate(baseline_answers):
+            deltas = [f"{(cents(variant_answers[name][i]) - cents(baseline_answer)) / 100:.2f}" for name in names]
+            writer.writerow([i + 1, *(f"{column[i]:g}" for column in columns),
+                             '' if expected is None else f"{expected[i]:.2f}", baseline_answer, *deltas])
+
+
+def print_report(baseline_summary, summaries, listed=10):
+    known = 'exact' in baseline_summary
+    header = f"{'model':<36}{'changed':>8}"
+    if known:
+        header += f"{'fixed':>7}{'broke':>7}{'better':>8}{'worse':>7}{'exact':>7}{'avg err':>9}{'score':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, summary in [('baseline', baseline_summary), *summaries.items()]:
+        line = f"{name:<36}{summary['changed']:>8}"
+        if known:
+            line += (f"{len(summary['fixed']):>7}{len(summary['broke']):>7}{summary['improved']:>8}"
+                     f"{summary['worsened']:>7}{summary['exact']:>7}{summary['average_error']:>9.2f}"
+                     f"{summary['score']:>10.2f}")
+        print(line)
+    if not known:
+        return
+    for name, summary in summaries.items():
+        for label in ('fixed', 'broke'):
+            cases = summary[label]
+            if cases:
+                more = f" ... and {len(cases) - listed} more" if len(cases) > listed else ''
+                print(f"{name} {label}: cases {', '.join(map(str, cases[:listed]))}{more}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate every Swarms patch against the baseline in one pass.')
+    parser.add_argument('--cases', default=PUBLIC, help='case file (default: public_cases.json at the repo root)')
+    parser.add_argument('--baseline', default=BASELINE, help='unpatched model (default: the original Fix_114 forked)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help='error in dollars below which a case counts as fixed (default 1.00, a close match)')
+    parser.add_argument('--matrix', default=MATRIX, help='per-case diff matrix CSV (default Swarms/diff_matrix.csv)')
+    parser.add_argument('--json', help='also write the report as JSON')
+    parser.add_argument('--verify', type=int, default=0, metavar='N',
+                        help="check N random cases per model against the model's own script")
+    options = parser.parse_args()
+
+    start = time.perf_counter()
+    models = {'baseline': os.path.abspath(options.baseline), **discover_variants()}
+    *columns, expected = load_cases(options.cases)
+    baseline = load_module('baseline', models['baseline'])
+    sharing = {name: shares_knn(load_module(name, path), baseline) for name, path in models.items()}
+    knn = shared_knn(*columns) if any(sharing.values()) else {}
+    scalar_columns = tuple(column.tolist() for column in columns)
+
+    with ProcessPoolExecutor(max_workers=options.workers, initializer=_init_worker,
+                             initargs=(scalar_columns, knn)) as pool:
+        futures = {name: pool.submit(evaluate, name, path, sharing[name]) for name, path in models.items()}
+        results = {name: future.result() for name, future in futures.items()}
+
+    answers = {name: result[0] for name, result in results.items()}
+    expected_cents = None if expected is None else [round(e * 100) for e in expected.tolist()]
+    tolerance_cents = round(options.tolerance * 100)
+    baseline_summary = compare(answers['baseline'], answers['baseline'], expected_cents, tolerance_cents)
+    variants = [name for name in models if name != 'baseline']
+    summaries = {name: compare(answers[name], answers['baseline'], expected_cents, tolerance_cents)
+                 for name in variants}
+    write_matrix(options.matrix, variants, columns, expected, answers['baseline'],
+                 {name: answers[name] for name in variants})
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(variants)} variants vs {os.path.relpath(models['baseline'], SOLUTION)} on "
+          f"{len(columns[0])} cases ({os.path.basename(options.cases)}), {len(knn)} kNN answers shared\n")
+    print_report(baseline_summary, summaries)
+    print(f"\nPer-case diff matrix written to {options.matrix}")
+    print(f"Total runtime: {elapsed:.2f} s for all {len(models)} models "
+          f"({', '.join(f'{name} {results[name][1]:.2f} s' for name in models)})")
+
+    if options.json:
+        report = {'cases': options.cases, 'baseline': models['baseline'], 'tolerance': options.tolerance,
+                  'runtime_seconds': elapsed, 'shared_knn_answers': len(knn),
+                  'models': {name: dict(summaries.get(name, baseline_summary), path=models[name],
+                                        shared_knn=sharing[name], seconds=results[name][1])
+                             for name in models}}
+        with open(options.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if options.verify:
+        mismatches = verify({name: (path, answers[name]) for name, path in models.items()}, columns, options.verify)
+        for name, case, ours, theirs in mismatches:
+            print(f"MISMATCH {name} case {case}: in-process {ours}, script {theirs}", file=sys.stderr)
+        if mismatches:
+            sys.exit(1)
+        print(f"Verified: {options.verify} random cases per model match each model's own script")
+
+
+if __name__ == '__main__':
+    main()
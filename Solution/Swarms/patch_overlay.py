@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Combinatorial search over the Swarms patches, as overlays on the unpatched model.
+
+Every patch touches one rule of the original vintage_calculation
+(Fix_114_LowMiles_HighReceipts/vintage_arithmetic_original.py), so each is written here
+as a replacement for that rule's stage, with its literals as parameters:
+
+    one_day                 Fix_83_OneDay_ExtremeSpending   receipt penalties for 1-day trips
+    five_day                five_day_18                     18% instead of 14% for 5-day trips
+    six_day                 Fix_6-Day_Bonus                 10% instead of 17% for 6-day trips
+    long_trip               Fix_Long_Trip_Penalty           efficiency bonus/penalty for 12+ days
+    low_miles_high_spend    Fix_114_LowMiles_HighReceipts   progressive penalty instead of 20%
+    seven_day_high_miles    Fix_668_SevenDay_HighMiles      43% instead of 35%
+
+five_day_18 is not a patch of its own: Fix_6-Day_Bonus, Fix_668 and Fix_83 were forked
+before the 5-day bonus went from 18% to 14% and still carry the old value (SHIPPED lists
+what each patched file amounts to). It is searched like the patches, so the effect of the
+real fixes can be told apart from it.
+
+A candidate is a set of enabled overlays, either with the patches' own values or with one
+parameter of one enabled overlay scaled by a --steps factor. The stages are evaluated in
+the model's order over NumPy arrays of all cases, and candidates are sorted by their stage
+settings so that consecutive candidates share the intermediate arrays of their common
+prefix: the linear formula is computed once, and a stage is only recomputed when its
+setting or an earlier one changes. Sorted candidates are split into contiguous chunks over
+a process pool.
+
+Answers are scored the way the patched run.sh would print them: edge cases take the shared
+kNN answers (diff_variants.shared_knn), every other case the overlaid formula. Candidates
+are ranked by average error, then by exact matches. test_overlay_parity.py checks that the
+overlays reproduce each patched vintage_calculation bit for bit.
+
+Usage: python3 patch_overlay.py [--cases FILE] [--overlays NAME,...] [--steps 0.8,0.9,1.1,1.2]
+                                [-j WORKERS] [--top N] [--csv overlay_results.csv]
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Final_Ensemble_Model'))
+from diff_variants import PUBLIC, load_cases, shared_knn  # noqa: E402
+from experts_vectorized import (BASE_CONSTANT, COEFF_DAYS, COEFF_MILES, COEFF_RECEIPTS, MAX_VALUE, MIN_VALUE,
+                                vintage_add, vintage_multiply, vintage_round)
+
+Overlay = namedtuple('Overlay', 'stage params')
+
+OVERLAYS = {
+    'Fix_83_OneDay_ExtremeSpending': Overlay('one_day', {'low_receipts': 300, 'high_receipts': 1000,
+                                                         'low_factor': 0.35, 'high_factor': 0.75}),
+    'five_day_18': Overlay('five_day', {'bonus': 0.18}),
+    'Fix_6-Day_Bonus': Overlay('six_day', {'bonus': 0.10}),
+    'Fix_Long_Trip_Penalty': Overlay('long_trip', {'efficient_miles_per_day': 80, 'efficient_receipts_per_day': 100,
+                                                   'bonus': 1.05, 'inefficient_miles_per_day': 30,
+                                                   'inefficient_receipts_per_day': 20}),
+    'Fix_114_LowMiles_HighReceipts': Overlay('low_miles_high_spend', {'max_miles': 300, 'min_daily_receipts': 120,
+                                                                      'base_penalty': 0.15, 'scale': 0.25,
+                                                                      'max_penalty': 0.40}),
+    'Fix_668_SevenDay_HighMiles': Overlay('seven_day_high_miles', {'bonus': 1.43}),
+}
+
+# Overlays that reproduce each patched Swarms/*/vintage_arithmetic.py
+SHIPPED = {
+    'Fix_114_LowMiles_HighReceipts': ('Fix_114_LowMiles_HighReceipts',),
+    'Fix_6-Day_Bonus': ('five_day_18', 'Fix_6-Day_Bonus'),
+    'Fix_668_SevenDay_HighMiles': ('five_day_18', 'Fix_668_SevenDay_HighMiles'),
+    'Fix_83_OneDay_ExtremeSpending': ('Fix_83_OneDay_ExtremeSpending', 'five_day_18'),
+    'Fix_Long_Trip_Penalty': ('Fix_Long_Trip_Penalty',),
+}
+
+STEPS = (0.8, 0.9, 1.1, 1.2)
+
+Trip = namedtuple('Trip', 'days miles receipts daily_receipts')
+
+
+def _apply(base, mask, operation):
+    """Copy of base with operation applied to the masked elements (one scalar if-branch)."""
+    base = base.copy()
+    idx = np.flatnonzero(mask)
+    if idx.size:
+        base[idx] = operation(base[idx], idx)
+    return base
+
+
+def linear(trip):
+    """The linear formula, before any rule."""
+    base = vintage_add(BASE_CONSTANT, vintage_multiply(trip.days, COEFF_DAYS))
+    base = vintage_add(base, vintage_multiply(trip.miles, COEFF_MILES))
+    return vintage_add(base, vintage_multiply(trip.receipts, COEFF_RECEIPTS))
+
+
+def one_day(base, trip, p):
+    days, miles, receipts = trip.days, trip.miles, trip.receipts
+    one = days == 1
+    if p is not None:
+        low = one & (receipts > p['low_receipts']) & (receipts < p['high_receipts'])
+        high = one & ~low & (receipts >= p['high_receipts'])
+        base = _apply(base, low, lambda b, _: vintage_multiply(b, p['low_factor']))
+        base = _apply(base, high, lambda b, _: vintage_multiply(b, p['high_factor']))
+        one = one & ~low & ~high
+    very_high_miles = one & (miles > 1000)
+    base = _apply(base, very_high_miles & (receipts >= 500) & (receipts < 2000), lambda b, _: vintage_multiply(b, 0.75))
+    base = _apply(base, very_high_miles & (receipts >= 2000), lambda b, _: vintage_add(b, vintage_multiply(b, 0.15)))
+    return _apply(base, one & ~(miles > 1000) & (miles > 700) & (receipts < 300),
+                  lambda b, _: vintage_multiply(b, 0.90))
+
+
+def five_day(base, trip, p):
+    bonus = 0.14 if p is None else p['bonus']
+    return _apply(base, trip.days == 5, lambda b, _: vintage_add(b, vintage_multiply(b, bonus)))
+
+
+def six_day(base, trip, p):
+    bonus = 0.17 if p is None else p['bonus']
+    return _apply(base, trip.days == 6, lambda b, _: vintage_add(b, vintage_multiply(b, bonus)))
+
+
+def long_trip(base, trip, p):
+    if p is None:
+        return base
+    days = trip.days
+    long = days >= 12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        miles_per_day, receipts_per_day = trip.miles / days, trip.receipts / days
+    efficient = long & (miles_per_day >= p['efficient_miles_per_day']) & \
+        (receipts_per_day <= p['efficient_receipts_per_day'])
+    inefficient = long & ~efficient & ((miles_per_day <= p['inefficient_miles_per_day']) |
+                                       (receipts_per_day <= p['inefficient_receipts_per_day']))
+    # 5%, 8%, 10% penalty for 12, 13, 14 days, then 2% more per day up to 25%
+    penalty = np.select([days == 12, days == 13, days == 14],
+                        [0.95, 0.92, 0.90], (100 - np.minimum(10 + (days - 14) * 2, 25)) / 100.0)
+    base = _apply(base, efficient, lambda b, _: vintage_multiply(b, p['bonus']))
+    return _apply(base, inefficient, lambda b, idx: vintage_multiply(b, penalty[idx]))
+
+
+def low_miles_high_spend(base, trip, p):
+    miles, daily_receipts = trip.miles, trip.daily_receipts
+    if p is None:
+        return _apply(base, (miles < 250) & (daily_receipts > 280), lambda b, _: vintage_multiply(b, 0.80))
+    # Penalty grows with the distance below the miles threshold and above the receipts threshold
+    miles_factor = np.maximum(0.2, (p['max_miles'] - miles) / p['max_miles'])
+    receipts_factor = np.minimum(1.5, daily_receipts / p['min_daily_receipts'])
+    penalty = np.minimum(p['max_penalty'], p['base_penalty'] + (miles_factor * receipts_factor * p['scale']))
+    return _apply(base, (miles < p['max_miles']) & (daily_receipts > p['min_daily_receipts']),
+                  lambda b, idx: vintage_multiply(b, 1.0 - penalty[idx]))
+
+
+def seven_day_high_miles(base, trip, p):
+    bonus = 1.35 if p is None else p['bonus']
+    return _apply(base, (trip.days == 7) & (trip.miles > 1000), lambda b, _: vintage_multiply(b, bonus))
+
+
+# Rule stages in the order vintage_calculation applies them
+STAGES = (('one_day', one_day), ('five_day', five_day), ('six_day', six_day), ('long_trip', long_trip),
+          ('low_miles_high_spend', low_miles_high_spend), ('seven_day_high_miles', seven_day_high_miles))
+
+
+def make_trip(days, miles, receipts):
+    days, miles, receipts = (np.asarray(x, dtype=np.float64) for x in (days, miles, receipts))
+    return Trip(days, miles, receipts, receipts / np.maximum(days, 1))
+
+
+def settings_for(overlays):
+    """stage -> parameters for a set of enabled overlays (stages left out keep the original rule)."""
+    return {OVERLAYS[name].stage: dict(OVERLAYS[name].params) for name in overlays}
+
+
+def vintage_calculation(trip, settings):
+    """The overlaid vintage_calculation (without temporal corrections) over a Trip of arrays."""
+    base = linear(trip)
+    for stage, function in STAGES:
+        base = function(base, trip, settings.get(stage))
+    return vintage_round(np.clip(base, MIN_VALUE, MAX_VALUE), 2)
+
+
+def candidates(overlays, steps):
+    """(enabled overlays, perturbation label, settings) for every subset of overlays, each with
+    its default values and with every single parameter of an enabled overlay scaled by every step."""
+    for enabled in itertools.product((False, True), repeat=len(overlays)):
+        enabled = tuple(name for name, on in zip(overlays, enabled) if on)
+        settings = settings_for(enabled)
+        yield enabled, '', settings
+        for name in enabled:
+            stage, params = OVERLAYS[name]
+            for param, value in params.items():
+                for step in steps:
+                    changed = round(value * step, 2)
+                    if changed != value:
+                        yield enabled, f"{name}.{param}={changed:g}", dict(settings, **{stage: dict(params, **{param: changed})})
+
+
+def settings_key(settings):
+    """Sortable per-stage key: candidates sharing a key prefix share the intermediate arrays."""
+    return tuple(tuple(sorted(settings[stage].items())) if stage in settings else () for stage, _ in STAGES)
+
+
+# Worker state, set once per pool process by _init_worker
+_trip = _knn_cents = _knn_rows = _expected_cents = None
+
+
+def _init_worker(columns, knn, expected):
+    global _trip, _knn_rows, _knn_cents, _expected_cents
+    _trip = make_trip(*columns)
+    _knn_rows = np.array(sorted(knn), dtype=np.intp)
+    # the text run.sh prints for a kNN answer, in cents
+    _knn_cents = np.array([round(float(f"{knn[i]:.2f}") * 100) for i in sorted(knn)], dtype=np.int64)
+    _expected_cents = np.rint(np.asarray(expected) * 100).astype(np.int64)
+
+
+def score_chunk(chunk):
+    """[(index, total error in cents, exact matches)] for (index, settings) candidates, in key order."""
+    stack = []  # (stage key, array after that stage) for the previous candidate's stages
+    results = []
+    for index, settings in chunk:
+        key = settings_key(settings)
+        shared = 0
+        while shared < len(stack) and stack[shared][0] == key[shared]:
+            shared += 1
+        del stack[shared:]
+        base = stack[-1][1] if stack else linear(_trip)
+        for (stage, function), stage_key in zip(STAGES[shared:], key[shared:]):
+            base = function(base, _trip, settings.get(stage))
+            stack.append((stage_key, base))
+        cents = np.rint(vintage_round(np.clip(base, MIN_VALUE, MAX_VALUE), 2) * 100).astype(np.int64)
+        cents[_knn_rows] = _knn_cents
+        errors = np.abs(cents - _expected_cents)
+        results.append((index, int(errors.sum()), int(np.count_nonzero(errors == 0))))
+    return results
+
+
+def search(columns, expected, knn, overlays, steps, workers):
+    """Rows of (enabled overlays, perturbation, average error, exact matches, score), best first."""
+    found = list(candidates(overlays, steps))
+    order = sorted(range(len(found)), key=lambda i: settings_key(found[i][2]))
+    size = -(-len(order) // workers)
+    chunks = [[(i, found[i][2]) for i in order[start:start + size]] for start in range(0, len(order), size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(columns, knn, expected)) as pool:
+        scored = [row for rows in pool.map(score_chunk, chunks) for row in rows]
+    n = len(expected)
+    rows = []
+    for index, total_cents, exact in scored:
+        average = total_cents / n / 100
+        rows.append((found[index][0], found[index][1], average, exact, average * 100 + (n - exact) * 0.1))
+    rows.sort(key=lambda row: (row[2], -row[3]))
+    return rows
+
+
+def label(enabled):
+    names = [name for name, overlay in SHIPPED.items() if set(overlay) == set(enabled)]
+    return (' + '.join(enabled) or '(baseline)') + (f"   [= {names[0]}]" if names else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank every combination of the Swarms patches by error.')
+    parser.add_argument('--cases', default=PUBLIC, help='case file with expected outputs (default: public_cases.json)')
+    parser.add_argument('--overlays', help=f"comma-separated overlays (default: all of {', '.join(OVERLAYS)})")
+    parser.add_argument('--steps', default=','.join(map(str, STEPS)),
+                        help='factors applied to one parameter at a time (default 0.8,0.9,1.1,1.2; "" for none)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--top', type=int, default=20, help='rows of the ranked table to print (default 20)')
+    parser.add_argument('--csv', help='write every scored candidate to this CSV file')
+    options = parser.parse_args()
+
+    overlays = options.overlays.split(',') if options.overlays else list(OVERLAYS)
+    unknown = [name for name in overlays if name not in OVERLAYS]
+    if unknown:
+        parser.error(f"unknown overlay(s): {', '.join(unknown)}")
+    steps = [float(step) for step in options.steps.split(',') if step]
+
+    start = time.perf_counter()
+    *columns, expected = load_cases(options.cases)
+    if expected is None:
+        parser.error(f"{options.cases} has no expected outputs to score against")
+    rows = search(columns, expected, shared_knn(*columns), overlays, steps, options.workers)
+    elapsed = time.perf_counter() - start
+
+    combinations = [row for row in rows if not row[1]]
+    print(f"{len(rows)} candidates ({len(combinations)} overlay combinations, {len(rows) - len(combinations)} "
+          f"perturbations) on {len(expected)} cases in {elapsed:.2f} s\n")
+    header = f"{'rank':>5}{'avg err':>9}{'exact':>7}{'score':>10}  overlays / perturbation"
+    for title, table in (('Overlay combinations', combinations), ('All candidates', rows)):
+        print(title)
+        print(header)
+        print('-' * 100)
+        for rank, (enabled, perturbation, average, exact, score) in enumerate(table[:options.top], 1):
+            print(f"{rank:>5}{average:>9.2f}{exact:>7}{score:>10.2f}  {label(enabled)}"
+                  + (f"\n{'':>33}{perturbation}" if perturbation else ''))
+        print()
+
+    if options.csv:
+        with open(options.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['rank', 'average_error', 'exact', 'score', 'overlays', 'perturbation'])
+            for rank, (enabled, perturbation, average, exact, score) in enumerate(rows, 1):
+                writer.writerow([rank, f"{average:.4f}", exact, f"{score:.2f}", '+'.join(enabled), perturbation])
+        print(f"All {len(rows)} candidates written to {options.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Parity check: patch_overlay.vintage_calculation with the overlays in patch_overlay.SHIPPED
+must reproduce each patched Swarms/*/vintage_arithmetic.py to the last bit, and with no
+overlay the original model, on every public and private case and on 50k random trips.
+
+Usage: python3 test_overlay_parity.py
+"""
+import os, sys
+
+import patch_overlay
+from diff_variants import BASELINE, SOLUTION, discover_variants, load_module
+
+sys.path.insert(0, os.path.join(SOLUTION, 'Hybrid_Model'))
+from parity import count_mismatches, load_inputs, random_trips  # noqa: E402
+
+
+def check(module, overlays, days, miles, receipts):
+    """Mismatches of the overlaid batch against the module's scalar vintage_calculation."""
+    batch = patch_overlay.vintage_calculation(patch_overlay.make_trip(days, miles, receipts),
+                                              patch_overlay.settings_for(overlays))
+    return count_mismatches(
+        (f"trip {days[i]:g}, {miles[i]:g}, {receipts[i]:g}",
+         module.vintage_calculation(float(days[i]), float(miles[i]), float(receipts[i])), batch[i])
+        for i in range(len(days)))
+
+
+def models():
+    yield 'baseline', load_module('baseline', BASELINE), ()
+    for name, path in discover_variants().items():
+        yield name, load_module(name, path), patch_overlay.SHIPPED[name]
+
+
+def test_parity():
+    cases, trips = load_inputs(), random_trips(5_000, max_days=20)
+    for name, module, overlays in models():
+        assert check(module, overlays, *cases) == 0, name
+        assert check(module, overlays, *trips) == 0, name
+
+
+def main():
+    cases, trips = load_inputs(), random_trips(50_000, max_days=20)
+    failed = 0
+    for name, module, overlays in models():
+        bad = check(module, overlays, *cases) + check(module, overlays, *trips)
+        total = len(cases[0]) + len(trips[0])
+        print(f"{name:<32}{' + '.join(overlays) or '(no overlay)':<52}{total - bad}/{total} bit-identical")
+        failed += bad
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
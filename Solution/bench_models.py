@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Benchmark every run.sh-style model in the repo.
+
+For each model:
+  cold start   wall time of one CLI call (run.sh or script), median/p95 over --cold-runs calls
+  warm         per-call latency with the model imported once, for models that are importable
+  throughput   cases/sec over the public and private sets: through the CLI (first --limit cases,
+               one process per case, as eval.sh runs them) and in-process (every case, or the
+               first --inproc-limit) where importable
+  peak RSS     largest resident set of any CLI call (including the processes run.sh starts)
+               and of the in-process model
+
+Each model is measured in a fresh worker process (this script with --worker), so imports
+and RSS of one model never leak into another's numbers. Models whose CLI fails (for example
+the bc-based scripts when bc is not installed) are reported with their error instead of
+numbers.
+
+Usage:
+    python3 bench_models.py [--models NAME,...] [--cold-runs N] [--limit N] [--inproc-limit N]
+                            [--json bench_results.json]
+    python3 bench_models.py --list
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+SOLUTION = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SOLUTION)
+CASE_SETS = {'public': os.path.join(ROOT, 'public_cases.json'),
+             'private': os.path.join(ROOT, 'private_cases.json')}
+
+
+def discover_models():
+    """name -> (argv, cwd, reads_stdin): every */run.sh and run*.sh under Solution/, plus the ensemble router."""
+    models = {}
+    for path in sorted(glob.glob(os.path.join(SOLUTION, '*', 'run.sh'))):
+        directory = os.path.dirname(path)
+        # 14_ reads days, miles and receipts from stdin, one per line
+        reads_stdin = os.path.basename(directory) == '14_Employee_Classification_Inference'
+        models[os.path.basename(directory)] = (['bash', path], directory, reads_stdin)
+    for path in sorted(glob.glob(os.path.join(SOLUTION, 'run*.sh'))):
+        models[os.path.splitext(os.path.basename(path))[0]] = (['bash', path], SOLUTION, False)
+    router = os.path.join(SOLUTION, 'Final_Ensemble_Model', 'ensemble_router.py')
+    models['Final_Ensemble_Model'] = ([sys.executable, router], ROOT, False)
+    return models
+
+
+# Importable models: factories returning predict(days, miles, receipts) -> the CLI's output text.
+# Each runs with its model directory on sys.path and as the working directory.
+def _hybrid():
+    import engine, hybrid_run
+    table = hybrid_run.load_table()
+    def predict(days, miles, receipts):
+        days, miles, receipts = hybrid_run.parse_inputs([days, miles, receipts])
+        return f"{hybrid_run.correct(engine.predict(days, miles, receipts), table, days, miles, receipts):.2f}"
+    return predict
+
+
+def _vintage_script(module_name):
+    def factory():
+        import importlib
+        module = importlib.import_module(module_name)
+        def predict(days, miles, receipts):
+            days, miles, receipts = float(days), float(miles), float(receipts)
+            result = module.knn_fallback(days, miles, receipts)
+            if result is None:
+                result = module.vintage_calculation(days, miles, receipts)
+            return f"{result:.2f}"
+        return predict
+    return factory
+
+
+def _ensemble():
+    import ensemble_router
+    def predict(days, miles, receipts):
+        expert, expert_args = ensemble_router.route(int(days), int(float(miles)), float(receipts))
+        return ensemble_router.run_expert(expert, [days, miles, receipts], expert_args)
+    return predict
+
+
+def _knn_memorizer():
+    import knn_memorizer
+    cases = knn_memorizer.load_cases('public_cases.json')
+    def predict(days, miles, receipts):
+        target = {"trip_duration_days": int(days), "miles_traveled": int(miles),
+                  "total_receipts_amount": float(receipts)}
+        return f"{knn_memorizer.predict_reimbursement(target, cases, k=7):.2f}"
+    return predict
+
+
+# model name -> (import directory, working directory, factory)
+IMPORTABLE = {
+    'Hybrid_Model': ('Hybrid_Model', 'Hybrid_Model', _hybrid),
+    'Final_Model': ('Final_Model', 'Final_Model', _vintage_script('vintage_final')),
+    'Final_Ensemble_Model': ('Final_Ensemble_Model', '..', _ensemble),
+    '11_Brute_Force_Memorization': ('11_Brute_Force_Memorization', '11_Brute_Force_Memorization', _knn_memorizer),
+    # Solution/run.sh runs 13_'s vintage_arithmetic.py from Solution/
+    'run': ('13_Precision_Artifact_Analysis', '.', _vintage_script('vintage_arithmetic')),
+}
+
+
+def json_text(value):
+    """A JSON number as the shell scripts receive it from jq."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def load_inputs(path):
+    with open(path) as f:
+        cases = json.load(f)
+    return [tuple(json_text(c.get('input', c)[key]) for key in
+                  ('trip_duration_days', 'miles_traveled', 'total_receipts_amount')) for c in cases]
+
+
+def run_cli(argv, cwd, reads_stdin, args):
+    """(seconds, output or None, error text) for one CLI call."""
+    start = time.perf_counter()
+    result = subprocess.run(argv + ([] if reads_stdin else list(args)), cwd=cwd, capture_output=True, text=True,
+                            input=''.join(a + '\n' for a in args) if reads_stdin else None)
+    elapsed = time.perf_counter() - start
+    output = result.stdout.strip()
+    try:
+        float(output)
+    except ValueError:
+        lines = (result.stderr.strip() or output or f'exit status {result.returncode}').splitlines()
+        return elapsed, None, lines[-1]
+    return elapsed, output, None
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def latency_summary(seconds):
+    return {'median_ms': statistics.median(seconds) * 1e3, 'p95_ms': percentile(seconds, 0.95) * 1e3,
+            'min_ms': min(seconds) * 1e3, 'runs': len(seconds)}
+
+
+def measure(name, cold_runs, limit, inproc_limit=0):
+    """All numbers for one model; run inside a --worker process."""
+    argv, cwd, reads_stdin = discover_models()[name]
+    inputs = {set_name: load_inputs(path) for set_name, path in CASE_SETS.items()}
+    result = {'model': name, 'command': ' '.join(os.path.relpath(a, ROOT) if os.path.isabs(a) and a != sys.executable
+                                                  else a for a in argv),
+              'importable': name in IMPORTABLE, 'error': None}
+
+    # cold start: the same few public cases, cycled
+    samples = [inputs['public'][i % 10] for i in range(cold_runs)]
+    run_cli(argv, cwd, reads_stdin, samples[0])  # warm the page cache, not the process
+    timings, failures = [], 0
+    for args in samples:
+        elapsed, output, error = run_cli(argv, cwd, reads_stdin, args)
+        timings.append(elapsed)
+        failures += output is None
+    if failures == len(samples):
+        result['error'] = error
+        return result
+    result['cold_start'] = dict(latency_summary(timings), failures=failures)
+
+    result['throughput'] = {}
+    for set_name, cases in inputs.items():
+        subset = cases[:limit]
+        start = time.perf_counter()
+        failures = sum(run_cli(argv, cwd, reads_stdin, args)[1] is None for args in subset)
+        elapsed = time.perf_counter() - start
+        result['throughput'][set_name] = {'cli_cases': len(subset), 'cli_failures': failures,
+                                          'cli_cases_per_sec': len(subset) / elapsed}
+    result['peak_rss_kb'] = {'cli': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}
+
+    if name in IMPORTABLE:
+        import_dir, work_dir, factory = IMPORTABLE[name]
+        sys.path.insert(0, os.path.join(SOLUTION, import_dir))
+        os.chdir(os.path.join(SOLUTION, work_dir))
+        start = time.perf_counter()
+        predict = factory()
+        result['warm'] = {'import_ms': (time.perf_counter() - start) * 1e3}
+        timings = []
+        for args in samples:
+            start = time.perf_counter()
+            try:
+                predict(*args)
+            except Exception:
+                continue  # the CLI fails on these inputs too
+            timings.append(time.perf_counter() - start)
+        result['warm'].update(latency_summary(timings))
+        for set_name, cases in inputs.items():
+            cases = cases[:inproc_limit or None]
+            failures = 0
+            start = time.perf_counter()
+            for args in cases:
+                try:
+                    predict(*args)
+                except Exception:
+                    failures += 1
+            elapsed = time.perf_counter() - start
+            result['throughput'][set_name].update({'inproc_cases': len(cases), 'inproc_failures': failures,
+                                                   'inproc_cases_per_sec': len(cases) / elapsed})
+        result['peak_rss_kb']['inproc'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def table(results):
+    header = f"{'model':<38}{'cold ms':>9}{'warm ms':>9}{'pub cli/s':>11}{'pub inproc/s':>14}" \
+             f"{'priv inproc/s':>15}{'RSS MB':>8}"
+    lines = [header, '-' * len(header)]
+    for r in sorted(results, key=lambda r: r.get('cold_start', {}).get('median_ms', float('inf'))):
+        if r['error']:
+            lines.append(f"{r['model']:<38}  error: {r['error'][:70]}")
+            continue
+        tp = r['throughput']
+        warm = f"{r['warm']['median_ms']:.3f}" if 'warm' in r else '-'
+        inproc = [f"{tp[s]['inproc_cases_per_sec']:,.0f}" if 'inproc_cases_per_sec' in tp[s] else '-'
+                  for s in ('public', 'private')]
+        rss = max(r['peak_rss_kb'].values()) / 1024
+        lines.append(f"{r['model']:<38}{r['cold_start']['median_ms']:>9.1f}{warm:>9}"
+                     f"{tp['public']['cli_cases_per_sec']:>11.1f}{inproc[0]:>14}{inproc[1]:>15}{rss:>8.1f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every run.sh-style model.')
+    parser.add_argument('--models', help='comma-separated model names (default: all, see --list)')
+    parser.add_argument('--cold-runs', type=int, default=10, help='CLI calls timed for cold start (default 10)')
+    parser.add_argument('--limit', type=int, default=50, help='cases per set for CLI throughput (default 50)')
+    parser.add_argument('--inproc-limit', type=int, default=0,
+                        help='cases per set for in-process throughput (default 0 = all)')
+    parser.add_argument('--json', default='bench_results.json', help='results file (default bench_results.json)')
+    parser.add_argument('--list', action='store_true', help='list model names and exit')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.worker:
+        print(json.dumps(measure(options.worker, options.cold_runs, options.limit, options.inproc_limit)))
+        return
+    models = discover_models()
+    if options.list:
+        for name, (argv, _, _) in models.items():
+            print(f"{name:<38}{'importable' if name in IMPORTABLE else '':<12}{os.path.relpath(argv[-1], ROOT)}")
+        return
+
+    names = options.models.split(',') if options.models else list(models)
+    unknown = [n for n in names if n not in models]
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(unknown)} (see --list)")
+    results = []
+    for name in names:
+        print(f"benchmarking {name}...", file=sys.stderr)
+        worker = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', name,
+                                 '--cold-runs', str(options.cold_runs), '--limit', str(options.limit),
+                                 '--inproc-limit', str(options.inproc_limit)],
+                                capture_output=True, text=True)
+        if worker.returncode != 0:
+            error = (worker.stderr.strip().splitlines() or ['worker failed'])[-1]
+            results.append({'model': name, 'error': error})
+            continue
+        results.append(json.loads(worker.stdout))
+
+    report = {'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                       'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                       'cold_runs': options.cold_runs, 'cli_limit': options.limit,
+                       'inproc_limit': options.inproc_limit},
+              'models': results}
+    with open(options.json, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(table(results))
+    print(f"\nJSON results written to {options.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Parallel drop-in for eval.sh.
+
+Runs ./run.sh on every case of public_cases.json (both looked up in the current directory,
+exactly like eval.sh) across a pool of worker threads, each waiting on its own run.sh
+process, and prints the same report as eval.sh. Metrics are computed in-process with
+exact decimal arithmetic that follows bc's scale rules, so every number in the report
+(including bc's ".50" style for values below 1) matches what eval.sh prints. A failing
+case's stderr is captured from the same run.sh invocation instead of running it again.
+
+Usage: python3 eval_parallel.py [-j WORKERS] [--cases public_cases.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal, ROUND_DOWN
+
+NUMBER = re.compile(r"^-?[0-9]+\.?[0-9]*$")
+WHITESPACE = re.compile(r"\s")
+
+
+def run_case(args, run_sh="./run.sh", detach=False):
+    """(ok, stdout with whitespace removed, stderr with newlines removed) for one run.sh call.
+    detach starts run.sh in its own session, out of reach of a terminal Ctrl-C."""
+    try:
+        result = subprocess.run([run_sh, *args], capture_output=True, text=True, errors="replace",
+                                start_new_session=detach)
+    except OSError as e:
+        return False, "", str(e)
+    return result.returncode == 0, WHITESPACE.sub("", result.stdout), result.stderr.replace("\n", "")
+
+
+def run_all(cases, workers, run_sh="./run.sh", progress=sys.stderr):
+    """run_case over every argument triple on a worker pool; results in input order."""
+    results = [None] * len(cases)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_case, args, run_sh): i for i, args in enumerate(cases)}
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress is not None and done % 100 == 0 and done < len(cases):
+                print(f"Progress: {done}/{len(cases)} cases processed...", file=progress)
+    return results
+
+
+def scale_of(number):
+    return max(0, -number.as_tuple().exponent)
+
+
+def bc_divide(a, b, scale):
+    """a / b truncated to scale digits, as bc computes it."""
+    return (a / b).quantize(Decimal(1).scaleb(-scale), rounding=ROUND_DOWN)
+
+
+def bc_format(number):
+    """A Decimal printed the way bc prints it: "0" for zero, no leading zero before the point."""
+    if number == 0:
+        return "0"
+    text = format(abs(number), "f")
+    if text.startswith("0."):
+        text = text[1:]
+    return ("-" if number < 0 else "") + text
+
+
+def jq_text(value):
+    """A JSON number as jq -r prints it: shortest round-trip form, integral values without ".0"."""
+    number = float(value)
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+def load_cases(path):
+    with open(path) as f:
+        cases = json.load(f)
+    return [(jq_text(c["input"]["trip_duration_days"]), jq_text(c["input"]["miles_traveled"]),
+             jq_text(c["input"]["total_receipts_amount"]), jq_text(c["expected_output"]))
+            for c in cases]
+
+
+def report(cases, results):
+    num_cases = len(cases)
+    successful_runs = exact_matches = close_matches = 0
+    total_error = Decimal(0)
+    max_error, max_error_text = Decimal(0), "0"
+    results_array, errors_array = [], []
+
+    for i, ((trip_duration, miles_traveled, receipts_amount, expected), (ok, output, stderr)) in \
+            enumerate(zip(cases, results)):
+        if not ok:
+            errors_array.append(f"Case {i+1}: Script failed with error: {stderr}")
+            continue
+        if not NUMBER.match(output):
+            errors_array.append(f"Case {i+1}: Invalid output format: {output}")
+            continue
+        actual = Decimal(output)
+        # bc: |actual - expected| keeps the larger scale of its operands
+        error = abs(actual - Decimal(expected))
+        error = error.quantize(Decimal(1).scaleb(-max(scale_of(actual), scale_of(Decimal(expected)))))
+        results_array.append((i + 1, expected, output, error, trip_duration, miles_traveled, receipts_amount))
+        successful_runs += 1
+        if error < Decimal("0.01"):
+            exact_matches += 1
+        if error < Decimal("1.0"):
+            close_matches += 1
+        total_error += error
+        if error > max_error:
+            max_error, max_error_text = error, bc_format(error)
+
+    if successful_runs == 0:
+        print("❌ No successful test cases!")
+        print("")
+        print("Your script either:")
+        print("  - Failed to run properly")
+        print("  - Produced invalid output format")
+        print("  - Timed out on all cases")
+        print("")
+        print("Check the errors below for details.")
+    else:
+        avg_error = bc_divide(total_error, successful_runs, 2)
+        exact_pct = bc_divide(Decimal(exact_matches * 100), successful_runs, 1)
+        close_pct = bc_divide(Decimal(close_matches * 100), successful_runs, 1)
+
+        print("✅ Evaluation Complete!")
+        print("")
+        print("📈 Results Summary:")
+        print(f"  Total test cases: {num_cases}")
+        print(f"  Successful runs: {successful_runs}")
+        print(f"  Exact matches (±$0.01): {exact_matches} ({bc_format(exact_pct)}%)")
+        print(f"  Close matches (±$1.00): {close_matches} ({bc_format(close_pct)}%)")
+        print(f"  Average error: ${bc_format(avg_error)}")
+        print(f"  Maximum error: ${max_error_text}")
+        print("")
+
+        score = (avg_error * 100 + (num_cases - exact_matches) * Decimal("0.1")).quantize(Decimal("0.01"))
+        print(f"🎯 Your Score: {bc_format(score)} (lower is better)")
+        print("")
+
+        if exact_matches == num_cases:
+            print("🏆 PERFECT SCORE! You have reverse-engineered the system completely!")
+        elif exact_matches > 950:
+            print("🥇 Excellent! You are very close to the perfect solution.")
+        elif exact_matches > 800:
+            print("🥈 Great work! You have captured most of the system behavior.")
+        elif exact_matches > 500:
+            print("🥉 Good progress! You understand some key patterns.")
+        else:
+            print("📚 Keep analyzing the patterns in the interviews and test cases.")
+
+        print("")
+        print("💡 Tips for improvement:")
+        if exact_matches < num_cases:
+            print("  Check these high-error cases:")
+            # sort -t: -k4 -nr: by error descending, ties by the whole line descending (C locale)
+            lines = [(row[3], ":".join(str(x) if j != 3 else bc_format(x) for j, x in enumerate(row)), row)
+                     for row in results_array]
+            lines.sort(key=lambda item: (item[0], item[1].encode()), reverse=True)
+            for _, _, (case_num, expected, actual, error, trip_duration, miles_traveled, receipts_amount) in lines[:5]:
+                print(f"    Case {case_num}: {trip_duration} days, {miles_traveled} miles, ${receipts_amount} receipts")
+                print(f"      Expected: ${float(expected):.2f}, Got: ${float(actual):.2f}, Error: ${float(error):.2f}")
+
+    if errors_array:
+        print()
+        print("⚠️  Errors encountered:")
+        for line in errors_array[:10]:
+            print(f"  {line}")
+        if len(errors_array) > 10:
+            print(f"  ... and {len(errors_array) - 10} more errors")
+
+    print()
+    print("📝 Next steps:")
+    print("  1. Fix any script errors shown above")
+    print("  2. Ensure your run.sh outputs only a number")
+    print("  3. Analyze the patterns in the interviews and public cases")
+    print("  4. Test edge cases around trip length and receipt amounts")
+    print("  5. Submit your solution via the Google Form when ready!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel eval.sh: same run.sh contract, same report.")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="run.sh processes in flight (default: CPU count)")
+    parser.add_argument("--cases", default="public_cases.json", help="case file (default: public_cases.json)")
+    options = parser.parse_args()
+
+    print("🧾 Black Box Challenge - Reimbursement System Evaluation")
+    print("=======================================================")
+    print()
+
+    if not os.path.isfile("run.sh"):
+        print("❌ Error: run.sh not found!")
+        print("Please create a run.sh script that takes three parameters:")
+        print("  ./run.sh <trip_duration_days> <miles_traveled> <total_receipts_amount>")
+        print("  and outputs the reimbursement amount")
+        sys.exit(1)
+    os.chmod("run.sh", os.stat("run.sh").st_mode | 0o111)
+
+    if not os.path.isfile(options.cases):
+        print(f"❌ Error: {options.cases} not found!")
+        print("Please ensure the public cases file is in the current directory.")
+        sys.exit(1)
+
+    print("📊 Running evaluation against 1,000 test cases...")
+    print()
+    print("Extracting test data...")
+    cases = load_cases(options.cases)
+    print(f"Progress: 0/{len(cases)} cases processed...", file=sys.stderr)
+    sys.stdout.flush()
+    results = run_all([case[:3] for case in cases], max(1, options.workers))
+    report(cases, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Parallel, resumable generate_results.sh.
+
+Runs ./run.sh on every case of private_cases.json with several run.sh processes in flight
+and writes private_results.txt in case order through a buffered writer: answers that finish
+early wait in their futures until every earlier case is written. The file is
+byte-identical to the one generate_results.sh writes, ERROR lines included.
+
+Progress is checkpointed in private_results.txt.checkpoint (case count, byte size of the
+results written so far, and a checksum of private_cases.json). An interrupted run
+resumes from the next unwritten case; the checkpoint is removed when the run completes.
+
+Usage: python3 generate_results_parallel.py [-j WORKERS] [--restart]
+"""
+import argparse
+import hashlib
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from eval_parallel import NUMBER, jq_text, run_case
+
+CASES = "private_cases.json"
+RESULTS = "private_results.txt"
+CHECKPOINT = RESULTS + ".checkpoint"
+# Write + checkpoint after this many ordered lines or seconds, whichever comes first
+FLUSH_LINES = 100
+FLUSH_SECONDS = 2.0
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_cases(path=CASES):
+    with open(path) as f:
+        cases = json.load(f)
+    return [(jq_text(c["trip_duration_days"]), jq_text(c["miles_traveled"]), jq_text(c["total_receipts_amount"]))
+            for c in cases]
+
+
+def read_checkpoint(digest):
+    """(cases done, bytes of results written) from a checkpoint for the same case file, else None."""
+    try:
+        with open(CHECKPOINT) as f:
+            state = json.load(f)
+        if state["cases_sha256"] != digest or os.path.getsize(RESULTS) < state["bytes"]:
+            return None
+        return state["done"], state["bytes"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_checkpoint(digest, done, size):
+    tmp = CHECKPOINT + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"cases_sha256": digest, "done": done, "bytes": size}, f)
+    os.replace(tmp, CHECKPOINT)
+
+
+def result_line(case_number, ok, output, stderr):
+    """The private_results.txt line for one run.sh outcome, reporting failures like generate_results.sh."""
+    if not ok:
+        print(f"Error on case {case_number}: Script failed: {stderr}", file=sys.stderr)
+        return "ERROR"
+    if not NUMBER.match(output):
+        print(f"Error on case {case_number}: Invalid output format: {output}", file=sys.stderr)
+        return "ERROR"
+    return output
+
+
+class CheckpointWriter:
+    """Buffers result lines and, on every flush, writes them out and records the checkpoint."""
+
+    def __init__(self, out, digest, done):
+        self.out, self.digest = out, digest
+        self.written = done
+        self.buffer = []
+        self.flushed_at = time.monotonic()
+
+    def add(self, line):
+        self.buffer.append(line + "\n")
+        if len(self.buffer) >= FLUSH_LINES or time.monotonic() - self.flushed_at >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.out.write("".join(self.buffer))
+            self.out.flush()
+            os.fsync(self.out.fileno())
+            self.written += len(self.buffer)
+            self.buffer = []
+        write_checkpoint(self.digest, self.written, self.out.tell())
+        self.flushed_at = time.monotonic()
+
+
+def generate(cases, workers, restart=False):
+    digest = file_digest(CASES)
+    state = None if restart else read_checkpoint(digest)
+    done, size = state or (0, 0)
+    if state:
+        print(f"Resuming from case {done + 1} ({done} already written)", file=sys.stderr)
+    mode = "r+b" if state else "wb"
+    with open(RESULTS, mode) as raw:
+        raw.truncate(size)
+    with open(RESULTS, "a") as out:
+        writer = CheckpointWriter(out, digest, done)
+        writer.flush()
+        print(f"Processing {len(cases)} test cases...", file=sys.stderr)
+        stop = []
+        handlers = {sig: signal.signal(sig, lambda signum, frame: stop.append(signum))
+                    for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # run.sh runs detached, so Ctrl-C reaches only this process and in-flight cases finish
+                futures = [(i, pool.submit(run_case, cases[i], detach=True)) for i in range(done, len(cases))]
+                for i, future in futures:
+                    # consumed in case order: the file and the stderr messages stay in case order
+                    writer.add(result_line(i + 1, *future.result()))
+                    if (i + 1) % 100 == 0 and i + 1 < len(cases):
+                        print(f"Progress: {i + 1}/{len(cases)} cases processed...", file=sys.stderr)
+                    if stop:
+                        pool.shutdown(cancel_futures=True)
+                        break
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+        writer.flush()
+    if stop:
+        print(f"\nInterrupted after {writer.written} cases; rerun to resume.", file=sys.stderr)
+        raise SystemExit(130)
+    os.remove(CHECKPOINT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel, resumable generate_results.sh.")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="run.sh processes in flight (default: CPU count)")
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start over")
+    options = parser.parse_args()
+
+    print("🧾 Black Box Challenge - Generating Private Results")
+    print("====================================================")
+    print()
+
+    if not os.path.isfile("run.sh"):
+        print("❌ Error: run.sh not found!")
+        print("Please create a run.sh script that takes three parameters:")
+        print("  ./run.sh <trip_duration_days> <miles_traveled> <total_receipts_amount>")
+        print("  and outputs the reimbursement amount")
+        sys.exit(1)
+    os.chmod("run.sh", os.stat("run.sh").st_mode | 0o111)
+
+    if not os.path.isfile(CASES):
+        print("❌ Error: private_cases.json not found!")
+        print("Please ensure the private cases file is in the current directory.")
+        sys.exit(1)
+
+    print("📊 Processing test cases and generating results...")
+    print("📝 Output will be saved to private_results.txt")
+    print()
+    print("Extracting test data...")
+    sys.stdout.flush()
+    generate(load_cases(), max(1, options.workers), options.restart)
+
+    print()
+    print("✅ Results generated successfully!", file=sys.stderr)
+    print("📄 Output saved to private_results.txt", file=sys.stderr)
+    print("📊 Each line contains the result for the corresponding test case in private_cases.json", file=sys.stderr)
+
+    print()
+    print("🎯 Next steps:")
+    print("  1. Check private_results.txt - it should contain one result per line")
+    print("  2. Each line corresponds to the same-numbered test case in private_cases.json")
+    print("  3. Lines with 'ERROR' indicate cases where your script failed")
+    print("  4. Submit your private_results.txt file when ready!")
+    print()
+    print("📈 File format:")
+    print("  Line 1: Result for private_cases.json[0]")
+    print("  Line 2: Result for private_cases.json[1]")
+    print("  Line 3: Result for private_cases.json[2]")
+    print("  ...")
+    print("  Line N: Result for private_cases.json[N-1]")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
 #!/bin/bash
 # top-level wrapper to hybrid model
-DIR="$(dirname "$0")/Solution/Hybrid_Model"
-python3 "$DIR/hybrid_run.py" "$@" 
\ No newline at end of file
+case "$0" in */*) DIR="${0%/*}/Solution/Hybrid_Model" ;; *) DIR=Solution/Hybrid_Model ;; esac
+exec "$DIR/run.sh" "$@"